@@ -1,6 +1,9 @@
 from collections import defaultdict
+import hashlib
 import random
+import struct
 import sys
+import time
 
 from environment import Environment
 import features
@@ -27,6 +30,29 @@ class PerceivedState(object):
     def __repr__(self):
         return hash(self).__str__()
 
+    @classmethod
+    def from_values(cls, shape, features):
+        """
+        Rebuilds a state from its shape name and feature values.
+        """
+        state = cls.__new__(cls)
+        state.shape = shape
+        state.features = list(features)
+        return state
+
+    def key(self):
+        """
+        64 bit id of the state that, unlike hash(), is the same in every
+        process and on every platform.
+        """
+        try:
+            return self._key
+        except AttributeError:
+            digest = hashlib.md5(
+                repr((self.shape, tuple(self.features)))).digest()
+            self._key = struct.unpack('<q', digest[:8])[0]
+            return self._key
+
 
 class Agent(object):
     def __init__(self, state_class=PerceivedState):
@@ -56,6 +82,38 @@ class Agent(object):
         self.action_from_q = False
         self.latest_reward = 0
 
+        # limits per episode, None means unlimited
+        self.max_pieces_per_episode = None
+        self.episode_time_budget = None  # seconds
+        self.truncated = False  # last episode was stopped by a limit
+
+        # set by checkpoint.Checkpointer
+        self.changed_entries = None
+        self.checkpointer = None
+        # set by instrumentation.Instrumentation
+        self.instrumentation = None
+        # set by metrics.TrainingMetrics
+        self.metrics = None
+        # set by memory.MemoryTracker
+        self.memory = None
+        # set by game_trace.TraceRecorder
+        self.trace_recorder = None
+
+        # totals for the metrics
+        self.episodes_played = 0
+        self.pieces_placed = 0
+        self.q_lookups = 0  # searches for the best action in Q
+        self.q_hits = 0  # searches that found at least one value
+
+    def seed(self, seed):
+        """
+        Seeds the action selection and the shape sequence, so that runs with
+        equal settings are reproducible.
+        """
+        self.random.seed(seed)
+        self.environment.random.seed(seed + 1)
+        self._initialize_state()
+
     def _initialize_state(self):
         self.environment.initialize()
         self._update_perceived_state()
@@ -63,18 +121,66 @@ class Agent(object):
     def _update_perceived_state(self):
         self.current_state = self._perceived_state()
 
-    def run(self, episodes):
+    def run(self, episodes, time_budget=None):
+        """
+        :param time_budget: seconds after which no further episode is started
+        :return: number of episodes played
+        """
+        deadline = None
+        if time_budget is not None:
+            deadline = time.time() + time_budget
+
         for i in range(0, episodes):
+            if self._should_stop() or (
+                    deadline is not None and time.time() >= deadline):
+                return i
             self._episode()
+            if self.checkpointer is not None:
+                self.checkpointer.maybe_checkpoint()
+            if self.instrumentation is not None:
+                self.instrumentation.maybe_dump()
+            if self.metrics is not None:
+                self.metrics.maybe_update()
+            if self.memory is not None:
+                self.memory.after_episode()
+        return episodes
+
+    def _should_stop(self):
+        return False
 
     def _episode(self):
+        """
+        Plays until game over or until a limit of the episode is reached.
+        An episode stopped by a limit is not treated as terminal: the last
+        update has already bootstrapped from the best Q-value of the
+        following state, which only is 0 if the game is over.
+        """
         self._initialize_state()
+        self.truncated = False
+        pieces = 0
+        deadline = None
+        if self.episode_time_budget is not None:
+            deadline = time.time() + self.episode_time_budget
+
         while not self._is_game_over():
+            if (self.max_pieces_per_episode is not None and
+                    pieces >= self.max_pieces_per_episode) or (
+                    deadline is not None and time.time() >= deadline):
+                self.truncated = True
+                break
             self._step()
+            pieces += 1
+        if self.trace_recorder is not None:
+            self.trace_recorder.end_episode()
+        self.pieces_placed += pieces
+        self.episodes_played += 1
 
     def _step(self):
         action = self._choose_action()
+        shape = self.environment.current_shape
         self.latest_reward = reward = self.environment.execute_action(action)
+        if self.trace_recorder is not None:
+            self.trace_recorder.record_step(shape, action, reward)
         old_state = self.current_state
         self._update_perceived_state()
         self._q(old_state, action, reward)
@@ -108,12 +214,17 @@ class Agent(object):
                 elif value == best_value:
                     best_actions.append(action)
 
+        self.q_lookups += 1
+        if best_actions:
+            self.q_hits += 1
         return set(best_actions), best_value
 
     def _q(self, old_state, action, reward):
         c = (old_state, action)
         self.Q[c] = (1 - self.alpha) * self.Q[
             c] + self.alpha * self._learned_value(reward)
+        if self.changed_entries is not None:
+            self.changed_entries.add(c)
 
     def _learned_value(self, reward):
         return reward + self.gamma * self._find_best_Q_value()
@@ -0,0 +1,523 @@
+"""
+The agent of the GUI runs in a child process, so that training and drawing do
+not share one interpreter lock.
+
+The GUI talks to the agent process in two ways:
+
+    shared memory  events for pause and stop, the fast forward flag, the
+                   latest board (channel.py) and the placed blocks of the
+                   latest episodes (SharedStatistics)
+    command pipe   everything else as (command, argument) tuples: configure,
+                   fast_forward, stop_fast_forward, step_once, save, load;
+                   the agent process answers with (kind, value) tuples
+
+All shared objects are created by the GUI before the process is started.
+"""
+from array import array
+from collections import namedtuple
+import ctypes
+import multiprocessing
+import os
+import threading
+import time
+
+from agent import Agent
+from channel import LatestStateChannel
+from checkpoint import Checkpointer
+from episode_log import EpisodeLogReader, EpisodeLogWriter, \
+    RecentEpisodes, EPISODE_LOG_FILENAME
+from instrumentation import Instrumentation
+from metrics import TrainingMetrics
+from profiler import SamplingProfiler
+from runner import agent_config, configure_agent
+import util
+
+TOTAL_EPISODES = 500000
+DEFAULT_STEPS_PER_SECOND = 5  # 0 for as fast as possible
+RING_SIZE = 1 << 16  # episodes
+AVERAGE_WINDOW = 50  # episodes
+PROFILE_FILENAME = 'profile-%Y%m%d-%H%M%S.folded'
+
+EpisodeSummary = namedtuple('EpisodeSummary', ['count', 'maximum', 'total',
+                                               'recent_mean'])
+
+
+class SharedStatistics(object):
+    """
+    Placed blocks of the latest RING_SIZE episodes and running aggregates in
+    shared memory. Every episode updates them in constant time, so reading
+    the summary does not depend on the length of the training. Older
+    episodes are read from the episode log, which is flushed long before
+    they are overwritten in the ring.
+    """
+
+    def __init__(self, size=RING_SIZE, window=AVERAGE_WINDOW):
+        """
+        :param window: number of latest episodes in the mean of the summary
+        """
+        if window > size:
+            raise ValueError('the window must fit into the ring buffer')
+        self.size = size
+        self.window = window
+        self.lock = multiprocessing.Lock()
+        self.ring = multiprocessing.RawArray(ctypes.c_uint, size)
+        # generation (changes when all episodes are replaced), episode
+        # count, maximum, total and total of the latest window episodes
+        self.counters = multiprocessing.RawArray(ctypes.c_ulong, 5)
+
+    def add(self, step_count):
+        with self.lock:
+            counters = self.counters
+            count = counters[1]
+            if count >= self.window:
+                counters[4] -= self.ring[(count - self.window) % self.size]
+            self.ring[count % self.size] = step_count
+            counters[1] = count + 1
+            if step_count > counters[2]:
+                counters[2] = step_count
+            counters[3] += step_count
+            counters[4] += step_count
+
+    def reset(self, steps_per_episode):
+        """
+        Replaces all episodes, e.g. after loading saved statistics.
+        """
+        with self.lock:
+            count = len(steps_per_episode)
+            for i in xrange(max(0, count - self.size), count):
+                self.ring[i % self.size] = steps_per_episode[i]
+            counters = self.counters
+            counters[0] += 1
+            counters[1] = count
+            counters[2] = max(steps_per_episode) if count else 0
+            counters[3] = sum(steps_per_episode)
+            counters[4] = sum(steps_per_episode[-self.window:])
+
+    def summary(self):
+        """
+        :return: EpisodeSummary of all episodes
+        """
+        with self.lock:
+            _, count, maximum, total, recent_total = self.counters
+        recent_mean = recent_total / float(min(count, self.window) or 1)
+        return EpisodeSummary(count, maximum, total, recent_mean)
+
+    def read(self, generation, known):
+        """
+        :param generation: generation the caller has read before
+        :param known: number of episodes the caller already has
+        :return: tuple (generation, first episode, array('I') with the
+                 episodes from first on); if the generation has changed, the
+                 caller has to start again from episode 0
+        """
+        with self.lock:
+            current, count = self.counters[0], self.counters[1]
+            if current != generation:
+                known = 0
+            first = max(known, count - self.size)
+            ring = self.ring
+            size = self.size
+            values = array('I', [ring[i % size] for i in xrange(first,
+                                                                 count)])
+        return current, first, values
+
+
+class SharedState(object):
+    """
+    Objects shared between the GUI and the agent process.
+    """
+
+    def __init__(self):
+        self.channel = LatestStateChannel()
+        self.statistics = SharedStatistics()
+        self.resume_event = multiprocessing.Event()
+        self.stop_event = multiprocessing.Event()
+        self.fast_forward = multiprocessing.RawValue(ctypes.c_bool, False)
+
+
+class MeasuredAgent(Agent):
+    """
+    Special class for GUI representation with measurements and event handling
+    """
+
+    def __init__(self, shared=None):
+        super(MeasuredAgent, self).__init__()
+        self.shared = shared or SharedState()
+        self.channel = self.shared.channel
+        self.resume_event = self.shared.resume_event
+        self.stop_event = self.shared.stop_event
+        self.step_count = 0
+        self.episode_log = None
+        # held for every step, other threads use it to access Q safely
+        self.q_lock = threading.Lock()
+        self.steps_per_second = DEFAULT_STEPS_PER_SECOND
+        self.pause_after_step = False
+        self._next_step_time = 0
+        self.fast_forward_total = 0
+        self.fast_forward_count = 0
+
+    @property
+    def fast_forward(self):
+        return self.shared.fast_forward.value
+
+    @fast_forward.setter
+    def fast_forward(self, value):
+        self.shared.fast_forward.value = value
+
+    def push_state(self):
+        self._push_state()
+
+    def copy_q_table(self):
+        with self.q_lock:
+            return self.Q.copy()
+
+    def replace_q_table(self, Q):
+        """
+        Continues with the given Q-table and the saved statistics.
+        """
+        with self.q_lock:
+            self.Q = Q
+            self.checkpointer.request_compaction()
+            self.shared.statistics.reset(
+                util.load_statistics(self.episode_log))
+
+    def start_fast_forward(self, episodes):
+        self.fast_forward_total = episodes
+        self.fast_forward_count = episodes
+        self.fast_forward = True
+
+    def step_once(self):
+        """
+        Lets the paused agent make a single step.
+        """
+        self.pause_after_step = True
+        self.resume_event.set()
+
+    def _throttle(self):
+        """
+        Waits until the next step is due at steps_per_second. The GUI is
+        not involved, it shows the latest state whenever it refreshes.
+        """
+        if not self.steps_per_second:
+            return
+        now = time.time()
+        # no catching up on steps missed while paused
+        self._next_step_time = max(
+            self._next_step_time + 1.0 / self.steps_per_second, now)
+        delay = self._next_step_time - now
+        if delay > 0:
+            self.stop_event.wait(delay)
+
+    def _should_stop(self):
+        return self.stop_event.is_set()
+
+    def _episode(self):
+        if self._is_fast_forward_finished():
+            self.stop_fast_forward()
+            self.resume_event.clear()
+
+        self.step_count = 0
+        super(MeasuredAgent, self)._episode()
+        if self.stop_event.is_set():
+            return  # interrupted, not played to the end
+        with self.q_lock:
+            self.episode_log.append(self.step_count,
+                                    self.environment.field.lines_deleted)
+            self.shared.statistics.add(self.step_count)
+        if self.fast_forward:
+            self.fast_forward_count -= 1
+
+    def _step(self):
+        self.resume_event.wait()
+
+        if self.stop_event.is_set():
+            return
+        with self.q_lock:
+            super(MeasuredAgent, self)._step()
+        self.step_count += 1
+        if self.pause_after_step:
+            self.pause_after_step = False
+            self.resume_event.clear()
+        if not self.fast_forward:
+            self._push_state()
+            self._throttle()
+
+    def stop_fast_forward(self):
+        self.fast_forward = False
+        self.fast_forward_count = self.fast_forward_total
+        self._push_state()
+
+    def _is_fast_forward_finished(self):
+        return (self.fast_forward and self.fast_forward_count <= 0)
+
+    def _is_game_over(self):
+        if self.stop_event.is_set():
+            return True
+        return super(MeasuredAgent, self)._is_game_over()
+
+    def _push_state(self):
+        if not self.fast_forward:
+            self.channel.publish(self.environment.field.blocks,
+                                 self.step_count,
+                                 self.shared.statistics.summary().count,
+                                 self.action_from_q)
+
+
+def run_agent(connection, shared, directory):
+    """
+    Main function of the agent process.
+
+    :param directory: checkpoint directory, also contains the episode log
+    """
+    agent = MeasuredAgent(shared)
+    checkpointer = Checkpointer(agent, directory, lock=agent.q_lock)
+    Instrumentation(agent)
+    TrainingMetrics(agent)
+    # continue the training of an earlier session, e.g. after a crash
+    restored = checkpointer.restore()
+    log_path = os.path.join(directory, EPISODE_LOG_FILENAME)
+    agent.episode_log = EpisodeLogWriter(log_path, append=restored)
+    if restored:
+        agent.shared.statistics.reset(EpisodeLogReader(log_path).read('steps'))
+    connection.send(('config', agent_config(agent)))
+
+    storage_threads = []
+    commands = threading.Thread(
+        target=_serve_commands,
+        args=(agent, connection, storage_threads,
+              threading.current_thread().ident))
+    commands.daemon = True
+    commands.start()
+
+    agent.run(TOTAL_EPISODES)
+    for thread in storage_threads:
+        thread.join()
+    agent.checkpointer.checkpoint()
+    agent.episode_log.close()
+
+
+def _serve_commands(agent, connection, storage_threads, agent_thread):
+    """
+    :param agent_thread: ident of the thread running the agent
+    """
+    send_lock = threading.Lock()
+    profilers = []
+
+    def reply(kind, value):
+        with send_lock:
+            connection.send((kind, value))
+
+    while True:
+        try:
+            command, argument = connection.recv()
+        except EOFError:
+            agent.stop_event.set()
+            agent.resume_event.set()
+            return
+
+        if command == 'configure':
+            config = dict(argument)
+            with agent.q_lock:
+                if 'steps_per_second' in config:
+                    agent.steps_per_second = config.pop('steps_per_second')
+                configure_agent(agent, config)
+        elif command == 'fast_forward':
+            agent.start_fast_forward(argument)
+        elif command == 'stop_fast_forward':
+            agent.stop_fast_forward()
+        elif command == 'step_once':
+            agent.step_once()
+        elif command == 'instrument':
+            with agent.q_lock:
+                if argument:
+                    agent.instrumentation.reset()
+                    agent.instrumentation.enable()
+                else:
+                    agent.instrumentation.disable()
+        elif command == 'timings':
+            reply('timings', agent.instrumentation.snapshot())
+        elif command == 'metrics':
+            with agent.q_lock:
+                agent.metrics.update()
+            reply('metrics', agent.metrics.registry.snapshot())
+        elif command == 'profile':
+            if profilers and profilers[-1].running:
+                continue
+            profilers.append(SamplingProfiler(agent_thread))
+            path = util.app_path(time.strftime(PROFILE_FILENAME))
+            profilers[-1].run_for(argument, path,
+                                  lambda p: reply('profile', p))
+        elif command in ('save', 'load'):
+            thread = threading.Thread(target=_run_storage_task,
+                                      args=(command, agent, reply, argument))
+            storage_threads.append(thread)
+            thread.start()
+
+
+def _run_storage_task(command, agent, reply, options=None):
+    """
+    Answers with (command, seconds) or ('error', message).
+
+    :param options: keyword arguments of util.save_q_table for save
+    """
+    start = time.time()
+    try:
+        if command == 'save':
+            _save(agent, **(options or {}))
+        else:
+            _load(agent)
+    except Exception as e:
+        reply('error', str(e))
+    else:
+        reply(command, time.time() - start)
+
+
+def _save(agent, codec=None, level=None):
+    """
+    Only copying the Q-table stops the agent, the copy is written while the
+    agent continues.
+    """
+    Q = agent.copy_q_table()
+    util.save_q_table(Q, codec=codec, level=level)
+    util.save_statistics(agent.episode_log)
+
+
+def _load(agent):
+    """
+    The loaded table replaces the one of the agent between two steps.
+    """
+    agent.replace_q_table(util.load_q_table())
+    agent.push_state()
+
+
+class EpisodeHistory(object):
+    """
+    The GUI's copy of the placed blocks per episode, updated from the
+    SharedStatistics of the agent process. Like those it only keeps the
+    latest episodes, the older ones are read from the episode log.
+    """
+
+    def __init__(self, statistics, log_path):
+        self.statistics = statistics
+        self.log_path = log_path
+        self.generation = 0
+        self.steps_per_episode = RecentEpisodes(statistics.size, log_path)
+
+    def update(self):
+        """
+        :return: RecentEpisodes with the placed blocks of every episode
+        """
+        generation, first, values = self.statistics.read(
+            self.generation, len(self.steps_per_episode))
+        if generation != self.generation:
+            self.generation = generation
+            self.steps_per_episode = RecentEpisodes(self.statistics.size,
+                                                    self.log_path)
+        known = len(self.steps_per_episode)
+        if first > known:
+            # no longer in the ring buffer, but already in the log
+            self.steps_per_episode.extend(
+                EpisodeLogReader(self.log_path).read('steps', known, first))
+        self.steps_per_episode.extend(values)
+        return self.steps_per_episode
+
+
+class AgentProcess(object):
+    """
+    Starts the MeasuredAgent in a child process and controls it from the
+    GUI. Pause and stop use the shared events, everything else is sent as a
+    command.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: checkpoint directory
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.shared = SharedState()
+        self.channel = self.shared.channel
+        self.resume_event = self.shared.resume_event
+        self.stop_event = self.shared.stop_event
+        self.statistics = self.shared.statistics
+        self.history = EpisodeHistory(
+            self.shared.statistics,
+            os.path.join(directory, EPISODE_LOG_FILENAME))
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=run_agent, args=(child_connection, self.shared, directory))
+        # settings of the agent in the format of runner.agent_config
+        self.config = None
+
+    @property
+    def fast_forward(self):
+        return self.shared.fast_forward.value
+
+    def start(self):
+        self.process.start()
+        _, self.config = self.connection.recv()
+
+    def configure(self, config):
+        """
+        Sends the settings that differ from the current ones to the agent.
+        """
+        changed = dict((name, value) for name, value in config.iteritems()
+                       if self.config.get(name) != value)
+        if changed:
+            self.config.update(changed)
+            self.send('configure', changed)
+
+    def start_fast_forward(self, episodes):
+        self.send('fast_forward', episodes)
+
+    def stop_fast_forward(self):
+        if self.fast_forward:
+            self.send('stop_fast_forward')
+
+    def step_once(self):
+        self.send('step_once')
+
+    def instrument(self, enabled):
+        """
+        Switches the time measurement of the agent on or off, switching it
+        on starts a new measurement.
+        """
+        self.send('instrument', enabled)
+
+    def request_timings(self):
+        """
+        The agent answers with ('timings', Instrumentation.snapshot()).
+        """
+        self.send('timings')
+
+    def request_metrics(self):
+        """
+        The agent answers with ('metrics', MetricsRegistry.snapshot()).
+        """
+        self.send('metrics')
+
+    def profile(self, seconds):
+        """
+        Samples the stack of the agent for the given seconds, the agent
+        answers with ('profile', path of the collapsed stacks).
+        """
+        self.send('profile', seconds)
+
+    def send(self, command, argument=None):
+        self.connection.send((command, argument))
+
+    def messages(self):
+        """
+        :return: list of (kind, value) answers of the agent process
+        """
+        messages = []
+        while self.connection.poll():
+            messages.append(self.connection.recv())
+        return messages
+
+    def stop(self):
+        self.stop_event.set()
+        self.resume_event.set()
+
+    def join(self):
+        self.process.join()
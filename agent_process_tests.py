@@ -0,0 +1,206 @@
+from array import array
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from agent_process import AgentProcess, EpisodeHistory, MeasuredAgent, \
+    SharedStatistics
+from episode_log import EpisodeLogWriter
+
+
+class MeasuredAgentTest(unittest.TestCase):
+    def setUp(self):
+        self.agent = MeasuredAgent()
+        self.agent.seed(0)
+        self.agent.resume_event.set()
+
+    def test_steps_are_published_without_gui(self):
+        self.agent.steps_per_second = 0
+
+        self.agent._step()
+        self.agent._step()
+
+        self.assertEqual(2, self.agent.channel.read().step_count)
+
+    def test_step_once_pauses_again(self):
+        self.agent.resume_event.clear()
+
+        self.agent.step_once()
+        self.agent._step()
+
+        self.assertFalse(self.agent.resume_event.is_set())
+        self.assertEqual(1, self.agent.step_count)
+
+    def test_steps_are_throttled(self):
+        self.agent.steps_per_second = 50
+        start = time.time()
+
+        for _ in range(6):
+            self.agent._step()
+
+        self.assertTrue(time.time() - start >= 0.09)
+
+    def test_fast_forward_flag_is_shared(self):
+        self.agent.start_fast_forward(3)
+
+        self.assertTrue(self.agent.shared.fast_forward.value)
+        self.agent.stop_fast_forward()
+        self.assertFalse(self.agent.shared.fast_forward.value)
+
+
+class SharedStatisticsTest(unittest.TestCase):
+    def setUp(self):
+        self.statistics = SharedStatistics(size=4, window=2)
+
+    def test_read_new_episodes(self):
+        for steps in [3, 4, 5]:
+            self.statistics.add(steps)
+
+        self.assertEqual((0, 1, array('I', [4, 5])),
+                         self.statistics.read(0, 1))
+
+    def test_overwritten_episodes_are_skipped(self):
+        for steps in range(10):
+            self.statistics.add(steps)
+
+        self.assertEqual((0, 6, array('I', [6, 7, 8, 9])),
+                         self.statistics.read(0, 2))
+
+    def test_reset_starts_new_generation(self):
+        self.statistics.add(1)
+
+        self.statistics.reset(array('I', [7, 8]))
+
+        self.assertEqual((1, 0, array('I', [7, 8])),
+                         self.statistics.read(0, 1))
+        self.assertEqual((2, 8, 15, 7.5), self.statistics.summary())
+
+    def test_summary(self):
+        for steps in [3, 9, 4, 2, 8]:
+            self.statistics.add(steps)
+
+        self.assertEqual((5, 9, 26, 5.0), self.statistics.summary())
+
+    def test_summary_without_episodes(self):
+        self.assertEqual((0, 0, 0, 0.0), self.statistics.summary())
+
+    def test_window_larger_than_ring(self):
+        self.assertRaises(ValueError, SharedStatistics, 4, 5)
+
+
+class EpisodeHistoryTest(unittest.TestCase):
+    def test_old_episodes_are_read_from_log(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        log = EpisodeLogWriter(os.path.join(directory, 'episodes.bin'))
+        statistics = SharedStatistics(size=4, window=2)
+        history = EpisodeHistory(statistics, log.path)
+        for steps in range(10):
+            statistics.add(steps)
+            log.append(steps, 0)
+        log.flush()
+
+        self.assertEqual(array('I', range(10)), history.update().read())
+        statistics.add(10)
+        self.assertEqual(array('I', range(11)), history.update().read())
+        self.assertEqual(4, len(history.steps_per_episode.ring))
+
+
+class AgentProcessTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.process = AgentProcess(self.directory)
+        self.process.start()
+
+    def tearDown(self):
+        self.process.stop()
+        self.process.join()
+        shutil.rmtree(self.directory)
+
+    def restart(self):
+        self.process.stop()
+        self.process.join()
+        self.process = AgentProcess(self.directory)
+        self.process.start()
+
+    def metrics(self):
+        self.process.request_metrics()
+        messages = []
+        self.wait_for(lambda: messages.extend(self.process.messages()) or
+                      messages)
+        return messages[0][1]
+
+    def wait_for(self, condition):
+        deadline = time.time() + 10
+        while not condition():
+            self.assertTrue(time.time() < deadline)
+            time.sleep(0.01)
+
+    def test_step_once(self):
+        self.assertIn('features', self.process.config)
+
+        self.process.step_once()
+
+        self.wait_for(lambda: self.process.channel.read() is not None and
+                      self.process.channel.read().step_count == 1)
+        self.assertFalse(self.process.resume_event.is_set())
+
+    def test_training_is_reported(self):
+        self.process.configure({'steps_per_second': 0, 'epsilon': 0.5})
+        self.process.resume_event.set()
+
+        self.wait_for(lambda: len(self.process.history.update()) >= 3)
+        self.assertEqual(0.5, self.process.config['epsilon'])
+
+    def test_timings(self):
+        self.process.instrument(True)
+        self.process.configure({'steps_per_second': 0})
+        self.process.resume_event.set()
+        self.wait_for(lambda: len(self.process.history.update()) >= 3)
+
+        self.process.request_timings()
+        messages = []
+        self.wait_for(lambda: messages.extend(self.process.messages()) or
+                      messages)
+
+        kind, timings = messages[0]
+        self.assertEqual('timings', kind)
+        self.assertGreater(timings['phases']['execute_action']['calls'], 0)
+
+    def test_metrics(self):
+        self.process.configure({'steps_per_second': 0})
+        self.process.resume_event.set()
+        self.wait_for(lambda: len(self.process.history.update()) >= 3)
+
+        self.process.request_metrics()
+        messages = []
+        self.wait_for(lambda: messages.extend(self.process.messages()) or
+                      messages)
+
+        kind, values = messages[0]
+        self.assertEqual('metrics', kind)
+        self.assertGreaterEqual(values['episodes_total'], 3)
+        self.assertGreater(values['q_entries'], 0)
+
+    def test_restart_continues_from_checkpoint(self):
+        self.process.configure({'steps_per_second': 0})
+        self.process.resume_event.set()
+        self.wait_for(lambda: len(self.process.history.update()) >= 3)
+        self.process.resume_event.clear()
+
+        self.restart()
+
+        # the stopped process has written a final checkpoint
+        history = self.process.history.update().read()
+        self.assertGreaterEqual(len(history), 3)
+        entries = self.metrics()['q_entries']
+        self.assertGreater(entries, 0)
+        self.restart()
+        self.assertEqual(entries, self.metrics()['q_entries'])
+        self.assertEqual(history, self.process.history.update().read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 import environment
-from agent import PerceivedState
+from agent import Agent, PerceivedState
 from environment import Environment
 
 from mock import MagicMock
@@ -37,5 +37,60 @@ class PerceivedStateTest(unittest.TestCase):
         self.assertNotEqual(state1, state2)
 
 
+class EpisodeLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.agent = Agent()
+        self.agent.seed(0)
+        self.agent._step = MagicMock()
+        self.agent._is_game_over = MagicMock(return_value=False)
+
+    def test_episode_stops_at_piece_limit(self):
+        self.agent.max_pieces_per_episode = 3
+
+        self.agent._episode()
+
+        self.assertEqual(3, self.agent._step.call_count)
+        self.assertTrue(self.agent.truncated)
+
+    def test_episode_stops_at_time_budget(self):
+        self.agent.episode_time_budget = 0
+
+        self.agent._episode()
+
+        self.assertEqual(0, self.agent._step.call_count)
+        self.assertTrue(self.agent.truncated)
+
+    def test_game_over_is_not_truncation(self):
+        self.agent.max_pieces_per_episode = 3
+        self.agent._is_game_over = MagicMock(side_effect=[False, True])
+
+        self.agent._episode()
+
+        self.assertFalse(self.agent.truncated)
+
+    def test_run_stops_at_time_budget(self):
+        self.agent._episode = MagicMock()
+
+        self.assertEqual(0, self.agent.run(5, time_budget=0))
+        self.assertEqual(5, self.agent.run(5, time_budget=60))
+        self.assertEqual(5, self.agent._episode.call_count)
+
+
+class TruncationTargetTest(unittest.TestCase):
+
+    def test_last_update_of_truncated_episode_bootstraps(self):
+        agent = Agent()
+        agent.seed(0)
+        agent.max_pieces_per_episode = 1
+        agent._find_best_Q_value = MagicMock(return_value=10)
+
+        agent._episode()
+
+        (state, action), value = agent.Q.items()[0]
+        expected = agent.alpha * (agent.latest_reward + agent.gamma * 10)
+        self.assertAlmostEqual(expected, value)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+"""
+Speed benchmarks of the simulation core.
+
+Micro benchmarks time single operations (placing a shape, the possible
+actions, every state and reward feature, ...) on recorded boards, macro
+benchmarks time whole steps and episodes of a learning agent. The boards are
+recorded from games with a fixed seed, so every run measures the same work.
+
+Every benchmark is warmed up, then run for a number of rounds that each take
+at least min_time seconds. The result of a benchmark is the operations per
+second of every round and their statistics.
+
+--startup starts a new interpreter that imports the modules of a worker
+process and checks the import time against STARTUP_BUDGET. These must load
+with the standard library only, numpy, BitVector and the GUI libraries are
+imported on first use. The startup is not part of the regular benchmarks.
+
+Usage: python benchmarks.py --json benchmarks.json --filter features
+"""
+import argparse
+import copy
+import inspect
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import timeit
+
+from agent import Agent
+from environment import Environment, SHAPES_BY_NAME
+import evaluation
+import features
+import reward_features
+import runner
+
+DEFAULT_BOARDS = 200
+DEFAULT_REPEAT = 5
+DEFAULT_WARMUP = 1
+DEFAULT_MIN_TIME = 0.2  # seconds per round
+FORMAT_VERSION = 1
+# modules of training, sweep and evaluation workers
+WORKER_MODULES = ['runner', 'evaluation', 'sweep', 'reward_optimizer']
+HEAVY_MODULES = ['numpy', 'BitVector', 'matplotlib', 'Tkinter']
+STARTUP_BUDGET = 0.05  # seconds to import WORKER_MODULES
+STARTUP_CODE = '''
+import sys, timeit
+start = timeit.default_timer()
+import {0}
+print timeit.default_timer() - start
+print ' '.join(m for m in {1!r} if m in sys.modules)
+'''
+
+
+class Board(object):
+    """
+    Field and current shape of a recorded game.
+    """
+
+    def __init__(self, blocks, shape, action):
+        self.blocks = blocks
+        self.shape = shape  # name of the shape
+        self.action = action  # a possible action for the shape
+
+    def environment(self, rewards=None):
+        """
+        :param rewards: reward features and weights, the default of
+                        Environment if None
+        :return: new Environment with a copy of the board
+        """
+        environment = Environment()
+        environment.field.initialize(copy.deepcopy(self.blocks))
+        environment.current_shape = SHAPES_BY_NAME[self.shape]()
+        if rewards is not None:
+            environment.rewards = rewards
+        return environment
+
+
+def record_boards(count=DEFAULT_BOARDS, seed=0):
+    """
+    Plays random games and records the board before every step.
+
+    :return: list of Board
+    """
+    rand = random.Random(seed)
+    environment = Environment()
+    environment.random.seed(seed + 1)
+    environment.initialize()
+    boards = []
+    while len(boards) < count:
+        if environment.is_game_over():
+            environment.initialize()
+            continue
+        action = rand.choice(environment.possible_actions())
+        boards.append(Board(copy.deepcopy(environment.field.blocks),
+                            environment.current_shape.name, action))
+        environment.execute_action(action)
+    return boards
+
+
+def measure(operation, inputs, repeat=DEFAULT_REPEAT, warmup=DEFAULT_WARMUP,
+            min_time=DEFAULT_MIN_TIME):
+    """
+    :param operation: function called with one input per operation
+    :param inputs: function returning a list with the given number of
+                   inputs, called before every round and not timed
+    :return: dictionary with the operations per round, the operations per
+             second of every round and their statistics
+    """
+    number = 1
+    while True:
+        seconds = _time_round(operation, inputs(number))
+        if seconds >= min_time:
+            break
+        # aim a bit above min_time, so the rounds do not fall short
+        number = max(number * 2, int(number * 1.2 * min_time /
+                                     max(seconds, 1e-9)))
+    for _ in range(warmup):
+        _time_round(operation, inputs(number))
+
+    rates = []
+    for _ in range(repeat):
+        seconds = _time_round(operation, inputs(number))
+        rates.append(number / seconds)
+    return {
+        'number': number,
+        'rounds': rates,
+        'ops_per_second': evaluation.summarize(rates),
+    }
+
+
+def startup(modules=WORKER_MODULES):
+    """
+    Imports the modules in a new interpreter, like a new worker process.
+
+    :return: tuple (seconds of the imports, loaded modules of HEAVY_MODULES)
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-c',
+         STARTUP_CODE.format(', '.join(modules), HEAVY_MODULES)],
+        cwd=os.path.dirname(os.path.abspath(__file__)))
+    seconds, heavy = output.split('\n')[:2]
+    return float(seconds), heavy.split()
+
+
+def _time_round(operation, inputs):
+    start = timeit.default_timer()
+    for value in inputs:
+        operation(value)
+    return timeit.default_timer() - start
+
+
+def _cycle(values, number):
+    return [values[i % len(values)] for i in range(number)]
+
+
+def _functions(module):
+    return inspect.getmembers(module, lambda member: inspect.isfunction(
+        member) and member.__module__ == module.__name__)
+
+
+def benchmarks(boards, config=None, seed=0):
+    """
+    :return: list of tuples (name, operation, inputs) for measure()
+    """
+    agent = Agent()
+    runner.configure_agent(agent, config or {})
+    state_class = agent.state_class
+    state_features = agent.features
+    rewards = agent.environment.rewards
+
+    environments = [board.environment(rewards) for board in boards]
+
+    def shared_environments(number):
+        return _cycle(environments, number)
+
+    def place_inputs(number):
+        return [(board.environment(rewards), board.action)
+                for board in _cycle(boards, number)]
+
+    def place(value):
+        environment, action = value
+        environment.field.place(environment.current_shape, action)
+
+    def execute_action(value):
+        environment, action = value
+        environment.execute_action(action)
+
+    result = [
+        ('field.place', place, place_inputs),
+        ('environment.possible_actions',
+         lambda environment: environment.possible_actions(),
+         shared_environments),
+        ('environment.execute_action', execute_action, place_inputs),
+        ('environment.is_game_over',
+         lambda environment: environment.is_game_over(),
+         shared_environments),
+        ('agent.perceived_state',
+         lambda environment: state_class(environment, *state_features),
+         shared_environments),
+    ]
+    for module in (features, reward_features):
+        for name, function in _functions(module):
+            result.append(('{0}.{1}'.format(module.__name__, name), function,
+                           shared_environments))
+
+    # a new seeded agent with an empty Q-table for every round, so a round
+    # does not depend on what was learned in the rounds before
+    def agent_inputs(number):
+        fresh = Agent()
+        runner.configure_agent(fresh, config or {})
+        fresh.seed(seed)
+        return [fresh] * number
+
+    def step(fresh):
+        if fresh._is_game_over():
+            fresh._initialize_state()
+        fresh._step()
+
+    result.append(('agent.step', step, agent_inputs))
+    result.append(('agent.episode', lambda fresh: fresh._episode(),
+                   agent_inputs))
+    return result
+
+
+def run(names=None, board_count=DEFAULT_BOARDS, seed=0, config=None,
+        repeat=DEFAULT_REPEAT, warmup=DEFAULT_WARMUP,
+        min_time=DEFAULT_MIN_TIME, progress=None):
+    """
+    :param names: substrings, only benchmarks containing one of them are run
+    :param progress: called with the name and result of every benchmark
+    :return: dictionary with the environment and the results
+    """
+    boards = record_boards(board_count, seed)
+    results = {}
+    for name, operation, inputs in benchmarks(boards, config, seed):
+        if names and not any(part in name for part in names):
+            continue
+        results[name] = measure(operation, inputs, repeat, warmup, min_time)
+        if progress:
+            progress(name, results[name])
+    return {
+        'version': FORMAT_VERSION,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'boards': board_count,
+        'config': config or {},
+        'repeat': repeat,
+        'warmup': warmup,
+        'min_time': min_time,
+        'benchmarks': results,
+    }
+
+
+def _commit():
+    """
+    :return: hash of the checked out commit, None if not available
+    """
+    try:
+        with open('/dev/null', 'w') as devnull:
+            return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                           stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(name, result):
+    s = result['ops_per_second']
+    print '{0:<55} {1:>12.0f} ops/s  +- {2:>5.1f}%  ({3} x {4})'.format(
+        name, s['median'], 100 * s['std'] / s['mean'] if s['mean'] else 0,
+        len(result['rounds']), result['number'])
+
+
+def check_startup():
+    seconds = min(startup()[0] for _ in range(DEFAULT_REPEAT))
+    heavy = startup()[1]
+    print 'import of {0}: {1:.1f} ms, budget {2:.0f} ms'.format(
+        ', '.join(WORKER_MODULES), 1000 * seconds, 1000 * STARTUP_BUDGET)
+    if heavy:
+        print 'loaded at startup: {0}'.format(', '.join(heavy))
+    if seconds > STARTUP_BUDGET or heavy:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the simulation '
+                                                 'core.')
+    parser.add_argument('--filter', nargs='*', default=None,
+                        help='only run benchmarks containing one of these')
+    parser.add_argument('--config', default=None,
+                        help='run configuration for the agent benchmarks')
+    parser.add_argument('--boards', type=int, default=DEFAULT_BOARDS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP)
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME,
+                        help='seconds per round')
+    parser.add_argument('--list', action='store_true',
+                        help='only print the names of the benchmarks')
+    parser.add_argument('--json', default=None,
+                        help='file the results are written to')
+    parser.add_argument('--startup', action='store_true',
+                        help='only check the imports of a worker process '
+                             'against the budget, exits with status 1 if it '
+                             'is exceeded')
+    args = parser.parse_args()
+
+    if args.startup:
+        check_startup()
+        return
+
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+
+    if args.list:
+        for name, _, _ in benchmarks(record_boards(1, args.seed), config):
+            print name
+        return
+
+    result = run(args.filter, args.boards, args.seed, config, args.repeat,
+                 args.warmup, args.min_time, print_result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
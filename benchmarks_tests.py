@@ -0,0 +1,77 @@
+import json
+import unittest
+
+import benchmarks
+
+
+class BenchmarksTest(unittest.TestCase):
+    def test_boards_are_reproducible(self):
+        first = benchmarks.record_boards(30, seed=4)
+        second = benchmarks.record_boards(30, seed=4)
+
+        self.assertEqual([(b.blocks, b.shape, b.action) for b in first],
+                         [(b.blocks, b.shape, b.action) for b in second])
+
+    def test_board_environment_is_a_copy(self):
+        board = benchmarks.record_boards(1)[0]
+        environment = board.environment()
+
+        environment.execute_action(board.action)
+
+        self.assertNotEqual(board.blocks, environment.field.blocks)
+        self.assertEqual(board.shape, board.environment().current_shape.name)
+
+    def test_measure_rounds(self):
+        calls = []
+
+        result = benchmarks.measure(calls.append, lambda n: range(n),
+                                    repeat=3, warmup=1, min_time=0.001)
+
+        self.assertEqual(3, len(result['rounds']))
+        self.assertGreater(result['number'], 1)
+        self.assertGreater(result['ops_per_second']['median'], 0)
+        # calibration, warmup and rounds all use fresh inputs
+        self.assertGreaterEqual(len(calls), 5 * result['number'])
+
+    def test_every_feature_is_benchmarked(self):
+        names = [name for name, _, _ in
+                 benchmarks.benchmarks(benchmarks.record_boards(2))]
+
+        self.assertIn('features.number_of_holes', names)
+        self.assertIn('reward_features.removed_line_reward', names)
+        self.assertIn('agent.episode', names)
+
+    def test_agent_rounds_are_independent(self):
+        inputs = dict((name, inputs) for name, _, inputs in
+                      benchmarks.benchmarks(benchmarks.record_boards(2)))[
+            'agent.episode']
+        sizes = []
+        for _ in range(2):
+            agents = inputs(3)
+            self.assertEqual(0, len(agents[0].Q))
+            for agent in agents:
+                agent._episode()
+            sizes.append(len(agents[0].Q))
+
+        self.assertEqual(sizes[0], sizes[1])
+
+    def test_run_is_json(self):
+        result = benchmarks.run(['field.place', 'agent.step'], board_count=5,
+                                repeat=2, warmup=0, min_time=0.001)
+
+        self.assertEqual(['agent.step', 'field.place'],
+                         sorted(result['benchmarks']))
+        self.assertEqual(result, json.loads(json.dumps(result)))
+
+    def test_workers_start_without_heavy_modules(self):
+        seconds, heavy = benchmarks.startup()
+
+        self.assertEqual([], heavy)
+        self.assertGreater(seconds, 0)
+
+    def test_startup_reports_heavy_modules(self):
+        self.assertEqual(['numpy'], benchmarks.startup(['qtable'])[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
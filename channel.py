@@ -0,0 +1,71 @@
+"""
+Passes the latest state of the agent to the GUI.
+"""
+from collections import namedtuple
+import ctypes
+import multiprocessing
+
+from settings import FIELD_HEIGHT, FIELD_WIDTH
+
+BoardState = namedtuple('BoardState', ['version', 'board', 'step_count',
+                                       'episode_count', 'action_from_q'])
+LABEL_SIZE = 64
+
+
+class LatestStateChannel(object):
+    """
+    Holds only the most recent state. The agent overwrites it in place, so
+    the memory stays the same however slow the GUI reads, and the GUI always
+    gets the current board. The state is kept in shared memory, so agent and
+    GUI may run in different processes if the channel is created before the
+    process is started.
+
+    The board is stored column by column with one byte per block: 0 for an
+    empty block, otherwise the character of the shape.
+    """
+
+    def __init__(self, width=FIELD_WIDTH, height=FIELD_HEIGHT):
+        self.width = width
+        self.height = height
+        self.lock = multiprocessing.Lock()
+        size = width * height
+        self._board = bytearray(size)  # filled by the writer, then copied
+        self._board_view = (ctypes.c_char * size).from_buffer(self._board)
+        self._shared_board = multiprocessing.RawArray(ctypes.c_char, size)
+        # version, step count, episode count
+        self._counters = multiprocessing.RawArray(ctypes.c_long, 3)
+        self._label = multiprocessing.RawArray(ctypes.c_char, LABEL_SIZE)
+
+    def publish(self, blocks, step_count, episode_count, action_from_q):
+        """
+        :param blocks: Field.blocks, indexed by column and row
+        :param action_from_q: shown as text, at most LABEL_SIZE - 1
+                              characters are kept
+        """
+        board = self._board
+        height = self.height
+        for x, column in enumerate(blocks):
+            offset = x * height
+            for y, block in enumerate(column):
+                board[offset + y] = ord(block) if block else 0
+
+        with self.lock:
+            ctypes.memmove(self._shared_board, self._board_view, len(board))
+            self._label.value = str(action_from_q)[:LABEL_SIZE - 1]
+            counters = self._counters
+            counters[1] = step_count
+            counters[2] = episode_count
+            counters[0] += 1
+
+    def read(self, last_version=None):
+        """
+        :param last_version: version of the state read before
+        :return: BoardState with a copy of the board, None if nothing was
+                 published since last_version
+        """
+        with self.lock:
+            counters = self._counters
+            if counters[0] == last_version:
+                return None
+            return BoardState(counters[0], self._shared_board.raw,
+                              counters[1], counters[2], self._label.value)
@@ -0,0 +1,93 @@
+import multiprocessing
+import threading
+import unittest
+
+from channel import LatestStateChannel
+from environment import Environment, OShape
+
+
+class LatestStateChannelTest(unittest.TestCase):
+    def setUp(self):
+        self.channel = LatestStateChannel(width=3, height=2)
+
+    def test_nothing_published(self):
+        state = self.channel.read()
+
+        self.assertEqual('\0' * 6, state.board)
+        self.assertIsNone(self.channel.read(state.version))
+
+    def test_board_is_stored_column_by_column(self):
+        self.channel.publish([[0, 'o'], [0, 0], ['i', 'i']], 5, 2, True)
+
+        state = self.channel.read()
+
+        self.assertEqual('\0o\0\0ii', state.board)
+        self.assertEqual((5, 2, 'True'), (state.step_count,
+                                          state.episode_count,
+                                          state.action_from_q))
+
+    def test_only_latest_state_is_kept(self):
+        for step in range(100):
+            self.channel.publish([[0, 0], [0, 0], [0, 0]], step, 0, False)
+
+        state = self.channel.read()
+
+        self.assertEqual(99, state.step_count)
+        self.assertIsNone(self.channel.read(state.version))
+        self.channel.publish([[0, 0], [0, 0], [0, 0]], 100, 0, False)
+        self.assertEqual(100, self.channel.read(state.version).step_count)
+
+    def test_read_gets_copy(self):
+        self.channel.publish([['o', 0], [0, 0], [0, 0]], 1, 0, False)
+        state = self.channel.read()
+
+        self.channel.publish([[0, 0], [0, 0], [0, 0]], 2, 0, False)
+
+        self.assertEqual('o\0\0\0\0\0', state.board)
+
+    def test_publish_environment_field(self):
+        channel = LatestStateChannel()
+        env = Environment()
+        env.current_shape = OShape()
+        env.field.place(env.current_shape, env.possible_actions()[0])
+
+        channel.publish(env.field.blocks, 1, 0, False)
+
+        self.assertEqual(4, channel.read().board.count('o'))
+
+    def test_state_is_shared_with_child_process(self):
+        process = multiprocessing.Process(
+            target=self.channel.publish,
+            args=([['z', 0], [0, 0], [0, 0]], 7, 1, 'Random'))
+        process.start()
+        process.join()
+
+        state = self.channel.read()
+
+        self.assertEqual('z\0\0\0\0\0', state.board)
+        self.assertEqual((7, 'Random'), (state.step_count,
+                                         state.action_from_q))
+
+    def test_concurrent_reads_see_complete_boards(self):
+        full = [['o', 'o'], ['o', 'o'], ['o', 'o']]
+        empty = [[0, 0], [0, 0], [0, 0]]
+        stop = threading.Event()
+
+        def publish():
+            while not stop.is_set():
+                self.channel.publish(full, 0, 0, False)
+                self.channel.publish(empty, 0, 0, False)
+
+        thread = threading.Thread(target=publish)
+        thread.start()
+        try:
+            for _ in range(1000):
+                self.assertIn(self.channel.read().board,
+                              ['o' * 6, '\0' * 6])
+        finally:
+            stop.set()
+            thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+"""
+Incremental checkpoints of the Q-table.
+
+A checkpoint directory contains a full snapshot (qtable.py format) and a
+delta log. Every checkpoint appends the Q-values changed since the last one
+to the delta log, so its cost depends on the number of recent updates and
+not on the size of the table. From time to time the log is compacted into a
+new snapshot.
+
+    delta log  magic, version, generation of the snapshot it belongs to,
+               followed by batches: payload length, crc32, payload
+    payload    entries: length of the state data, action id, value,
+               state data (see qtable.py)
+
+Snapshot and log are replaced by renaming complete files. A batch that was
+cut off by a crash fails the length or checksum test and is dropped, a log
+of an older generation is ignored because its changes are in the snapshot.
+
+Usage: python checkpoint.py restore checkpoints q-table.bin
+"""
+import argparse
+import ast
+import os
+import struct
+import threading
+import time
+import zlib
+
+from agent import PerceivedState
+from environment import Action
+# qtable loads numpy, it is imported where it is used
+
+CHECKPOINT_DIRECTORY = 'checkpoints'
+SNAPSHOT_FILENAME = 'q-table.bin'
+DELTA_FILENAME = 'q-delta.log'
+DELTA_MAGIC = 'TQDL'
+DELTA_VERSION = 1
+DELTA_HEADER = struct.Struct('<4sIQ')
+BATCH = struct.Struct('<II')
+ENTRY = struct.Struct('<IBd')
+
+DEFAULT_INTERVAL = 5  # seconds
+DEFAULT_COMPACT_RATIO = 0.5
+MIN_COMPACT_BYTES = 1 << 20
+
+
+class Checkpointer(object):
+    def __init__(self, agent, directory=CHECKPOINT_DIRECTORY,
+                 interval=DEFAULT_INTERVAL,
+                 compact_ratio=DEFAULT_COMPACT_RATIO, lock=None):
+        """
+        :param interval: minimum seconds between two checkpoints
+        :param compact_ratio: the log is compacted when it is larger than
+                              this fraction of the snapshot (and larger than
+                              MIN_COMPACT_BYTES)
+        :param lock: held while writing a checkpoint, for agents whose
+                     Q-table is replaced by another thread
+        """
+        self.agent = agent
+        self.lock = lock or threading.Lock()
+        self.directory = directory
+        self.interval = interval
+        self.compact_ratio = compact_ratio
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILENAME)
+        self.delta_path = os.path.join(directory, DELTA_FILENAME)
+        self.last_checkpoint = time.time()
+        self._compaction_requested = True
+
+        # generations continue, so an old log never matches a new snapshot
+        self.generation = 0
+        if os.path.exists(self.snapshot_path):
+            import qtable
+            self.generation = qtable.MappedQTable(
+                self.snapshot_path).metadata.get('checkpoint_generation', 0)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        agent.changed_entries = set()
+        agent.checkpointer = self
+
+    def restore(self):
+        """
+        Replaces the Q-table of the agent with the one in the checkpoint
+        directory.
+
+        :return: False if there is no checkpoint
+        """
+        Q, self.generation = load_checkpoint(self.directory)
+        if Q is None:
+            return False
+        self.agent.Q = Q
+        self.agent.changed_entries = set()
+        self._compaction_requested = True
+        return True
+
+    def request_compaction(self):
+        """
+        The next checkpoint writes a full snapshot, e.g. after the Q-table
+        of the agent was replaced.
+        """
+        self._compaction_requested = True
+
+    def maybe_checkpoint(self):
+        if time.time() - self.last_checkpoint >= self.interval:
+            self.checkpoint()
+
+    def checkpoint(self):
+        with self.lock:
+            if self._compaction_requested or self._log_too_large():
+                self.compact()
+            else:
+                self._append_delta()
+        self.last_checkpoint = time.time()
+
+    def compact(self):
+        self.agent.changed_entries = set()
+        self.generation += 1
+        import qtable
+        qtable.save(self.agent.Q, self.snapshot_path,
+                    {'checkpoint_generation': self.generation})
+
+        temporary = self.delta_path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(DELTA_HEADER.pack(DELTA_MAGIC, DELTA_VERSION,
+                                      self.generation))
+            _sync(f)
+        os.rename(temporary, self.delta_path)
+        self._compaction_requested = False
+
+    def _append_delta(self):
+        changed = self.agent.changed_entries
+        self.agent.changed_entries = set()
+        if not changed:
+            return
+
+        import qtable
+        Q = self.agent.Q
+        parts = []
+        for key in changed:
+            data = qtable.state_data(key[0])
+            parts.append(ENTRY.pack(len(data), key[1].to_id(), Q[key]))
+            parts.append(data)
+        payload = ''.join(parts)
+
+        with open(self.delta_path, 'ab') as f:
+            f.write(BATCH.pack(len(payload), zlib.crc32(payload) & 0xffffffff))
+            f.write(payload)
+            _sync(f)
+
+    def _log_too_large(self):
+        try:
+            size = os.path.getsize(self.delta_path)
+            return size > MIN_COMPACT_BYTES and size > \
+                self.compact_ratio * os.path.getsize(self.snapshot_path)
+        except OSError:
+            return True
+
+
+def _sync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def load_checkpoint(directory=CHECKPOINT_DIRECTORY):
+    """
+    Loads snapshot and delta log of a checkpoint directory.
+
+    :return: tuple (Q-table or None, generation)
+    """
+    snapshot_path = os.path.join(directory, SNAPSHOT_FILENAME)
+    if not os.path.exists(snapshot_path):
+        return None, 0
+
+    import qtable
+    Q = qtable.load(snapshot_path)
+    generation = Q.mapped.metadata.get('checkpoint_generation', 0)
+    delta_path = os.path.join(directory, DELTA_FILENAME)
+    if os.path.exists(delta_path):
+        for key, value in read_delta(delta_path, generation):
+            Q[key] = value
+    return Q, generation
+
+
+def read_delta(path, generation):
+    """
+    Reads the complete batches of a delta log and truncates an incomplete
+    batch at its end, so that new batches can be appended.
+
+    :return: list of ((state, action), value) in the order of writing
+    """
+    entries = []
+    with open(path, 'r+b') as f:
+        header = f.read(DELTA_HEADER.size)
+        if len(header) < DELTA_HEADER.size:
+            return entries
+        magic, version, log_generation = DELTA_HEADER.unpack(header)
+        if magic != DELTA_MAGIC or version != DELTA_VERSION:
+            raise ValueError('{0} is no delta log of version {1}'.format(
+                path, DELTA_VERSION))
+        if log_generation != generation:
+            return entries
+
+        valid = f.tell()
+        while True:
+            batch = f.read(BATCH.size)
+            if len(batch) < BATCH.size:
+                break
+            length, checksum = BATCH.unpack(batch)
+            payload = f.read(length)
+            if len(payload) < length or \
+                    zlib.crc32(payload) & 0xffffffff != checksum:
+                break
+            entries.extend(_entries(payload))
+            valid = f.tell()
+
+        f.truncate(valid)
+    return entries
+
+
+def _entries(payload):
+    position = 0
+    states = {}
+    while position < len(payload):
+        length, action_id, value = ENTRY.unpack_from(payload, position)
+        position += ENTRY.size
+        data = payload[position:position + length]
+        position += length
+
+        state = states.get(data)
+        if state is None:
+            shape, features = ast.literal_eval(data)
+            state = states[data] = PerceivedState.from_values(shape, features)
+        yield (state, Action.from_id(action_id)), value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Restores the Q-table of a '
+                                                 'checkpoint directory.')
+    commands = parser.add_subparsers(dest='command')
+    restore_parser = commands.add_parser('restore')
+    restore_parser.add_argument('directory', nargs='?',
+                                default=CHECKPOINT_DIRECTORY)
+    restore_parser.add_argument('output')
+    args = parser.parse_args()
+
+    Q, generation = load_checkpoint(args.directory)
+    if Q is None:
+        parser.error('no checkpoint in {0}'.format(args.directory))
+    import qtable
+    qtable.save(Q, args.output)
+    print '{0} entries of generation {1} written to {2}'.format(
+        len(Q), generation, args.output)
+
+
+if __name__ == '__main__':
+    main()
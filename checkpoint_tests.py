@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from agent import Agent
+import checkpoint
+from checkpoint import Checkpointer
+
+
+class CheckpointerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.agent = Agent()
+        self.agent.seed(0)
+        self.checkpointer = Checkpointer(self.agent, self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def restored(self):
+        Q, _ = checkpoint.load_checkpoint(self.directory)
+        return dict(Q.iteritems())
+
+    def learned(self):
+        # entries only read by the agent are not written to the delta log
+        return dict((key, value) for key, value in self.agent.Q.iteritems()
+                    if value != 0)
+
+    def test_first_checkpoint_is_snapshot(self):
+        self.agent.run(2)
+        self.checkpointer.checkpoint()
+
+        self.assertEqual(dict(self.agent.Q), self.restored())
+        self.assertEqual(1, self.checkpointer.generation)
+
+    def test_checkpoints_append_changes(self):
+        self.checkpointer.checkpoint()
+        self.agent.run(3)
+        self.checkpointer.checkpoint()
+        self.agent.run(3)
+        self.checkpointer.checkpoint()
+
+        self.assertEqual(self.learned(),
+                         dict((k, v) for k, v in self.restored().iteritems()
+                              if v != 0))
+        self.assertEqual(1, self.checkpointer.generation)
+        self.assertEqual(set(), self.agent.changed_entries)
+
+    def test_incomplete_batch_is_dropped(self):
+        self.checkpointer.checkpoint()
+        self.agent.run(2)
+        self.checkpointer.checkpoint()
+        expected = self.restored()
+        self.agent.run(2)
+        self.checkpointer.checkpoint()
+        delta = os.path.join(self.directory, checkpoint.DELTA_FILENAME)
+        size = os.path.getsize(delta)
+        with open(delta, 'r+b') as f:
+            f.truncate(size - 3)
+
+        self.assertEqual(expected, self.restored())
+        self.assertTrue(os.path.getsize(delta) < size - 3)
+
+    def test_log_of_older_generation_is_ignored(self):
+        self.checkpointer.checkpoint()
+        self.agent.run(2)
+        self.checkpointer.checkpoint()
+        delta = os.path.join(self.directory, checkpoint.DELTA_FILENAME)
+        with open(delta, 'rb') as f:
+            old_log = f.read()
+
+        self.agent.Q.clear()
+        self.checkpointer.compact()
+        with open(delta, 'wb') as f:
+            f.write(old_log)
+
+        self.assertEqual({}, self.restored())
+
+    def test_restore_continues_training(self):
+        self.agent.run(3)
+        self.checkpointer.checkpoint()
+        agent = Agent()
+        checkpointer = Checkpointer(agent, self.directory)
+
+        self.assertTrue(checkpointer.restore())
+        self.assertEqual(dict(self.agent.Q), dict(agent.Q.iteritems()))
+        agent.run(2)
+        checkpointer.checkpoint()
+        self.assertEqual(2, checkpointer.generation)
+
+    def test_checkpoint_holds_lock(self):
+        lock = mock.MagicMock()
+        checkpointer = Checkpointer(self.agent, self.directory, lock=lock)
+
+        checkpointer.checkpoint()
+
+        lock.__enter__.assert_called_once_with()
+        lock.__exit__.assert_called_once_with(None, None, None)
+
+    def test_restore_without_checkpoint(self):
+        self.assertFalse(Checkpointer(Agent(), self.directory).restore())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,8 @@ BOTTOM_INDEX = FIELD_HEIGHT - 1
 RIGHTMOST_INDEX = FIELD_WIDTH - 1
 SPAWN_LOCATION = FIELD_WIDTH / 2 - 1
 BASE_SCORE_MULTIPLIER = 10
+MAX_ROTATIONS = 4
+ACTION_SLOTS = MAX_ROTATIONS * FIELD_WIDTH
 
 
 class Environment(object):
@@ -244,6 +246,16 @@ class Action(object):
     def __repr__(self):
         return "Action({0}, {1})".format(self.column, self.rotation)
 
+    def to_id(self):
+        """
+        Number of the action between 0 and ACTION_SLOTS - 1
+        """
+        return self.rotation * FIELD_WIDTH + self.column
+
+    @staticmethod
+    def from_id(action_id):
+        return Action(action_id % FIELD_WIDTH, action_id // FIELD_WIDTH)
+
 
 class Shape(object):
     def __init__(self, name, spawn_column=SPAWN_LOCATION):
@@ -354,5 +366,10 @@ class ZShape(Shape):
             [[0, 1], [0, 2], [1, 0], [1, 1]]
         ]
 
+
+SHAPES_BY_NAME = dict((shape().name, shape) for shape in
+                      [OShape, JShape, IShape, LShape, ZShape, TShape, SShape])
+
+
 class InvalidActionError(RuntimeError):
     pass
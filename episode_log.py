@@ -0,0 +1,235 @@
+"""
+Append-only log with one fixed size record per episode.
+
+    header   magic, version, length of the field list
+    fields   JSON list of the field names, padded to 4 bytes
+    records  one unsigned 32 bit integer per field and episode
+
+Records are collected in memory and written in batches, so the cost per
+episode does not depend on the length of the run. The reader loads arbitrary
+ranges of a field or a downsampled version of it without reading the rest of
+the file. RecentEpisodes keeps only the latest episodes in memory and reads
+the older ones from the log.
+"""
+from array import array
+import json
+import os
+import shutil
+import struct
+import threading
+
+EPISODE_LOG_FILENAME = 'episodes.bin'
+MAGIC = 'TEPL'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+FIELDS = ['steps', 'lines']
+BATCH_SIZE = 1024  # episodes
+RECENT_EPISODES = 1 << 16  # kept in memory, much more than BATCH_SIZE
+
+
+def _read_header(f, path):
+    magic, version, length = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('{0} is no episode log of version {1}'.format(
+            path, VERSION))
+    return json.loads(f.read(length)), HEADER.size + length
+
+
+class EpisodeLogWriter(object):
+    def __init__(self, path, fields=FIELDS, append=False,
+                 batch_size=BATCH_SIZE):
+        """
+        :param append: continue an existing log instead of starting a new one
+        """
+        self.path = path
+        self.fields = list(fields)
+        self.batch_size = batch_size
+        self.buffer = array('I')
+        self.lock = threading.Lock()
+        self.file = None
+        self._open(append and os.path.exists(path))
+
+    def _open(self, append):
+        if append:
+            with open(self.path, 'r+b') as f:
+                fields, data_offset = _read_header(f, self.path)
+                if fields != self.fields:
+                    raise ValueError('{0} has the fields {1}'.format(
+                        self.path, fields))
+                # drop a record that was only written in part
+                record_size = 4 * len(fields)
+                size = os.path.getsize(self.path)
+                f.truncate(size - (size - data_offset) % record_size)
+        else:
+            header = json.dumps(self.fields)
+            header += ' ' * (-(HEADER.size + len(header)) % 4)
+            with open(self.path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, len(header)))
+                f.write(header)
+        self.file = open(self.path, 'ab')
+
+    def append(self, *values):
+        with self.lock:
+            self.buffer.extend(values)
+            if len(self.buffer) >= self.batch_size * len(self.fields):
+                self._write()
+
+    def flush(self):
+        with self.lock:
+            self._write()
+
+    def _write(self):
+        self.buffer.tofile(self.file)
+        self.file.flush()
+        del self.buffer[:]
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self._write()
+                self.file.close()
+                self.file = None
+
+    def copy_to(self, path):
+        """
+        Writes the complete log to path (renamed when complete).
+        """
+        with self.lock:
+            self._write()
+            shutil.copyfile(self.path, path + '.tmp')
+        os.rename(path + '.tmp', path)
+
+    def replace_with(self, path):
+        """
+        Continues the log from a copy of the log at path.
+        """
+        with self.lock:
+            self.file.close()
+            del self.buffer[:]
+            shutil.copyfile(path, self.path)
+            self._open(True)
+
+    def reset(self):
+        with self.lock:
+            self.file.close()
+            del self.buffer[:]
+            self._open(False)
+
+
+class EpisodeLogReader(object):
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.fields, self.data_offset = _read_header(f, path)
+        self.record_size = 4 * len(self.fields)
+
+    def __len__(self):
+        return (os.path.getsize(self.path) - self.data_offset) // \
+            self.record_size
+
+    def read(self, field='steps', start=0, stop=None):
+        """
+        :return: array('I') with the values of the field for the episodes
+                 start to stop - 1
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        records = array('I')
+        if stop > start:
+            with open(self.path, 'rb') as f:
+                f.seek(self.data_offset + start * self.record_size)
+                records.fromfile(f, (stop - start) * len(self.fields))
+        return records[self.fields.index(field)::len(self.fields)]
+
+    def downsample(self, field='steps', buckets=1000, start=0, stop=None):
+        """
+        Splits the episodes into at most the given number of buckets of
+        equal size.
+
+        :return: list of tuples (first episode, minimum, maximum, mean)
+        """
+        values = self.read(field, start, stop)
+        size = max(1, -(-len(values) // buckets))
+        result = []
+        for i in xrange(0, len(values), size):
+            bucket = values[i:i + size]
+            result.append((start + i, min(bucket), max(bucket),
+                           sum(bucket) / float(len(bucket))))
+        return result
+
+
+class RecentEpisodes(object):
+    """
+    The values of the latest episodes in a ring of fixed size together with
+    the count, maximum and total of all episodes, so the memory does not
+    grow with the length of the training. Older episodes are read from the
+    episode log, which has written them long before they are overwritten in
+    the ring.
+    """
+
+    def __init__(self, size=RECENT_EPISODES, log_path=None, field='steps'):
+        """
+        :param log_path: episode log with all episodes, None if only the
+                         ring can be read
+        """
+        self.size = size
+        self.log_path = log_path
+        self.field = field
+        self.ring = array('I', [0]) * size
+        self.count = 0
+        self.maximum = 0
+        self.total = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        self.ring[self.count % self.size] = value
+        self.count += 1
+        if value > self.maximum:
+            self.maximum = value
+        self.total += value
+
+    def extend(self, values):
+        if not len(values):
+            return
+        self.maximum = max(self.maximum, max(values))
+        self.total += sum(values)
+        # the older values would be overwritten in the ring anyway
+        skipped = max(0, len(values) - self.size)
+        self.count += skipped
+        ring = self.ring
+        for value in values[skipped:]:
+            ring[self.count % self.size] = value
+            self.count += 1
+
+    def first(self):
+        """
+        :return: number of the oldest episode in the ring
+        """
+        return max(0, self.count - self.size)
+
+    def read(self, start=0, stop=None):
+        """
+        :return: array('I') with the values of the episodes start to
+                 stop - 1
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        first = self.first()
+        values = array('I')
+        if start < min(first, stop):
+            if self.log_path is None:
+                raise ValueError('episodes before {0} are only in the '
+                                 'episode log'.format(first))
+            values.extend(EpisodeLogReader(self.log_path).read(
+                self.field, start, min(first, stop)))
+        ring = self.ring
+        size = self.size
+        values.extend(ring[i % size] for i in xrange(max(start, first), stop))
+        return values
+
+    def recent(self, number):
+        """
+        :return: array('I') with the values of the latest number episodes
+                 that are still in the ring
+        """
+        return self.read(max(self.first(), self.count - number))
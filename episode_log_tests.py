@@ -0,0 +1,171 @@
+from array import array
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from episode_log import EpisodeLogReader, EpisodeLogWriter, RecentEpisodes
+from runner import RecordingAgent
+import util
+
+
+class EpisodeLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'episodes.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, count, batch_size=4):
+        log = EpisodeLogWriter(self.path, batch_size=batch_size)
+        for i in xrange(count):
+            log.append(i, i % 3)
+        return log
+
+    def test_records_are_written_in_batches(self):
+        log = self.write(10)
+
+        self.assertEqual(8, len(EpisodeLogReader(self.path)))
+        log.flush()
+        self.assertEqual(10, len(EpisodeLogReader(self.path)))
+
+    def test_read_range(self):
+        self.write(10).close()
+        reader = EpisodeLogReader(self.path)
+
+        self.assertEqual(array('I', range(10)), reader.read('steps'))
+        self.assertEqual(array('I', [0, 1, 2, 0]),
+                         reader.read('lines', 3, 7))
+        self.assertEqual(array('I', [8, 9]), reader.read('steps', 8, 20))
+
+    def test_downsample(self):
+        self.write(10).close()
+
+        buckets = EpisodeLogReader(self.path).downsample('steps', 3)
+
+        self.assertEqual([(0, 0, 3, 1.5), (4, 4, 7, 5.5), (8, 8, 9, 8.5)],
+                         buckets)
+
+    def test_append_drops_incomplete_record(self):
+        self.write(5).close()
+        with open(self.path, 'ab') as f:
+            f.write('\x01\x02')
+
+        log = EpisodeLogWriter(self.path, append=True)
+        log.append(5, 0)
+        log.close()
+
+        self.assertEqual(array('I', range(6)),
+                         EpisodeLogReader(self.path).read())
+
+    def test_append_with_other_fields_fails(self):
+        self.write(1).close()
+
+        self.assertRaises(ValueError, EpisodeLogWriter, self.path, ['steps'],
+                          True)
+
+
+class RecentEpisodesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'episodes.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_only_the_latest_episodes_are_kept(self):
+        recent = RecentEpisodes(size=4)
+        recent.extend(array('I', [5, 1, 9]))
+        for steps in [2, 3, 4, 6]:
+            recent.append(steps)
+
+        self.assertEqual(4, len(recent.ring))
+        self.assertEqual((7, 9, 30), (len(recent), recent.maximum,
+                                      recent.total))
+        self.assertEqual(array('I', [3, 4, 6]), recent.read(4))
+        self.assertEqual(array('I', [4, 6]), recent.recent(2))
+        self.assertEqual(array('I', [2, 3, 4, 6]), recent.recent(50))
+        self.assertRaises(ValueError, recent.read, 0)
+
+    def test_older_episodes_from_the_log(self):
+        log = EpisodeLogWriter(self.path)
+        recent = RecentEpisodes(size=4, log_path=self.path)
+        for steps in range(10):
+            log.append(steps, 0)
+            recent.append(steps)
+        log.close()
+
+        self.assertEqual(array('I', range(10)), recent.read())
+        self.assertEqual(array('I', range(2, 8)), recent.read(2, 8))
+
+
+class StatisticsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log = EpisodeLogWriter(os.path.join(self.directory, 'live.bin'))
+        self.saved = os.path.join(self.directory, 'saved.bin')
+
+    def tearDown(self):
+        self.log.close()
+        shutil.rmtree(self.directory)
+
+    def test_save_and_load(self):
+        self.log.append(3, 0)
+        self.log.append(5, 1)
+        util.save_statistics(self.log, self.saved)
+        self.log.append(7, 0)
+
+        steps = util.load_statistics(self.log, self.saved)
+        self.log.append(9, 0)
+        self.log.flush()
+
+        self.assertEqual(array('I', [3, 5]), steps)
+        self.assertEqual(array('I', [3, 5, 9]),
+                         EpisodeLogReader(self.log.path).read())
+
+    def test_json_statistics_are_still_loaded(self):
+        legacy = os.path.join(self.directory, util.LEGACY_STATISTICS_FILENAME)
+        with open(legacy, 'w') as f:
+            json.dump({'steps_per_episode': [4, 2]}, f)
+
+        with mock.patch('util.app_path',
+                        lambda name: os.path.join(self.directory, name)):
+            steps = util.load_statistics(self.log)
+        self.log.flush()
+
+        self.assertEqual(array('I', [4, 2]), steps)
+        self.assertEqual(steps, EpisodeLogReader(self.log.path).read())
+
+    def test_json_statistics_next_to_the_path(self):
+        legacy = os.path.join(self.directory, util.LEGACY_STATISTICS_FILENAME)
+        with open(legacy, 'w') as f:
+            json.dump({'steps_per_episode': [6]}, f)
+
+        steps = util.load_statistics(
+            path=os.path.join(self.directory, util.STATISTICS_FILENAME))
+
+        self.assertEqual(array('I', [6]), steps)
+
+
+class RecordingAgentLogTest(unittest.TestCase):
+    def test_agent_writes_every_episode(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        agent = RecordingAgent()
+        agent.seed(0)
+        agent.episode_log = EpisodeLogWriter(
+            os.path.join(directory, 'episodes.bin'))
+
+        agent.run(3)
+        agent.episode_log.close()
+
+        self.assertEqual(agent.steps_per_episode.read(),
+                         EpisodeLogReader(agent.episode_log.path).read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""
+Evaluation of a saved Q-table.
+
+The agent plays a number of games with learning switched off, always taking
+the best action known in Q. Game i uses seed + i for shapes and tie breaking,
+so an evaluation gives the same results on every machine and with any number
+of worker processes.
+
+Usage: python evaluation.py q-table.bin --config run.json --games 1000
+"""
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import signal
+import time
+
+from agent import Agent
+import runner
+import util
+
+DEFAULT_GAMES = 1000
+MAX_PIECES = 10000
+PERCENTILES = [5, 25, 50, 75, 95]
+Z_95 = 1.96
+POOL_TIMEOUT = 60 * 60 * 24 * 365
+
+
+class GreedyAgent(Agent):
+    """
+    Agent that does not learn and always takes one of the best actions in Q.
+    A random action is only taken in states without any entry in Q.
+    """
+
+    def _choose_action(self):
+        actions, value = self._find_best_actions_in_q()
+        if len(actions) == 0:
+            self.action_from_q = 'Random'
+            actions = self.environment.possible_actions()
+        else:
+            self.action_from_q = 'Best: {0}'.format(value)
+
+        # sorted, so the choice does not depend on the ordering of the set
+        actions = sorted(actions, key=lambda a: (a.rotation, a.column))
+        return self.random.choice(actions)
+
+    def _q(self, old_state, action, reward):
+        pass
+
+
+def play_game(agent, seed, max_pieces=MAX_PIECES):
+    """
+    :return: tuple (placed blocks, deleted lines)
+    """
+    agent.seed(seed)
+    pieces = 0
+    while not agent._is_game_over() and pieces < max_pieces:
+        agent._step()
+        pieces += 1
+    return pieces, agent.environment.field.lines_deleted
+
+
+_worker_agent = None
+
+
+def _init_worker(q_path, config):
+    global _worker_agent
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_agent = GreedyAgent()
+    runner.configure_agent(_worker_agent, config)
+    _worker_agent.Q = util.load_q_table(q_path)
+
+
+def _play_task(task):
+    seed, max_pieces = task
+    return play_game(_worker_agent, seed, max_pieces)
+
+
+def evaluate(q_path, config, games=DEFAULT_GAMES, seed=0,
+             max_pieces=MAX_PIECES, processes=None):
+    """
+    Plays the games in a process pool, every worker loads the Q-table once.
+
+    :return: dictionary with the per game results and their statistics
+    """
+    processes = processes or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes, _init_worker, (q_path, config))
+    try:
+        # wait for the workers to load the table before measuring
+        pool.map_async(_play_task, [(seed, 0)] * processes, 1).get(
+            POOL_TIMEOUT)
+
+        tasks = [(seed + i, max_pieces) for i in range(games)]
+        chunksize = max(1, games // (processes * 4))
+        start = time.time()
+        results = pool.map_async(_play_task, tasks, chunksize).get(
+            POOL_TIMEOUT)
+        seconds = time.time() - start
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return report(results, seconds, seed, max_pieces)
+
+
+def report(results, seconds, seed=0, max_pieces=MAX_PIECES):
+    pieces = [p for p, _ in results]
+    lines = [l for _, l in results]
+    return {
+        'games': len(results),
+        'seed': seed,
+        'max_pieces': max_pieces,
+        'capped_games': sum(1 for p in pieces if p >= max_pieces),
+        'seconds': seconds,
+        'games_per_second': len(results) / seconds if seconds > 0 else 0.0,
+        'blocks': summarize(pieces),
+        'lines': summarize(lines),
+        # equal digests mean the games were played exactly the same
+        'digest': hashlib.sha1(json.dumps(results)).hexdigest(),
+        'results': results,
+    }
+
+
+def summarize(values):
+    """
+    Mean with normal 95% confidence interval, median with distribution free
+    95% confidence interval (order statistics) and percentiles.
+    """
+    n = len(values)
+    ordered = sorted(values)
+    mean = sum(ordered) / float(n)
+    std = math.sqrt(sum((v - mean) ** 2 for v in ordered) / (n - 1)) \
+        if n > 1 else 0.0
+    half_width = Z_95 * std / math.sqrt(n)
+
+    lower_rank = max(int(math.floor(n / 2.0 - Z_95 * math.sqrt(n) / 2)), 0)
+    upper_rank = min(int(math.ceil(n / 2.0 + Z_95 * math.sqrt(n) / 2)), n - 1)
+
+    summary = {
+        'mean': mean,
+        'std': std,
+        'mean_ci': [mean - half_width, mean + half_width],
+        'median': percentile(ordered, 50),
+        'median_ci': [ordered[lower_rank], ordered[upper_rank]],
+        'min': ordered[0],
+        'max': ordered[-1],
+    }
+    for p in PERCENTILES:
+        summary['p{0}'.format(p)] = percentile(ordered, p)
+    return summary
+
+
+def percentile(ordered, p):
+    """
+    Percentile with linear interpolation of an already sorted list.
+    """
+    position = (len(ordered) - 1) * p / 100.0
+    lower = int(math.floor(position))
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (
+        position - lower)
+
+
+def print_report(result):
+    print '{0} games in {1:.1f}s ({2:.1f} games/s), seed {3}, ' \
+          'digest {4}'.format(result['games'], result['seconds'],
+                              result['games_per_second'], result['seed'],
+                              result['digest'][:12])
+    if result['capped_games']:
+        print '{0} games stopped at {1} blocks'.format(
+            result['capped_games'], result['max_pieces'])
+
+    for name in ('blocks', 'lines'):
+        s = result[name]
+        print '{0:>6}: mean {1:.2f} [{2:.2f}, {3:.2f}]  median {4:.1f} ' \
+              '[{5}, {6}]  p5 {7:.1f}  p25 {8:.1f}  p75 {9:.1f}  ' \
+              'p95 {10:.1f}  max {11}'.format(
+                  name, s['mean'], s['mean_ci'][0], s['mean_ci'][1],
+                  s['median'], s['median_ci'][0], s['median_ci'][1],
+                  s['p5'], s['p25'], s['p75'], s['p95'], s['max'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluates a saved Q-table '
+                                                 'with a greedy policy.')
+    parser.add_argument('q_table', nargs='?', default=None)
+    parser.add_argument('--config', default=None,
+                        help='run configuration used for training, the '
+                             'features have to match the Q-table')
+    parser.add_argument('--games', type=int, default=DEFAULT_GAMES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-pieces', type=int, default=MAX_PIECES)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--json', default=None,
+                        help='file the full result is written to')
+    args = parser.parse_args()
+
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+
+    result = evaluate(args.q_table, config, args.games, args.seed,
+                      args.max_pieces, args.processes)
+    print_report(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
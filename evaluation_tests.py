@@ -0,0 +1,55 @@
+import unittest
+
+import evaluation
+from evaluation import GreedyAgent
+
+
+class GreedyAgentTest(unittest.TestCase):
+    def setUp(self):
+        self.agent = GreedyAgent()
+
+    def test_q_is_not_changed_while_playing(self):
+        evaluation.play_game(self.agent, 0, 20)
+
+        self.assertEqual(0, len(self.agent.Q))
+
+    def test_same_seed_plays_same_game(self):
+        first = evaluation.play_game(self.agent, 5)
+        second = evaluation.play_game(GreedyAgent(), 5)
+
+        self.assertEqual(first, second)
+
+    def test_takes_best_action_in_q(self):
+        self.agent.seed(0)
+        action = self.agent.environment.possible_actions()[3]
+        self.agent.Q[(self.agent.current_state, action)] = 10
+
+        self.assertEqual(action, self.agent._choose_action())
+
+
+class SummarizeTest(unittest.TestCase):
+    def test_percentiles_are_interpolated(self):
+        ordered = [1, 2, 3, 4]
+
+        self.assertEqual(1, evaluation.percentile(ordered, 0))
+        self.assertEqual(2.5, evaluation.percentile(ordered, 50))
+        self.assertEqual(4, evaluation.percentile(ordered, 100))
+
+    def test_summary(self):
+        summary = evaluation.summarize([4, 2, 6, 8])
+
+        self.assertEqual(5.0, summary['mean'])
+        self.assertEqual(5.0, summary['median'])
+        self.assertEqual(2, summary['min'])
+        self.assertEqual(8, summary['max'])
+        self.assertTrue(summary['mean_ci'][0] < 5.0 < summary['mean_ci'][1])
+
+    def test_equal_results_have_equal_digest(self):
+        results = [(10, 1), (12, 0)]
+
+        self.assertEqual(evaluation.report(results, 1.0)['digest'],
+                         evaluation.report(list(results), 2.0)['digest'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,4 @@
 import math
-from BitVector import BitVector
 from settings import FIELD_HEIGHT, FIELD_WIDTH
 #from environment import Environment
 
@@ -130,6 +129,8 @@ def weighted_number_of_blocks(environment):
 
 
 def field_to_bitvector(environment):
+    # imported on first use, so the module loads without BitVector
+    from BitVector import BitVector
     bits = []
     for col in environment.field.blocks:
         for cell in col:
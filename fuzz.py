@@ -0,0 +1,516 @@
+#!/usr/bin/env python
+"""
+Differential fuzzing of the game rules.
+
+A case is a board, a sequence of shapes and the actions executed with them.
+Every case is played in the reference (environment.Environment) and in an
+alternative engine with the same interface, e.g. an optimized Field. After
+every action the occupied cells, the reward, the removed lines and the game
+over status are compared, invalid actions must be rejected by both. The
+first difference is minimized: steps, columns, rows and single blocks are
+removed as long as the engines still differ.
+
+Cases come from random and adversarial boards (nearly full rows, full rows,
+stacks reaching the vanish zone, ...) and mostly valid, sometimes invalid
+actions. They are generated in batches from the seed and the number of the
+batch, so every case can be generated again, and the batches run in a
+process pool.
+
+BitmaskEnvironment is an alternative engine that drops shapes and finds full
+lines with one bit mask per column.
+
+Usage:
+    python fuzz.py run --cases 1000000 --no-rewards --save failure.json
+    python fuzz.py check failure.json
+"""
+import argparse
+from collections import namedtuple
+import importlib
+import json
+import multiprocessing
+import operator
+import random
+import signal
+import sys
+import time
+
+from environment import Action, ACTION_SLOTS, Environment, Field, \
+    InvalidActionError, RIGHTMOST_INDEX, SHAPES_BY_NAME
+from game_trace import ShapeSequence, reward_weights, REWARD_TOLERANCE
+from settings import FIELD_HEIGHT, FIELD_WIDTH
+
+DEFAULT_ENGINE = 'fuzz:BitmaskEnvironment'
+DEFAULT_CASES = 10000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_STEPS = 8  # maximum actions per case
+INVALID_ACTION_RATE = 0.05
+SHAPE_NAMES = ''.join(sorted(SHAPES_BY_NAME))
+EMPTY = '.'
+DEFAULT_REWARDS = Environment().rewards
+
+Case = namedtuple('Case', ['blocks', 'shapes', 'actions'])
+# step is the index of the action, -1 for the board before the first action
+Divergence = namedtuple('Divergence', ['step', 'kind', 'reference', 'other'])
+
+
+class BitmaskField(Field):
+    """
+    Field that drops shapes with one bit mask of occupied rows per column.
+    """
+
+    def place(self, shape, action):
+        if not self._is_action_valid(action, shape):
+            raise InvalidActionError(
+                "{0} is not valid for shape {1}".format(action, shape))
+
+        blocks = self.blocks
+        masks = [_column_mask(column) for column in blocks]
+        cells = [(action.column + x, y)
+                 for x, y in shape.rotations[action.rotation]]
+        drop = FIELD_HEIGHT
+        for x, y in cells:
+            below = masks[x] >> (y + 1)
+            if below:
+                # rows the cell can fall until the first block below it
+                drop = min(drop, (below & -below).bit_length() - 1)
+            else:
+                drop = min(drop, FIELD_HEIGHT - 1 - y)
+        for x, y in cells:
+            blocks[x][y + drop] = shape.name
+            masks[x] |= 1 << (y + drop)
+
+        full = reduce(operator.and_, masks)
+        self._delete_lines([row for row in range(FIELD_HEIGHT)
+                            if full >> row & 1])
+
+
+def _column_mask(column):
+    # "is not 0" like Field._touches_block
+    return sum(1 << row for row, cell in enumerate(column) if cell is not 0)
+
+
+class BitmaskEnvironment(Environment):
+    def __init__(self, blocks=None):
+        super(BitmaskEnvironment, self).__init__(blocks)
+        field = BitmaskField()
+        field.initialize(self.field.blocks)
+        self.field = field
+
+
+def load_engine(name):
+    """
+    :param name: 'module:class' of an Environment-like class
+    """
+    module, _, attribute = name.partition(':')
+    return getattr(importlib.import_module(module), attribute)
+
+
+# boards
+
+def _random_block(rng):
+    return rng.choice(SHAPE_NAMES)
+
+
+def empty_board(rng):
+    return [[0] * FIELD_HEIGHT for _ in range(FIELD_WIDTH)]
+
+
+def stacked_board(rng, low=0, high=FIELD_HEIGHT):
+    """
+    Columns of random height with some holes.
+    """
+    holes = rng.random() * 0.3
+    blocks = []
+    for _ in range(FIELD_WIDTH):
+        height = rng.randint(low, high)
+        blocks.append([0] * (FIELD_HEIGHT - height) +
+                      [0 if rng.random() < holes else _random_block(rng)
+                       for _ in range(height)])
+    return blocks
+
+
+def tall_board(rng):
+    """
+    Stacks reaching into the vanish zone and the spawn position.
+    """
+    return stacked_board(rng, FIELD_HEIGHT - 4, FIELD_HEIGHT)
+
+
+def gap_board(rng):
+    """
+    Rows filled except for one gap, so placing a shape removes lines.
+    """
+    blocks = empty_board(rng)
+    for row in range(FIELD_HEIGHT - rng.randint(1, 6), FIELD_HEIGHT):
+        gap = rng.randrange(FIELD_WIDTH)
+        for column in range(FIELD_WIDTH):
+            if column != gap:
+                blocks[column][row] = _random_block(rng)
+    return blocks
+
+
+def full_row_board(rng):
+    """
+    Random board with complete rows that are only removed with the next
+    placement.
+    """
+    blocks = stacked_board(rng, 0, FIELD_HEIGHT // 2)
+    for _ in range(rng.randint(1, 3)):
+        row = rng.randrange(FIELD_HEIGHT)
+        for column in range(FIELD_WIDTH):
+            blocks[column][row] = _random_block(rng)
+    return blocks
+
+
+def noise_board(rng):
+    """
+    Independent random cells, floating blocks included.
+    """
+    density = rng.random()
+    return [[_random_block(rng) if rng.random() < density else 0
+             for _ in range(FIELD_HEIGHT)] for _ in range(FIELD_WIDTH)]
+
+
+BOARDS = [empty_board, stacked_board, tall_board, gap_board, full_row_board,
+          noise_board]
+
+
+def random_case(rng, max_steps=DEFAULT_STEPS):
+    blocks = rng.choice(BOARDS)(rng)
+    steps = rng.randint(1, max_steps)
+    shapes = ''.join(rng.choice(SHAPE_NAMES) for _ in range(steps + 1))
+    actions = []
+    for name in shapes[:-1]:
+        if rng.random() < INVALID_ACTION_RATE:
+            actions.append(rng.randrange(ACTION_SLOTS))
+            continue
+        shape = SHAPES_BY_NAME[name]()
+        rotation = rng.randrange(len(shape.rotations))
+        column = rng.randint(0, RIGHTMOST_INDEX - shape.rightmost(rotation))
+        actions.append(Action(column, rotation).to_id())
+    return Case(blocks, shapes, actions)
+
+
+def batch_cases(seed, batch, batch_size, max_steps=DEFAULT_STEPS):
+    rng = random.Random((seed << 32) + batch)
+    return [random_case(rng, max_steps) for _ in range(batch_size)]
+
+
+# comparison
+
+def _start(environment, case, rewards):
+    environment.rewards = rewards
+    environment.field.initialize([list(column) for column in case.blocks])
+    environment.deleted_lines_last_round = 0
+    environment.random = ShapeSequence(case.shapes)
+    environment.choose_next_shape()
+    return environment
+
+
+def _occupied(blocks):
+    return [[cell != 0 for cell in column] for column in blocks]
+
+
+def _compare(step, reference, other):
+    if reference.field.lines_deleted != other.field.lines_deleted:
+        return Divergence(step, 'lines', reference.field.lines_deleted,
+                          other.field.lines_deleted)
+    occupied = _occupied(reference.field.blocks)
+    if occupied != _occupied(other.field.blocks):
+        cells = [(x, y) for x in range(FIELD_WIDTH)
+                 for y in range(FIELD_HEIGHT)
+                 if occupied[x][y] != (other.field.blocks[x][y] != 0)]
+        return Divergence(step, 'board', format_board(reference.field.blocks),
+                          format_board(other.field.blocks) +
+                          '\ndiffering cells {0}'.format(cells))
+    if reference.is_game_over() != other.is_game_over():
+        return Divergence(step, 'game over', reference.is_game_over(),
+                          other.is_game_over())
+    return None
+
+
+def _execute(environment, action_id):
+    try:
+        return environment.execute_action(Action.from_id(action_id))
+    except InvalidActionError:
+        return InvalidActionError
+
+
+def find_divergence(case, engine, reference, rewards=None):
+    """
+    Plays the case in both environments, they are reused for the next case
+    because creating one takes longer than most cases.
+
+    :param engine: environment of the engine
+    :param reference: environment.Environment
+    :param rewards: reward features with weights, the default of Environment
+                    if None
+    :return: first Divergence of the engine from the reference, None if
+             they agree
+    """
+    if rewards is None:
+        rewards = DEFAULT_REWARDS
+    expected = _start(reference, case, rewards)
+    actual = _start(engine, case, rewards)
+    divergence = _compare(-1, expected, actual)
+    if divergence:
+        return divergence
+    for step, action_id in enumerate(case.actions):
+        reward = _execute(expected, action_id)
+        other_reward = _execute(actual, action_id)
+        if reward is InvalidActionError or other_reward is InvalidActionError:
+            if reward is not other_reward:
+                return Divergence(step, 'invalid action',
+                                  reward is InvalidActionError,
+                                  other_reward is InvalidActionError)
+            continue
+        divergence = _compare(step, expected, actual)
+        if divergence:
+            return divergence
+        if abs(reward - other_reward) > \
+                REWARD_TOLERANCE * max(1.0, abs(reward)):
+            return Divergence(step, 'reward', reward, other_reward)
+    return None
+
+
+# minimization
+
+def _truncated(case, step):
+    """
+    :return: case without the actions after step
+    """
+    return Case(case.blocks, case.shapes[:step + 2], case.actions[:step + 1])
+
+
+def _without_blocks(case, cells):
+    blocks = [list(column) for column in case.blocks]
+    for x, y in cells:
+        blocks[x][y] = 0
+    return Case(blocks, case.shapes, case.actions)
+
+
+def _candidates(case):
+    """
+    Smaller cases, the largest reductions first.
+    """
+    for step in range(len(case.actions)):
+        yield Case(case.blocks, case.shapes[:step] + case.shapes[step + 1:],
+                   case.actions[:step] + case.actions[step + 1:])
+    occupied = [(x, y) for x in range(FIELD_WIDTH)
+                for y in range(FIELD_HEIGHT) if case.blocks[x][y] != 0]
+    for x in range(FIELD_WIDTH):
+        cells = [cell for cell in occupied if cell[0] == x]
+        if cells:
+            yield _without_blocks(case, cells)
+    for y in range(FIELD_HEIGHT):
+        cells = [cell for cell in occupied if cell[1] == y]
+        if cells:
+            yield _without_blocks(case, cells)
+    for cell in occupied:
+        yield _without_blocks(case, [cell])
+
+
+def minimize(case, engine, reference, rewards=None):
+    """
+    Removes steps and blocks from a case as long as the engine still
+    differs from the reference.
+
+    :return: tuple (smallest case found, its Divergence)
+    """
+    divergence = find_divergence(case, engine, reference, rewards)
+    if divergence is None:
+        raise ValueError('the engines agree on the case')
+    case = _truncated(case, divergence.step)
+    while True:
+        for candidate in _candidates(case):
+            found = find_divergence(candidate, engine, reference, rewards)
+            if found is not None:
+                case = _truncated(candidate, found.step)
+                divergence = found
+                break
+        else:
+            return case, divergence
+
+
+# reproducers
+
+def format_board(blocks):
+    """
+    :return: the rows from top to bottom, EMPTY for empty cells
+    """
+    return '\n'.join(''.join(EMPTY if blocks[x][y] == 0 else str(blocks[x][y])
+                             for x in range(FIELD_WIDTH))
+                     for y in range(FIELD_HEIGHT))
+
+
+def parse_board(text):
+    rows = text.split('\n')
+    return [[0 if rows[y][x] == EMPTY else rows[y][x]
+             for y in range(FIELD_HEIGHT)] for x in range(FIELD_WIDTH)]
+
+
+def case_to_json(case):
+    return {
+        'board': format_board(case.blocks).split('\n'),
+        'shapes': case.shapes,
+        'actions': [[a % FIELD_WIDTH, a // FIELD_WIDTH]
+                    for a in case.actions],
+    }
+
+
+def case_from_json(data):
+    return Case(parse_board('\n'.join(data['board'])), data['shapes'],
+                [Action(column, rotation).to_id()
+                 for column, rotation in data['actions']])
+
+
+def describe(case, divergence):
+    lines = [format_board(case.blocks), 'shapes {0}'.format(case.shapes)]
+    lines.extend('step {0}: {1} {2}'.format(i, case.shapes[i],
+                                            Action.from_id(a))
+                 for i, a in enumerate(case.actions))
+    lines.append('first difference after step {0} in {1}:'.format(
+        divergence.step, divergence.kind))
+    lines.append('reference:\n{0}'.format(divergence.reference))
+    lines.append('engine:\n{0}'.format(divergence.other))
+    return '\n'.join(lines)
+
+
+# batches
+
+def _init_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _rewards(weights):
+    if weights is None:
+        return None
+    return reward_weights({'rewards': weights})
+
+
+def run_batch(task):
+    """
+    :param task: tuple (engine name, reward weights by name or None, seed,
+                 batch, batch size, max steps)
+    :return: tuple (number of cases, first differing case or None)
+    """
+    engine_name, weights, seed, batch, batch_size, max_steps = task
+    engine = load_engine(engine_name)()
+    reference = Environment()
+    rewards = _rewards(weights)
+    for case in batch_cases(seed, batch, batch_size, max_steps):
+        if find_divergence(case, engine, reference, rewards) is not None:
+            return batch_size, case
+    return batch_size, None
+
+
+def fuzz(engine_name=DEFAULT_ENGINE, cases=DEFAULT_CASES, seed=0,
+         batch_size=DEFAULT_BATCH_SIZE, max_steps=DEFAULT_STEPS,
+         weights=None, processes=None, progress=None):
+    """
+    :param weights: dictionary from reward feature name to weight, the
+                    default rewards if None, {} for no rewards
+    :param processes: number of worker processes, 1 runs in this process
+    :param progress: called with the number of cases done
+    :return: dictionary with the number of cases, the seconds and, if the
+             engines differ, the minimized case and its Divergence
+    """
+    batches = (cases + batch_size - 1) // batch_size
+    tasks = [(engine_name, weights, seed, batch, batch_size, max_steps)
+             for batch in range(batches)]
+    processes = processes or multiprocessing.cpu_count()
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, _init_worker)
+        results = pool.imap(run_batch, tasks)
+    else:
+        results = (run_batch(task) for task in tasks)
+
+    done = 0
+    failure = None
+    start = time.time()
+    try:
+        for count, case in results:
+            done += count
+            if progress:
+                progress(done)
+            if case is not None:
+                failure = case
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    seconds = time.time() - start
+
+    result = {'cases': done, 'seconds': seconds,
+              'cases_per_second': done / seconds if seconds else 0.0}
+    if failure is not None:
+        result['case'], result['divergence'] = minimize(
+            failure, load_engine(engine_name)(), Environment(),
+            _rewards(weights))
+    return result
+
+
+def _weights(args):
+    if args.no_rewards:
+        return {}
+    if args.config:
+        with open(args.config) as f:
+            return json.load(f).get('rewards')
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares an engine with '
+                                                 'the reference rules.')
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='fuzz with random cases')
+    run_parser.add_argument('--cases', type=int, default=DEFAULT_CASES)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--batch-size', type=int,
+                            default=DEFAULT_BATCH_SIZE)
+    run_parser.add_argument('--steps', type=int, default=DEFAULT_STEPS,
+                            help='maximum actions per case')
+    run_parser.add_argument('--processes', type=int, default=None)
+    run_parser.add_argument('--save', default=None,
+                            help='file the minimized case is written to')
+    check_parser = subparsers.add_parser('check',
+                                         help='play a saved case again')
+    check_parser.add_argument('case')
+    for subparser in (run_parser, check_parser):
+        subparser.add_argument('--engine', default=DEFAULT_ENGINE,
+                               help='module:class of the engine')
+        subparser.add_argument('--config', default=None,
+                               help='run configuration with the rewards')
+        subparser.add_argument('--no-rewards', action='store_true',
+                               help='compare without reward features, '
+                                    'several times faster')
+    args = parser.parse_args()
+    weights = _weights(args)
+
+    if args.command == 'check':
+        with open(args.case) as f:
+            case = case_from_json(json.load(f))
+        divergence = find_divergence(case, load_engine(args.engine)(),
+                                     Environment(), _rewards(weights))
+        if divergence is None:
+            print 'engines agree'
+            return
+        print describe(case, divergence)
+        sys.exit(1)
+
+    result = fuzz(args.engine, args.cases, args.seed, args.batch_size,
+                  args.steps, weights, args.processes)
+    print '{0} cases in {1:.1f}s ({2:.0f} cases/s)'.format(
+        result['cases'], result['seconds'], result['cases_per_second'])
+    if 'case' in result:
+        print describe(result['case'], result['divergence'])
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump(case_to_json(result['case']), f, indent=2)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import unittest
+
+from environment import Environment, Field
+import fuzz
+from fuzz import BitmaskEnvironment, Case
+
+
+class ShallowVanishZoneEnvironment(Environment):
+    # only checks the first row of the vanish zone
+    def _is_block_in_vanish_zone(self):
+        return any(column[0] != 0 for column in self.field.blocks)
+
+
+class UncountedLinesField(Field):
+    def _delete_lines(self, lines):
+        for line in lines:
+            self._delete_line(line)
+
+
+class UncountedLinesEnvironment(Environment):
+    def __init__(self):
+        super(UncountedLinesEnvironment, self).__init__()
+        self.field = UncountedLinesField()
+
+
+def _blocks(case):
+    return sum(1 for column in case.blocks for cell in column if cell != 0)
+
+
+class FuzzTest(unittest.TestCase):
+    def test_bitmask_engine_agrees(self):
+        reference = Environment()
+        engine = BitmaskEnvironment()
+
+        for case in fuzz.batch_cases(0, 0, 300):
+            self.assertIsNone(fuzz.find_divergence(case, engine, reference))
+
+    def test_batches_are_reproducible(self):
+        self.assertEqual(fuzz.batch_cases(3, 7, 20),
+                         fuzz.batch_cases(3, 7, 20))
+        self.assertNotEqual(fuzz.batch_cases(3, 7, 20),
+                            fuzz.batch_cases(3, 8, 20))
+
+    def test_game_over_divergence_is_minimized(self):
+        result = fuzz.fuzz('fuzz_tests:ShallowVanishZoneEnvironment',
+                           cases=1000, batch_size=100, processes=1)
+
+        case, divergence = result['case'], result['divergence']
+        self.assertEqual('game over', divergence.kind)
+        self.assertEqual((True, False),
+                         (divergence.reference, divergence.other))
+        self.assertEqual(1, _blocks(case))
+        self.assertEqual(-1, divergence.step)
+        self.assertEqual([], case.actions)
+
+    def test_lines_divergence(self):
+        blocks = fuzz.empty_board(None)
+        for column in range(1, 10):
+            blocks[column][11] = 'o'
+        # an i standing upright in the gap removes the bottom row
+        case = Case(blocks, 'io', [10])
+
+        case, divergence = fuzz.minimize(case, UncountedLinesEnvironment(),
+                                         Environment(), {})
+
+        self.assertEqual((0, 'lines', 1, 0), divergence)
+        self.assertEqual(9, _blocks(case))
+
+    def test_minimize_needs_a_divergence(self):
+        case = Case(fuzz.empty_board(None), 'oo', [0])
+
+        self.assertRaises(ValueError, fuzz.minimize, case,
+                          BitmaskEnvironment(), Environment())
+
+    def test_json_round_trip(self):
+        case = fuzz.batch_cases(1, 0, 1)[0]
+
+        self.assertEqual(case, fuzz.case_from_json(fuzz.case_to_json(case)))
+
+
+if __name__ == '__main__':
+    unittest.main()
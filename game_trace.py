@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+"""
+Recording and replay of games.
+
+A trace file contains every episode of a run with the sequence of shapes,
+the chosen actions and their rewards:
+
+    header    magic, version, length of the metadata
+    metadata  JSON with the seed, the run configuration and the shape names
+    episodes  per episode a record header (pieces, removed lines, flags,
+              length of the data) and the zlib compressed data: pieces + 1
+              shape numbers and pieces action ids (one byte each), then the
+              rewards as doubles
+
+The last shape is the one the episode ended with. The replay hands the
+recorded shapes to an Environment instead of drawing them at random and
+executes the recorded actions, so every game can be played again exactly,
+independent of the agent. With verification the rewards, removed lines and
+the end of every episode are compared with the trace, without it the reward
+features are not calculated at all.
+
+Usage:
+    python runner.py --episodes 1000 --seed 1 --trace games.trace
+    python game_trace.py info games.trace
+    python game_trace.py replay games.trace
+"""
+from array import array
+import argparse
+from collections import namedtuple
+import json
+import struct
+import sys
+import timeit
+import zlib
+
+from environment import Action, Environment, InvalidActionError, \
+    SHAPES_BY_NAME
+import reward_features
+import runner
+
+MAGIC = 'TTRC'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+EPISODE = struct.Struct('<IIII')  # pieces, lines, flags, data length
+TRUNCATED = 1
+SHAPE_NAMES = ''.join(sorted(SHAPES_BY_NAME))
+REWARD_TOLERANCE = 1e-9  # relative, the order of the sum may differ
+
+Episode = namedtuple('Episode', ['shapes', 'actions', 'rewards', 'lines',
+                                 'truncated'])
+
+
+class TraceError(ValueError):
+    pass
+
+
+class TraceRecorder(object):
+    """
+    Sets itself as agent.trace_recorder, Agent._step calls record_step and
+    Agent._episode calls end_episode. The file is started with the first
+    episode, so the metadata contains the configuration the agent was given
+    until then.
+    """
+
+    def __init__(self, agent, path, seed=None):
+        self.agent = agent
+        self.path = path
+        self.seed = seed
+        self.file = None
+        self._shapes = array('B')
+        self._actions = array('B')
+        self._rewards = array('d')
+        agent.trace_recorder = self
+
+    def record_step(self, shape, action, reward):
+        """
+        :param shape: shape the action was executed with
+        """
+        self._shapes.append(SHAPE_NAMES.index(shape.name))
+        self._actions.append(action.to_id())
+        self._rewards.append(reward)
+
+    def end_episode(self):
+        environment = self.agent.environment
+        self._shapes.append(SHAPE_NAMES.index(environment.current_shape.name))
+        if self.file is None:
+            self._open()
+        data = zlib.compress(self._shapes.tostring() +
+                             self._actions.tostring() +
+                             self._rewards.tostring())
+        flags = TRUNCATED if self.agent.truncated else 0
+        self.file.write(EPISODE.pack(len(self._actions),
+                                     environment.field.lines_deleted, flags,
+                                     len(data)))
+        self.file.write(data)
+        del self._shapes[:]
+        del self._actions[:]
+        del self._rewards[:]
+
+    def _open(self):
+        metadata = json.dumps({
+            'seed': self.seed,
+            'config': runner.agent_config(self.agent),
+            'shapes': SHAPE_NAMES,
+            'byteorder': sys.byteorder,
+        })
+        self.file = open(self.path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(metadata)))
+        self.file.write(metadata)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.agent.trace_recorder = None
+
+
+def read_metadata(f, path):
+    magic, version, length = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise TraceError('{0} is no trace of version {1}'.format(
+            path, VERSION))
+    return json.loads(f.read(length))
+
+
+def read(path):
+    """
+    :return: tuple (metadata, generator of the episodes)
+    """
+    with open(path, 'rb') as f:
+        metadata = read_metadata(f, path)
+    return metadata, _episodes(path)
+
+
+def _episodes(path):
+    with open(path, 'rb') as f:
+        metadata = read_metadata(f, path)
+        swap = metadata['byteorder'] != sys.byteorder
+        names = metadata['shapes']
+        while True:
+            header = f.read(EPISODE.size)
+            if len(header) < EPISODE.size:
+                return  # end of the file or an episode written in part
+            pieces, lines, flags, length = EPISODE.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            data = zlib.decompress(data)
+            shapes = ''.join(names[i] for i in
+                             array('B', data[:pieces + 1]))
+            actions = array('B', data[pieces + 1:2 * pieces + 1])
+            rewards = array('d', data[2 * pieces + 1:])
+            if swap:
+                rewards.byteswap()
+            yield Episode(shapes, actions, rewards, lines,
+                          bool(flags & TRUNCATED))
+
+
+class ShapeSequence(object):
+    """
+    Stands in for Environment.random and hands out the recorded shapes.
+    """
+
+    def __init__(self, names):
+        self._shapes = iter([SHAPES_BY_NAME[name] for name in names])
+
+    def choice(self, _):
+        try:
+            return next(self._shapes)
+        except StopIteration:
+            raise TraceError('more shapes drawn than recorded')
+
+
+def reward_weights(config):
+    """
+    :return: reward features of the configuration with their weights, the
+             default of Environment if the configuration has none
+    """
+    if 'rewards' not in config:
+        return Environment().rewards
+    return dict((getattr(reward_features, name), float(weight))
+                for name, weight in config['rewards'].iteritems())
+
+
+def replay_episode(environment, episode, verify=True):
+    """
+    Plays the episode in the environment.
+
+    :param verify: compare rewards, removed lines and the end of the game
+                   with the trace, the environment needs the reward features
+                   of the recording
+    :return: list of differences as (piece or None, description)
+    """
+    differences = []
+    environment.random = ShapeSequence(episode.shapes)
+    environment.initialize()
+    for piece, (action_id, expected) in enumerate(
+            zip(episode.actions, episode.rewards)):
+        try:
+            reward = environment.execute_action(Action.from_id(action_id))
+        except InvalidActionError:
+            differences.append((piece, 'invalid action {0}'.format(
+                Action.from_id(action_id))))
+            return differences
+        if verify and abs(reward - expected) > \
+                REWARD_TOLERANCE * max(1.0, abs(expected)):
+            differences.append((piece, 'reward {0!r} instead of {1!r}'.format(
+                reward, expected)))
+    if verify:
+        if environment.field.lines_deleted != episode.lines:
+            differences.append((None, '{0} lines instead of {1}'.format(
+                environment.field.lines_deleted, episode.lines)))
+        if environment.is_game_over() == episode.truncated:
+            differences.append((None, 'game over' if episode.truncated else
+                                'game not over'))
+    return differences
+
+
+def replay(path, verify=True, engine=Environment, progress=None):
+    """
+    Plays all episodes of a trace.
+
+    :param engine: class or function creating the environment the episodes
+                   are played in
+    :param progress: called with the number and differences of every
+                     episode
+    :return: dictionary with the number of episodes and pieces, the seconds
+             and the differences as (episode, piece, description)
+    """
+    metadata, episodes = read(path)
+    environment = engine()
+    environment.rewards = reward_weights(metadata['config']) if verify \
+        else {}
+
+    count = 0
+    pieces = 0
+    differences = []
+    start = timeit.default_timer()
+    for count, episode in enumerate(episodes, 1):
+        found = replay_episode(environment, episode, verify)
+        pieces += len(episode.actions)
+        differences.extend((count - 1, piece, description)
+                           for piece, description in found)
+        if progress:
+            progress(count, found)
+    return {
+        'episodes': count,
+        'pieces': pieces,
+        'seconds': timeit.default_timer() - start,
+        'differences': differences,
+    }
+
+
+def info(path):
+    metadata, episodes = read(path)
+    count = 0
+    pieces = 0
+    lines = 0
+    for count, episode in enumerate(episodes, 1):
+        pieces += len(episode.actions)
+        lines += episode.lines
+    return {'metadata': metadata, 'episodes': count, 'pieces': pieces,
+            'lines': lines}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shows and replays traces '
+                                                 'of recorded games.')
+    subparsers = parser.add_subparsers(dest='command')
+    info_parser = subparsers.add_parser('info')
+    info_parser.add_argument('trace')
+    replay_parser = subparsers.add_parser(
+        'replay', help='play all games again, exits with status 1 if they '
+                       'differ from the trace')
+    replay_parser.add_argument('trace')
+    replay_parser.add_argument('--no-verify', dest='verify',
+                               action='store_false',
+                               help='only place the pieces, without rewards')
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        result = info(args.trace)
+        print json.dumps(result['metadata'], indent=2, sort_keys=True)
+        print '{0} episodes, {1} pieces, {2} lines'.format(
+            result['episodes'], result['pieces'], result['lines'])
+        return
+
+    result = replay(args.trace, args.verify)
+    seconds = result['seconds']
+    print '{0} episodes, {1} pieces in {2:.2f}s ({3:.0f} pieces/s)'.format(
+        result['episodes'], result['pieces'], seconds,
+        result['pieces'] / seconds if seconds else 0)
+    for episode, piece, description in result['differences']:
+        print 'episode {0}, piece {1}: {2}'.format(episode, piece,
+                                                   description)
+    if result['differences']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from agent import Agent
+from environment import Environment
+import game_trace
+from game_trace import TraceError, TraceRecorder
+
+
+class GameTraceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'games.trace')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _record(self, episodes=5, max_pieces=None):
+        agent = Agent()
+        agent.seed(2)
+        agent.max_pieces_per_episode = max_pieces
+        recorder = TraceRecorder(agent, self.path, seed=2)
+        agent.run(episodes)
+        recorder.close()
+        return agent
+
+    def test_round_trip(self):
+        agent = self._record()
+
+        metadata, episodes = game_trace.read(self.path)
+        episodes = list(episodes)
+
+        self.assertEqual(2, metadata['seed'])
+        self.assertEqual(agent.epsilon, metadata['config']['epsilon'])
+        self.assertEqual(5, len(episodes))
+        self.assertEqual(agent.pieces_placed,
+                         sum(len(e.actions) for e in episodes))
+        for episode in episodes:
+            self.assertEqual(len(episode.actions) + 1, len(episode.shapes))
+            self.assertEqual(len(episode.actions), len(episode.rewards))
+        self.assertIsNone(agent.trace_recorder)
+
+    def test_replay_matches(self):
+        agent = self._record()
+
+        result = game_trace.replay(self.path)
+
+        self.assertEqual([], result['differences'])
+        self.assertEqual(5, result['episodes'])
+        self.assertEqual(agent.pieces_placed, result['pieces'])
+
+    def test_replay_of_truncated_episodes(self):
+        self._record(max_pieces=3)
+
+        result = game_trace.replay(self.path)
+
+        self.assertEqual([], result['differences'])
+        self.assertEqual(15, result['pieces'])
+
+    def test_replay_finds_differences(self):
+        self._record(episodes=1)
+        _, episodes = game_trace.read(self.path)
+        episode = next(episodes)
+        episode.rewards[1] += 1
+        environment = Environment()
+
+        differences = game_trace.replay_episode(environment, episode)
+
+        self.assertEqual(1, len(differences))
+        self.assertEqual(1, differences[0][0])
+
+    def test_replay_without_verification(self):
+        self._record(episodes=1)
+        _, episodes = game_trace.read(self.path)
+        episode = next(episodes)
+        environment = Environment()
+        environment.rewards = {}
+        episode.rewards[1] += 1
+
+        self.assertEqual([], game_trace.replay_episode(environment, episode,
+                                                       verify=False))
+        self.assertTrue(environment.is_game_over())
+
+    def test_episode_written_in_part_is_ignored(self):
+        self._record(episodes=2)
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+
+        _, episodes = game_trace.read(self.path)
+
+        self.assertEqual(1, len(list(episodes)))
+
+    def test_no_trace(self):
+        with open(self.path, 'wb') as f:
+            f.write('\0' * 64)
+
+        self.assertRaises(TraceError, game_trace.read, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,15 +2,13 @@
 # -*- coding: utf-8 -*-
 
 from Tkinter import *
-import Queue
 import inspect
-import threading
 import tkFileDialog
 import tkMessageBox
-import copy
 
 import matplotlib
 from environment import LShape, TShape, IShape, ZShape, SShape, OShape, JShape
+from environment import SHAPES_BY_NAME
 import features
 import reward_features
 
@@ -19,7 +17,11 @@ matplotlib.use('TkAgg')
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 
-from agent import Agent
+from agent_process import AgentProcess, DEFAULT_STEPS_PER_SECOND
+from checkpoint import CHECKPOINT_DIRECTORY
+from instrumentation import format_snapshot
+import profiler
+from pyramid import EpisodePyramid
 import settings
 import util
 
@@ -36,37 +38,66 @@ LEFT = "left"
 RIGHT = "right"
 DOWN = "down"
 
+BLOCK_COLOURS = {
+    'o': 'yellow',
+    'i': 'cyan',
+    'z': 'red',
+    's': 'green',
+    'j': 'blue',
+    'l': 'orange',
+    't': 'magenta',
+}
+
 MAX_BLOCKS_LABEL = "Maximale Anzahl von Bloecken: {0}"
 AVG_BLOCKS_LABEL = "Platzierte Bloecke im Durchschnitt: {0}"
 ITERATIONS_LABEL = "Anzahl der Durchläufe: {0}"
 Q_OR_NOT_LABEL = "Action aus Q: {0}"
+METRICS_LABEL = ("Episoden/s: {episodes_per_second:.1f}, "
+                 "Bloecke/s: {pieces_per_second:.0f}\n"
+                 "Q: {q_entries} Eintraege, {q_states} Zustaende, "
+                 "{megabytes:.1f} MB\n"
+                 "Treffer in Q: {hit_percent:.0f}%, "
+                 "letzter Checkpoint vor {seconds_since_checkpoint:.0f}s")
 PLACED_BLOCKS_LABEL = 'Platzierte Blöcke: {0}'
 PAUSE_BUTTON_TEXT = "Pause"
 RESUME_BUTTON_TEXT = "Play"
 QUIT_BUTTON_TEXT = "Quit"
 FAST_FORWARD_BUTTON_TEXT = ">>"
+STEP_BUTTON_TEXT = "Step"
 SAVE_BUTTON_TEXT = "Save Q"
 LOAD_BUTTON_TEXT = "Load Q"
 Q_FILENAME = "q"
 SHAPES_BUTTON_TEXT = 'Shapes auswaehlen'
 REWARDS_BUTTON_TEXT = 'Rewards auswaehlen'
 FEATURES_BUTTON_TEXT = 'State Features auswaehlen'
+SAVING_STATUS = 'Speichere Q-Tabelle...'
+SAVED_STATUS = 'Q-Tabelle gespeichert ({0:.1f}s)'
+LOADING_STATUS = 'Lade Q-Tabelle...'
+LOADED_STATUS = 'Q-Tabelle geladen ({0:.1f}s)'
+STORAGE_ERROR_STATUS = 'Fehler: {0}'
+TIMINGS_BUTTON_TEXT = 'Zeitmessung'
+PROFILE_BUTTON_TEXT = 'Profil ({0}s)'
+PROFILING_STATUS = 'Profil wird aufgezeichnet...'
+PROFILED_STATUS = 'Profil gespeichert: {0}'
 
 GUI_REFRESH_IN_MS = 200
-TOTAL_EPISODES = 500000
-NUM_EPISODES_IN_AVG_CALC = 50
+TIMINGS_REFRESH_IN_MS = 1000
+METRICS_REFRESH_IN_MS = 1000
 
 global controller
 global agent
-global dataQ
-dataQ = Queue.Queue(maxsize=0)
 
 
 class BoardFrame(Frame):
+    """
+    Shows the field. The border and one rectangle per block are created
+    once, an update only changes the blocks that differ from the board
+    shown before.
+    """
+
     def __init__(self, parent):
         Frame.__init__(self, parent)
 
-        self.landed = {}
         self.parent = parent
         self.offset = OFFSET_TO_WINDOW_BORDER_IN_PX
 
@@ -75,10 +106,17 @@ class BoardFrame(Frame):
                              width=BOARD_WIDTH_IN_PX + self.offset)
 
         self.canvas.grid(row=0, column=0)
+        self.draw_border()
+        # in the order of the board of a channel.BoardState
+        self.blocks = [self.add_block((x, y))
+                       for x in range(BOARD_WIDTH_IN_BLOCKS)
+                       for y in range(BOARD_HEIGHT_IN_BLOCKS)]
+        self.board = None  # board shown at the moment, None if cleared
 
     def clear(self):
-        self.canvas.delete(ALL)
-        self.draw_border()
+        for block in self.blocks:
+            self.canvas.itemconfigure(block, state=HIDDEN)
+        self.board = None
 
     def draw_border(self):
         x_left = self.offset
@@ -95,39 +133,43 @@ class BoardFrame(Frame):
                                 x_right, vanish_zone_height,
                                 fill="red", dash=(4, 2))
 
-    def add_block(self, (x, y), colour):
+    def add_block(self, (x, y)):
         """
-        Create a block by drawing it on the canvas, return
-        it's ID to the caller.
+        Create a hidden block on the canvas, return it's ID to the caller.
         """
-        if colour is None:
-            return
-
         rx = (x * BLOCK_SIZE_IN_PX) + self.offset
         ry = (y * BLOCK_SIZE_IN_PX) + self.offset
 
         return self.canvas.create_rectangle(
             rx, ry, rx + BLOCK_SIZE_IN_PX, ry + BLOCK_SIZE_IN_PX,
-            fill=colour
+            state=HIDDEN
         )
 
-    def update(self, blocks):
-        def get_color(x):
-            return {
-                'o': 'yellow',
-                'i': 'cyan',
-                'z': 'red',
-                's': 'green',
-                'j': 'blue',
-                'l': 'orange',
-                't': 'magenta',
-            }.get(x)
-
-        self.clear()
-        for r in range(len(blocks)):
-            for c in range(len(blocks[r])):
-                color = get_color(blocks[r][c])
-                self.add_block((r, c), color)
+    def update(self, board):
+        """
+        :param board: board of a channel.BoardState
+        """
+        previous = self.board
+        if previous is None:
+            previous = '\0' * len(board)
+        if board != previous:
+            for i, block in changed_blocks(previous, board):
+                colour = BLOCK_COLOURS.get(block)
+                if colour is None:
+                    self.canvas.itemconfigure(self.blocks[i], state=HIDDEN)
+                else:
+                    self.canvas.itemconfigure(self.blocks[i], fill=colour,
+                                              state=NORMAL)
+        self.board = board
+
+
+def changed_blocks(previous, board):
+    """
+    :return: list of tuples (index, block) of the blocks of board that
+             differ from previous
+    """
+    return [(i, block) for i, (old, block) in enumerate(zip(previous, board))
+            if old != block]
 
 
 class ControlFrame(Frame):
@@ -145,6 +187,8 @@ class ControlFrame(Frame):
         self.maxLabel = Label(self, text=MAX_BLOCKS_LABEL.format(0))
         self.iterationsLabel = Label(self, text=ITERATIONS_LABEL.format(0))
         self.qLabel = Label(self, text=Q_OR_NOT_LABEL.format('-'))
+        self.metricsLabel = Label(self, justify=LEFT)
+        self.statusLabel = Label(self)
 
         self.pauseBtn = Button(self, text=RESUME_BUTTON_TEXT,
                                command=self.controller.pause_callback)
@@ -153,6 +197,8 @@ class ControlFrame(Frame):
         self.fastForwardBtn = Button(self,
                                      text=FAST_FORWARD_BUTTON_TEXT,
                                      command=self.controller.ff_callback)
+        self.stepBtn = Button(self, text=STEP_BUTTON_TEXT,
+                              command=self.controller.step_callback)
         self.saveBtn = Button(self, text=SAVE_BUTTON_TEXT,
                               command=self.controller.save_callback)
         self.loadBtn = Button(self, text=LOAD_BUTTON_TEXT,
@@ -166,6 +212,11 @@ class ControlFrame(Frame):
                                     command=RewardsController)
         self.featuresButton = Button(self, text=FEATURES_BUTTON_TEXT,
                                      command=StateFeatureController)
+        self.timingsButton = Button(self, text=TIMINGS_BUTTON_TEXT,
+                                    command=self.controller.timings_callback)
+        self.profileButton = Button(
+            self, text=PROFILE_BUTTON_TEXT.format(profiler.DEFAULT_SECONDS),
+            command=self.controller.profile_callback)
 
         input_width = 5
 
@@ -173,6 +224,10 @@ class ControlFrame(Frame):
         self.fastForwardInput = Entry(self, width=input_width)
         self.fastForwardInput.insert(0, "50")
 
+        self.speedLabel = Label(self, text='Schritte/s (0 = max): ')
+        self.speedInput = Entry(self, width=input_width)
+        self.speedInput.insert(0, str(DEFAULT_STEPS_PER_SECOND))
+
         self.alphaLabel = Label(self, text='alpha: ')
         self.alphaInput = Entry(self, width=input_width)
         self.alphaInput.insert(0, "0.9")
@@ -199,18 +254,23 @@ class ControlFrame(Frame):
             [(self.maxLabel, w_and_colspan_3)],
             [(self.iterationsLabel, w_and_colspan_3)],
             [(self.qLabel, w_and_colspan_3)],
+            [(self.metricsLabel, w_and_colspan_3)],
             [(emptyLabel, None)],
 
             [(self.shapesButton, w_and_colspan_3)],
             [(self.rewardsButton, w_and_colspan_3)],
             [(self.featuresButton, w_and_colspan_3)],
+            [(self.timingsButton, w_and_colspan_3)],
+            [(self.profileButton, w_and_colspan_3)],
             [(self.alphaLabel, e), (self.alphaInput, w)],
             [(self.gammaLabel, e), (self.gammaInput, w)],
             [(self.epsilonLabel, e), (self.epsilonInput, w)],
             [(self.fastForwardLabel, e), (self.fastForwardInput, w)],
+            [(self.speedLabel, e), (self.speedInput, w)],
             [(self.pauseBtn, e),
-             (self.fastForwardBtn, w)],
-            [(self.saveBtn, e), (self.loadBtn, e), None, (self.quitBtn, w)]
+             (self.fastForwardBtn, w), (self.stepBtn, w)],
+            [(self.saveBtn, e), (self.loadBtn, e), None, (self.quitBtn, w)],
+            [(self.statusLabel, w_and_colspan_3)]
         ]
 
         emptyLabel['height'] = FIELD_ROWSPAN - len(grid)
@@ -246,12 +306,13 @@ class MainController(object):
                         'title': "Choose a File"}
 
         self.board = BoardFrame(parent)
-        self.board.clear()
 
         self.panel = ControlFrame(parent, self)
         self.panel.grid(row=0, column=1, sticky=N + W)
 
         self.plot_controller = PlotController(parent)
+        self.board_version = None
+        self.timings = None  # TimingsController while its window is open
 
         self.parent.protocol("WM_DELETE_WINDOW", self.quit_callback)
         self.parent.bind("<Escape>", self.quit_callback)
@@ -262,6 +323,10 @@ class MainController(object):
 
     def _load_config(self):
         config = util.load_json(util.CONFIG_FILENAME)
+        # compression of the saved Q-table, only set in the file
+        self.save_options = {
+            'codec': (config or {}).get('save_codec'),
+            'level': (config or {}).get('save_level')}
 
         if config:
             a = self.panel.alphaInput
@@ -281,6 +346,10 @@ class MainController(object):
             except:
                 print 'Error reading config file'
 
+            if 'steps_per_second' in config:
+                self.panel.speedInput.delete(0, END)
+                self.panel.speedInput.insert(0, config['steps_per_second'])
+
     def is_game_paused(self):
         return not agent.resume_event.is_set()
 
@@ -293,49 +362,43 @@ class MainController(object):
     def refresh_gui(self):
         agent_state = self._get_agent_state()
         self._update_input_state()
+        self._handle_agent_messages()
+        self._set_agent_speed()
         if agent_state:
             self.board.update(agent_state['blocks'])
             self._update_labels(agent_state)
             self.plot_controller.update(agent_state)
 
-        agent.wait_for_update_event.set()
         self.parent.after(GUI_REFRESH_IN_MS, self.refresh_gui)
 
     def _get_agent_state(self):
-        blocks = None
-        try:
-            blocks = dataQ.get(timeout=0.1)
-        except:
-            pass
-
-        if blocks:
-            steps_per_episode = copy.deepcopy(agent.steps_per_episode)
+        state = agent.channel.read(self.board_version)
+        if state:
+            self.board_version = state.version
+            steps_per_episode = agent.history.update()
             return {
                 'steps_per_episode': steps_per_episode,
-                'episode_count': len(steps_per_episode),
-                'blocks': blocks,
-                'step_count': agent.step_count,
-                'q_value': agent.action_from_q
+                'history_generation': agent.history.generation,
+                'summary': agent.statistics.summary(),
+                'blocks': state.board,
+                'step_count': state.step_count,
+                'q_value': state.action_from_q
             }
 
     def _update_labels(self, agent_state):
         self.panel.blocksLabel["text"] = PLACED_BLOCKS_LABEL.format(
             agent_state['step_count'])
 
-        episode_count = agent_state['episode_count']
+        summary = agent_state['summary']
         self.panel.qLabel["text"] = Q_OR_NOT_LABEL.format(
             agent_state['q_value'])
-        if episode_count > 0:
-            maximum = max(agent_state['steps_per_episode'])
-            self.panel.maxLabel["text"] = MAX_BLOCKS_LABEL.format(maximum)
-
-            steps_per_episode = agent_state['steps_per_episode']
-            latest_episodes = steps_per_episode[-NUM_EPISODES_IN_AVG_CALC:]
-            avg = (reduce(lambda x, y: x + y, latest_episodes) /
-                   len(latest_episodes))
-            self.panel.avgLabel["text"] = AVG_BLOCKS_LABEL.format(avg)
+        if summary.count > 0:
+            self.panel.maxLabel["text"] = MAX_BLOCKS_LABEL.format(
+                summary.maximum)
+            self.panel.avgLabel["text"] = AVG_BLOCKS_LABEL.format(
+                int(summary.recent_mean))
             self.panel.iterationsLabel["text"] = ITERATIONS_LABEL.format(
-                episode_count)
+                summary.count)
 
     def _set_agent_inputs_state(self, state):
         self.panel.alphaInput['state'] = state
@@ -346,40 +409,96 @@ class MainController(object):
         alpha = float(self.panel.alphaInput.get())
         gamma = float(self.panel.gammaInput.get())
         epsilon = float(self.panel.epsilonInput.get())
-        agent.alpha = alpha
-        agent.gamma = gamma
-        agent.epsilon = epsilon
+        agent.configure({'alpha': alpha, 'gamma': gamma, 'epsilon': epsilon})
+
+    def _set_agent_speed(self):
+        try:
+            steps_per_second = float(self.panel.speedInput.get())
+        except ValueError:
+            return  # keep the last valid value while the input is edited
+        agent.configure({'steps_per_second': steps_per_second})
 
     def ff_callback(self, event=None):
         if not agent.fast_forward:
             self.board.clear()
-            agent.fast_forward_total = int(
-                self.panel.fastForwardInput.get())
-            agent.fast_forward_count = agent.fast_forward_total
-            agent.fast_forward = True
+            agent.start_fast_forward(int(self.panel.fastForwardInput.get()))
             if self.is_game_paused():
                 self.pause_callback()
 
+    def step_callback(self, event=None):
+        if self.is_game_paused() and not agent.fast_forward:
+            agent.step_once()
+
     def save_callback(self):
-        util.save_q_table(agent.Q)
-        util.save_statistics(agent.steps_per_episode)
-        tkMessageBox.showinfo('Gratulation!', 'Die Q-Tabelle wurde erfolgreich gespeichert')
+        self._start_storage_task('save', SAVING_STATUS, self.save_options)
 
     def load_callback(self):
-        agent.Q = util.load_q_table()
-        stats = util.load_json(util.STATISTICS_FILENAME)
-        agent.steps_per_episode = stats['steps_per_episode']
-        agent.push_state()
-        tkMessageBox.showinfo('Heureka!', 'Die Q-Tabelle wurde erfolgreich geladen')
+        self._start_storage_task('load', LOADING_STATUS)
+
+    def _start_storage_task(self, command, status, argument=None):
+        """
+        Saving and loading is done by the agent process, the answer is
+        handled by _handle_agent_messages.
+        """
+        self.panel.saveBtn['state'] = DISABLED
+        self.panel.loadBtn['state'] = DISABLED
+        self.panel.statusLabel['text'] = status
+        agent.send(command, argument)
+
+    def _handle_agent_messages(self):
+        for kind, value in agent.messages():
+            if kind == 'timings':
+                if self.timings is not None:
+                    self.timings.show(value)
+                continue
+            if kind == 'metrics':
+                self._update_metrics(value)
+                continue
+            if kind == 'profile':
+                self.panel.profileButton['state'] = NORMAL
+                self.panel.statusLabel['text'] = PROFILED_STATUS.format(value)
+                continue
+            self.panel.saveBtn['state'] = NORMAL
+            self.panel.loadBtn['state'] = NORMAL
+            if kind == 'error':
+                self.panel.statusLabel['text'] = STORAGE_ERROR_STATUS.format(
+                    value)
+                tkMessageBox.showerror('Fehler', value)
+            elif kind == 'save':
+                self.panel.statusLabel['text'] = SAVED_STATUS.format(value)
+                tkMessageBox.showinfo(
+                    'Gratulation!', 'Die Q-Tabelle wurde erfolgreich gespeichert')
+            elif kind == 'load':
+                self.panel.statusLabel['text'] = LOADED_STATUS.format(value)
+                tkMessageBox.showinfo(
+                    'Heureka!', 'Die Q-Tabelle wurde erfolgreich geladen')
+
+    def request_metrics(self):
+        agent.request_metrics()
+        self.parent.after(METRICS_REFRESH_IN_MS, self.request_metrics)
+
+    def _update_metrics(self, values):
+        self.panel.metricsLabel['text'] = METRICS_LABEL.format(
+            megabytes=values['q_bytes'] / float(1 << 20),
+            hit_percent=100.0 * values['q_hit_ratio'], **values)
 
     def quit_callback(self, event=None):
-        agent.stop_event.set()
         util.save_gui_config(controller)
-        self._resume_agent()
-        agent.wait_for_update_event.set()
+        agent.stop()
         self.parent.quit()
         self.parent.destroy()
 
+    def timings_callback(self):
+        if self.timings is None:
+            self.timings = TimingsController(self)
+        else:
+            self.timings.dialog.lift()
+
+    def profile_callback(self):
+        self.panel.profileButton['state'] = DISABLED
+        self.panel.statusLabel['text'] = PROFILING_STATUS
+        agent.profile(profiler.DEFAULT_SECONDS)
+
     def clear_callback(self, event):
         self.board.clear()
 
@@ -423,118 +542,93 @@ class MainController(object):
 
 
 class PlotController(object):
+    """
+    Draws the learning curve downsampled by an EpisodePyramid. Only the
+    lines are redrawn on top of a saved background, the whole figure is
+    drawn again when the axes have to grow.
+    """
+    XSCALE = 100
+    YSCALE = 35
+    # the x axis grows in steps, so the figure is not redrawn every episode
+    XGROWTH = 1.25
+
     def __init__(self, parent):
         f = Figure(figsize=(14, 5), dpi=50)
         self.subplot = f.add_subplot(111)
 
-        self.plot_line, = self.subplot.plot([], [])
+        self.plot_line, = self.subplot.plot([], [], animated=True)
+        self.mean_line, = self.subplot.plot([], [], color='black',
+                                            animated=True)
         self.subplot.set_xlabel('episode')
         self.subplot.set_ylabel('blocks')
-        self.maxline = self.subplot.axhline(y=-1, color='red', linestyle='--')
+        self.maxline = self.subplot.axhline(y=-1, color='red', linestyle='--',
+                                            animated=True)
+        self.subplot.set_xlim(0, self.XSCALE)
+        self.subplot.set_ylim(0, self.YSCALE)
+
+        self.pyramid = EpisodePyramid()
+        self.generation = None
+        self.background = None
 
         # a tk.DrawingArea
         self.plot_canvas = FigureCanvasTkAgg(f, master=parent)
+        self.plot_canvas.mpl_connect('draw_event', self._on_draw)
         self.plot_canvas.show()
 
+    def _on_draw(self, event):
+        # also called when the window is resized
+        self.background = self.plot_canvas.copy_from_bbox(self.subplot.bbox)
+
     def update(self, agent_state):
         if not agent.fast_forward:
             steps_per_episode = agent_state['steps_per_episode']
-            episode_count = len(steps_per_episode)
+            if agent_state['history_generation'] != self.generation:
+                self.generation = agent_state['history_generation']
+                self.pyramid = EpisodePyramid()
+            self.pyramid.extend(steps_per_episode.read(len(self.pyramid)))
+            episode_count = len(self.pyramid)
             if episode_count == 0:
                 return
 
-            x = range(episode_count)
-            y = steps_per_episode
+            raw = None
+            if episode_count <= 2 * self.pyramid.max_buckets:
+                raw = steps_per_episode.read()
+            x, y, mean_x, means = self.pyramid.curve(raw)
             self.plot_line.set_data(x, y)
-            ax = self.plot_canvas.figure.axes[0]
-            XSCALE = 100
-            YSCALE = 35
-            if len(x) > XSCALE:
-                ax.set_xlim(0, len(x))
-            else:
-                ax.set_xlim(0, XSCALE)
-
-            max_y = max(y)
-            if max_y > YSCALE:
-                ax.set_ylim(0, max_y)
-            else:
-                ax.set_ylim(0, YSCALE)
+            self.mean_line.set_data(mean_x, means)
+            max_y = agent_state['summary'].maximum
             self.maxline.set_ydata(max_y)
-            self.plot_canvas.draw()
 
-
-class MeasuredAgent(Agent):
-    """
-    Special class for GUI representation with measurements and event handling
-    """
-
-    def __init__(self):
-        super(MeasuredAgent, self).__init__()
-        self.step_count = 0
-        self.steps_per_episode = []
-        self.fast_forward = False
-        self.fast_forward_total = 0
-        self.fast_forward_count = 0
-
-    def push_state(self):
-        self._push_state()
-
-    def _wait_for_update(self):
-        if self.resume_event.is_set() and not self.stop_event.is_set():
-            self._push_state()
-            self.wait_for_update_event.clear()
-            self.wait_for_update_event.wait()
-
-    def run(self, episodes):
-        for i in range(0, episodes):
-            if self.stop_event.is_set():
-                break
-            self._episode()
-            #self._wait_for_update()
-
-    def _episode(self):
-        if self._is_fast_forward_finished():
-            self.stop_fast_forward()
-            self.resume_event.clear()
-
-        self.step_count = 0
-        super(MeasuredAgent, self)._episode()
-        self.steps_per_episode.append(self.step_count)
-        if self.fast_forward:
-            self.fast_forward_count -= 1
-
-    def _step(self):
-        self.resume_event.wait()
-
-        if self.stop_event.is_set():
-            return
-        super(MeasuredAgent, self)._step()
-        self.step_count += 1
-        if not self.fast_forward:
-            self._wait_for_update()
-
-    def stop_fast_forward(self):
-        self.fast_forward = False
-        self.fast_forward_count = self.fast_forward_total
-        self._wait_for_update()
-
-    def _is_fast_forward_finished(self):
-        return (self.fast_forward and self.fast_forward_count <= 0)
-
-    def _is_game_over(self):
-        if self.stop_event.is_set():
-            return True
-        return super(MeasuredAgent, self)._is_game_over()
-
-    def _push_state(self):
-        if not self.fast_forward:
-            blockcopy = copy.deepcopy(self.environment.field.blocks)
-            self.dataQ.put(blockcopy)
+            ax = self.subplot
+            if self._update_limits(ax, episode_count, max_y):
+                self.plot_canvas.draw()
+            if self.background is not None:
+                self.plot_canvas.restore_region(self.background)
+                ax.draw_artist(self.plot_line)
+                ax.draw_artist(self.mean_line)
+                ax.draw_artist(self.maxline)
+                self.plot_canvas.blit(ax.bbox)
+
+    def _update_limits(self, ax, episode_count, max_y):
+        """
+        :return: True if the axes changed and the figure has to be redrawn
+        """
+        changed = False
+        _, x_max = ax.get_xlim()
+        if episode_count > x_max:
+            ax.set_xlim(0, int(episode_count * self.XGROWTH))
+            changed = True
+        y_max = max(max_y, self.YSCALE)
+        if ax.get_ylim()[1] != y_max:
+            ax.set_ylim(0, y_max)
+            changed = True
+        return changed
 
 
 class ShapesController(object):
     def __init__(self):
-        possible_shapes = agent.environment.possible_shapes
+        possible_shapes = [SHAPES_BY_NAME[name]
+                           for name in agent.config['shapes']]
 
         self.shapes = {LShape: BooleanVar(), JShape: BooleanVar(),
                        OShape: BooleanVar(), SShape: BooleanVar(),
@@ -552,8 +646,8 @@ class ShapesController(object):
             if value.get() != 0:
                 shapes.append(shape)
 
-        agent.environment.possible_shapes = shapes
-        agent.environment.choose_next_shape()
+        agent.configure({'shapes': ''.join(sorted(shape().name
+                                                  for shape in shapes))})
         self.dialog.destroy()
 
 
@@ -574,6 +668,47 @@ class ShapesDialog(Toplevel):
         Button(self, text="Ok", command=controller.on_ok).grid(column=3, row=3)
 
 
+class TimingsController(object):
+    """
+    Shows where the agent spends its time while the window is open, see
+    instrumentation.py.
+    """
+
+    def __init__(self, main_controller):
+        self.main_controller = main_controller
+        self.closed = False
+        agent.instrument(True)
+        self.dialog = TimingsDialog(self)
+        self.dialog.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.refresh()
+
+    def refresh(self):
+        if self.closed:
+            return
+        agent.request_timings()
+        self.dialog.after(TIMINGS_REFRESH_IN_MS, self.refresh)
+
+    def show(self, snapshot):
+        self.dialog.timingsLabel['text'] = format_snapshot(snapshot)
+
+    def on_close(self):
+        self.closed = True
+        agent.instrument(False)
+        self.main_controller.timings = None
+        self.dialog.destroy()
+
+
+class TimingsDialog(Toplevel):
+    def __init__(self, controller, **kw):
+        Toplevel.__init__(self, **kw)
+        self.title(TIMINGS_BUTTON_TEXT)
+
+        self.timingsLabel = Label(self, font='TkFixedFont', justify=LEFT)
+        self.timingsLabel.grid(column=0, row=0, sticky=W)
+        Button(self, text="Ok", command=controller.on_close).grid(column=0,
+                                                                 row=1)
+
+
 class RewardsController(object):
     def __init__(self):
         self.rewards_settings = {}
@@ -581,7 +716,9 @@ class RewardsController(object):
         self.avail_rewards = inspect.getmembers(reward_features,
                             lambda member: inspect.isfunction(
                             member) and member.__module__ == 'reward_features')
-        self.active_rewards = agent.environment.rewards
+        self.active_rewards = dict(
+            (getattr(reward_features, name), weight)
+            for name, weight in agent.config['rewards'].iteritems())
         self.dialog = RewardsDialog(self)
 
     def on_ok(self):
@@ -590,8 +727,12 @@ class RewardsController(object):
         for reward, settings in self.rewards_settings.iteritems():
             if settings[0].get() != 0 and settings[1].get() != '':
                 rewards[reward] = float(settings[1].get())
+            else:
+                rewards[reward] = 0  # switched off
 
-        agent.environment.rewards = rewards
+        agent.configure({'rewards': dict((reward.__name__, weight)
+                                         for reward, weight
+                                         in rewards.iteritems())})
         self.dialog.destroy()
 
 
@@ -628,7 +769,8 @@ class StateFeatureController(object):
         self.avail_features = inspect.getmembers(features,
                                 lambda member: inspect.isfunction(
                                 member) and member.__module__ == 'features')
-        self.active_features = agent.features
+        self.active_features = [getattr(features, name)
+                                for name in agent.config['features']]
 
         self.dialog = StateFeatureDialog(self)
 
@@ -639,7 +781,8 @@ class StateFeatureController(object):
             if setting.get() != 0:
                 features.append(feature)
 
-        agent.features = features
+        agent.configure({'features': [feature.__name__
+                                      for feature in features]})
         self.dialog.destroy()
 
 
@@ -668,31 +811,17 @@ class StateFeatureDialog(Toplevel):
                 r += 1
 
 
-def start_agent(stop_event, resume_event, wait_for_update_event):
-    global agent
-    agent = MeasuredAgent()
-    agent.dataQ = dataQ
-    agent.stop_event = stop_event
-    agent.resume_event = resume_event
-    agent.wait_for_update_event = wait_for_update_event
-    agent.run(TOTAL_EPISODES)
-
-
 if __name__ == "__main__":
+    # started before Tk, so the agent process does not inherit the window
+    agent = AgentProcess(util.app_path(CHECKPOINT_DIRECTORY))
+    agent.start()
     tk_root = Tk()
     tk_root.title("tetris agent")
     height = BOARD_HEIGHT_IN_PX + OFFSET_TO_WINDOW_BORDER_IN_PX * 2
     tk_root.minsize(450, height)
     controller = MainController(tk_root)
-    logic_stop_event = threading.Event()
-    logic_resume_event = threading.Event()
-    logic_wait_for_update_event = threading.Event()
-    logic_thread = threading.Thread(target=start_agent,
-                                    args=(logic_stop_event,
-                                          logic_resume_event,
-                                          logic_wait_for_update_event,))
-    logic_thread.start()
     tk_root.after(GUI_REFRESH_IN_MS, controller.refresh_gui)
+    tk_root.after(METRICS_REFRESH_IN_MS, controller.request_metrics)
     tk_root.mainloop()
-    logic_stop_event.set()
-    logic_thread.join()
+    agent.stop()
+    agent.join()
@@ -0,0 +1,183 @@
+"""
+Measures where the agent spends its time.
+
+Instrumentation replaces methods of the agent and its environment by timed
+wrappers while it is enabled. The wrappers are set as instance attributes,
+so disabling removes them again and the agent runs its normal methods without
+any overhead. Per phase the number of calls and the wall time are summed up:
+
+    choose_action      Agent._choose_action
+    possible_actions   Environment.possible_actions
+    execute_action     Environment.execute_action
+    place              Field.place
+    reward             Environment._calculate_reward
+    perceived_state    Agent._perceived_state
+    q_update           Agent._q
+    feature.<name>     every state feature
+    reward.<name>      every reward feature
+
+The times include nested phases, e.g. execute_action includes place and
+reward.
+"""
+import sys
+import timeit
+
+import environment
+
+clock = timeit.default_timer
+
+
+class Instrumentation(object):
+    """
+    Sets itself as agent.instrumentation, Agent.run calls maybe_dump after
+    every episode.
+    """
+
+    def __init__(self, agent, dump_interval=None, out=sys.stdout):
+        """
+        :param dump_interval: seconds between two dumps of the times to out,
+                              None for no dumps
+        """
+        self.agent = agent
+        self.dump_interval = dump_interval
+        self.out = out
+        self.enabled = False
+        self.phases = {}  # name -> [calls, seconds]
+        self._wrappers = {}  # feature function -> timed function
+        self._replaced = []  # (object, attribute name)
+        self._elapsed = 0.0
+        self._enabled_at = None
+        self._next_dump = None
+        agent.instrumentation = self
+
+    def enable(self):
+        if self.enabled:
+            return
+        agent = self.agent
+        env = agent.environment
+        self._replace(agent, '_choose_action', 'choose_action')
+        self._replace(agent, '_q', 'q_update')
+        self._replace(env, 'possible_actions', 'possible_actions')
+        self._replace(env, 'execute_action', 'execute_action')
+        self._replace(env.field, 'place', 'place')
+        self._set(agent, '_perceived_state', self.timed(
+            'perceived_state', self._perceived_state))
+        self._set(env, '_calculate_reward', self.timed(
+            'reward', self._calculate_reward))
+        self.enabled = True
+        self._enabled_at = clock()
+        if self.dump_interval is not None:
+            self._next_dump = self._enabled_at + self.dump_interval
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for obj, name in self._replaced:
+            del obj.__dict__[name]
+        self._replaced = []
+        self._elapsed += clock() - self._enabled_at
+        self.enabled = False
+
+    def reset(self):
+        # in place, the timed functions keep their lists
+        for stats in self.phases.itervalues():
+            stats[:] = [0, 0.0]
+        self._elapsed = 0.0
+        if self.enabled:
+            self._enabled_at = clock()
+
+    def timed(self, name, function):
+        """
+        :return: function that adds its calls and time to the phase name
+        """
+        stats = self.phases.setdefault(name, [0, 0.0])
+
+        def timed_function(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stats[0] += 1
+                stats[1] += clock() - start
+
+        timed_function.__name__ = function.__name__
+        return timed_function
+
+    def snapshot(self):
+        """
+        :return: dictionary with the seconds measured so far and the calls
+                 and seconds of every phase
+        """
+        elapsed = self._elapsed
+        if self.enabled:
+            elapsed += clock() - self._enabled_at
+        return {
+            'elapsed': elapsed,
+            'phases': dict((name, {'calls': calls, 'seconds': seconds})
+                           for name, (calls, seconds) in
+                           self.phases.items()),
+        }
+
+    def maybe_dump(self):
+        if self._next_dump is None or not self.enabled:
+            return
+        now = clock()
+        if now >= self._next_dump:
+            self._next_dump = now + self.dump_interval
+            self.dump()
+
+    def dump(self):
+        self.out.write(format_snapshot(self.snapshot()) + '\n')
+        self.out.flush()
+
+    def _replace(self, obj, attribute, name):
+        self._set(obj, attribute, self.timed(name, getattr(obj, attribute)))
+
+    def _set(self, obj, attribute, function):
+        setattr(obj, attribute, function)
+        self._replaced.append((obj, attribute))
+
+    def _timed_feature(self, prefix, function):
+        try:
+            return self._wrappers[function]
+        except KeyError:
+            wrapper = self.timed(prefix + function.__name__, function)
+            self._wrappers[function] = wrapper
+            return wrapper
+
+    def _perceived_state(self):
+        agent = self.agent
+        return agent.state_class(
+            agent.environment,
+            *[self._timed_feature('feature.', f) for f in agent.features])
+
+    def _calculate_reward(self):
+        # same as Environment._calculate_reward, but times every feature
+        env = self.agent.environment
+        reward = 0
+        for feature, weighting in env.rewards.iteritems():
+            feature = self._timed_feature('reward.', feature)
+            reward += (environment.BASE_SCORE_MULTIPLIER * weighting *
+                       feature(env))
+        return reward
+
+
+def format_snapshot(snapshot, limit=None):
+    """
+    :param limit: number of phases shown, the slowest first
+    :return: table of the phases as text
+    """
+    elapsed = snapshot['elapsed']
+    phases = sorted(snapshot['phases'].items(),
+                    key=lambda (name, stats): -stats['seconds'])
+    if limit is not None:
+        phases = phases[:limit]
+    lines = ['{0:<48} {1:>9} {2:>9} {3:>9} {4:>6}'.format(
+        'phase', 'calls', 'total s', 'mean us', '%')]
+    for name, stats in phases:
+        calls = stats['calls']
+        seconds = stats['seconds']
+        lines.append('{0:<48} {1:>9} {2:>9.3f} {3:>9.1f} {4:>6.1f}'.format(
+            name, calls, seconds, 1e6 * seconds / calls if calls else 0,
+            100 * seconds / elapsed if elapsed else 0))
+    return '\n'.join(lines)
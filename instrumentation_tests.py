@@ -0,0 +1,81 @@
+from StringIO import StringIO
+import unittest
+
+from agent import Agent
+from instrumentation import Instrumentation, format_snapshot
+
+
+class InstrumentationTest(unittest.TestCase):
+    def setUp(self):
+        self.agent = Agent()
+        self.agent.seed(0)
+        self.instrumentation = Instrumentation(self.agent)
+
+    def test_disabled_agent_is_unchanged(self):
+        self.instrumentation.enable()
+        self.instrumentation.disable()
+
+        self.assertNotIn('_q', self.agent.__dict__)
+        self.assertNotIn('execute_action', self.agent.environment.__dict__)
+        self.assertNotIn('place', self.agent.environment.field.__dict__)
+
+    def test_phases_are_counted(self):
+        self.instrumentation.enable()
+        for _ in range(3):
+            self.agent._step()
+
+        phases = self.instrumentation.snapshot()['phases']
+        self.assertEqual(3, phases['execute_action']['calls'])
+        self.assertEqual(3, phases['place']['calls'])
+        self.assertEqual(3, phases['q_update']['calls'])
+        self.assertEqual(3, phases['perceived_state']['calls'])
+        self.assertEqual(3, phases['feature.column_height_differences'][
+            'calls'])
+        self.assertEqual(3, phases['reward.removed_line_reward']['calls'])
+
+    def test_results_do_not_change(self):
+        other = Agent()
+        other.seed(0)
+        self.instrumentation.enable()
+
+        for _ in range(20):
+            if self.agent._is_game_over():
+                break
+            self.agent._step()
+            other._step()
+            self.assertEqual(other.latest_reward, self.agent.latest_reward)
+        self.assertEqual(dict(other.Q), dict(self.agent.Q))
+
+    def test_reset(self):
+        self.instrumentation.enable()
+        self.agent._step()
+
+        self.instrumentation.reset()
+        self.agent._step()
+
+        phases = self.instrumentation.snapshot()['phases']
+        self.assertEqual(1, phases['execute_action']['calls'])
+
+    def test_periodic_dump(self):
+        out = StringIO()
+        instrumentation = Instrumentation(self.agent, dump_interval=0,
+                                          out=out)
+        instrumentation.enable()
+
+        self.agent.run(2)
+
+        self.assertEqual(2, out.getvalue().count('execute_action'))
+
+    def test_format(self):
+        text = format_snapshot({'elapsed': 2.0, 'phases': {
+            'a': {'calls': 4, 'seconds': 1.0},
+            'b': {'calls': 0, 'seconds': 0.0}}}, limit=1)
+
+        lines = text.splitlines()
+        self.assertEqual(2, len(lines))
+        self.assertTrue(lines[1].startswith('a '))
+        self.assertTrue(lines[1].endswith('50.0'))
+
+
+if __name__ == '__main__':
+    unittest.main()
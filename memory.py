@@ -0,0 +1,248 @@
+"""
+Memory used by the Q-table.
+
+Every new (state, action) pair adds an entry to Q and many entries hold a
+state object of their own, so the table grows until the machine runs out of
+memory. estimate() calculates the bytes per entry and per state and the
+number of states from a sample of the keys, MemoryTracker records the size of
+the table over the episodes and reacts when the memory of the process
+approaches a limit. TrainingMetrics uses the latest record of the tracker
+instead of estimating again.
+
+The estimate counts the Python objects of the table. Entries of a memory
+mapped table (qtable.LazyQTable) are only counted once they were changed.
+"""
+from array import array
+from collections import namedtuple
+from itertools import islice
+import json
+import sys
+import time
+
+from environment import ACTION_SLOTS, Action
+
+DEFAULT_SAMPLE = 1000  # keys
+DEFAULT_INTERVAL = 30.0  # seconds between two records
+DEFAULT_WARN_RATIO = 0.9
+WARN = 'warn'
+CHECKPOINT = 'checkpoint'
+STOP = 'stop'
+ACTIONS = [WARN, CHECKPOINT, STOP]
+SMALL_INTS = 256  # cached by Python, shared by all states
+ALL_ACTIONS = [Action.from_id(i) for i in range(ACTION_SLOTS)]
+
+MemoryEstimate = namedtuple('MemoryEstimate', [
+    'entries', 'states', 'bytes_per_entry', 'bytes_per_state',
+    'table_bytes'])
+
+
+class MemoryLimitError(RuntimeError):
+    pass
+
+
+def estimate(Q, sample=DEFAULT_SAMPLE):
+    """
+    Measures a sample of the keys instead of going through the whole table.
+    Every sampled entry of a state with k entries counts as 1/k state, so the
+    number of states is exact if the sample contains all keys.
+
+    :param sample: number of keys the sizes and states are measured of
+    :return: MemoryEstimate
+    """
+    entries = len(Q)
+    in_memory = dict.__len__(Q) if isinstance(Q, dict) else entries
+
+    keys = list(islice(Q.iterkeys(), sample))
+    states = 0
+    bytes_per_entry = 0.0
+    bytes_per_state = 0.0
+    if keys:
+        state_share = sum(1.0 / state_entries(Q, state)
+                          for state, _ in keys) / len(keys)
+        states = int(round(entries * state_share))
+        bytes_per_entry = (sum(entry_bytes(key, Q[key]) for key in keys) /
+                           float(len(keys)))
+        if in_memory:
+            # share of the hash table
+            bytes_per_entry += sys.getsizeof(Q) / float(in_memory)
+        sampled_states = dict((id(state), state) for state, _ in keys)
+        bytes_per_state = (sum(state_bytes(state) for state in
+                               sampled_states.itervalues()) /
+                           float(len(sampled_states)))
+    return MemoryEstimate(entries, states, bytes_per_entry, bytes_per_state,
+                          int(in_memory * bytes_per_entry +
+                              states * bytes_per_state))
+
+
+def state_entries(Q, state):
+    """
+    :return: number of entries of the state, at least 1
+    """
+    # "in" does not add the key to a defaultdict
+    return max(1, sum(1 for action in ALL_ACTIONS if (state, action) in Q))
+
+
+def entry_bytes(key, value):
+    """
+    :return: bytes of the key tuple, its action and the value, without the
+             state
+    """
+    action = key[1]
+    size = sys.getsizeof(key) + sys.getsizeof(value) + sys.getsizeof(action)
+    if hasattr(action, '__dict__'):
+        size += sys.getsizeof(action.__dict__)
+    return size
+
+
+def state_bytes(state):
+    """
+    :return: bytes of a PerceivedState with its features
+    """
+    size = sys.getsizeof(state)
+    if hasattr(state, '__dict__'):
+        size += sys.getsizeof(state.__dict__)
+    features = getattr(state, 'features', [])
+    size += sys.getsizeof(features)
+    for feature in features:
+        values = feature if isinstance(feature, tuple) else [feature]
+        if isinstance(feature, tuple):
+            size += sys.getsizeof(feature)
+        for value in values:
+            if not (isinstance(value, int) and
+                    -5 <= value <= SMALL_INTS):
+                size += sys.getsizeof(value)
+    return size
+
+
+def process_bytes():
+    """
+    :return: resident memory of the process, the peak if the current value
+             is not available, None on systems without either
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (IOError, IndexError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on OS X, kilobytes elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemoryTracker(object):
+    """
+    Sets itself as agent.memory, Agent.run calls after_episode after every
+    episode. Records the size of the table every interval seconds and
+    compares the memory of the process (the estimated table size where that
+    is not available) with the limit.
+    """
+
+    def __init__(self, agent, limit=None, action=WARN,
+                 warn_ratio=DEFAULT_WARN_RATIO, interval=DEFAULT_INTERVAL,
+                 out=sys.stdout):
+        """
+        :param limit: bytes, None for no limit
+        :param action: WARN, CHECKPOINT (writes a checkpoint once), STOP
+                       (raises MemoryLimitError out of Agent.run) or a
+                       function called with the used bytes
+        :param warn_ratio: a warning is printed once when this fraction of
+                           the limit is used
+        """
+        if action not in ACTIONS and not callable(action):
+            raise ValueError('unknown action {0}'.format(action))
+        self.agent = agent
+        self.limit = limit
+        self.action = action
+        self.warn_ratio = warn_ratio
+        self.interval = interval
+        self.out = out
+        self.latest = None  # MemoryEstimate of the last record
+        self.latest_time = None
+        self.history = {
+            'episode': array('L'),
+            'entries': array('L'),
+            'states': array('L'),
+            'table_bytes': array('d'),
+            'process_bytes': array('d'),
+        }
+        self._next_record = 0
+        self._warned = False
+        self._limit_reached = False
+        agent.memory = self
+
+    def after_episode(self):
+        if time.time() >= self._next_record:
+            self.record()
+
+    def estimate(self, max_age):
+        """
+        :param max_age: seconds, records again if the last record is older
+        :return: MemoryEstimate of the last record
+        """
+        if self.latest is None or time.time() - self.latest_time >= max_age:
+            self.record(check=False)
+        return self.latest
+
+    def record(self, check=True):
+        """
+        :param check: compare the used memory with the limit
+        """
+        self.latest_time = time.time()
+        self._next_record = self.latest_time + self.interval
+        self.latest = estimate(self.agent.Q)
+        used = process_bytes()
+        history = self.history
+        history['episode'].append(self.agent.episodes_played)
+        history['entries'].append(self.latest.entries)
+        history['states'].append(self.latest.states)
+        history['table_bytes'].append(self.latest.table_bytes)
+        history['process_bytes'].append(
+            float('nan') if used is None else used)
+        if check:
+            self.check(self.latest.table_bytes if used is None else used)
+
+    def check(self, used):
+        """
+        :param used: bytes in use
+        """
+        if self.limit is None:
+            return
+        if used >= self.limit:
+            first = not self._limit_reached
+            self._limit_reached = True
+            self._reached(used, first)
+        elif used >= self.warn_ratio * self.limit and not self._warned:
+            self._warned = True
+            self._write('warning: {0:.0f} MB of {1:.0f} MB used'.format(
+                used / 1e6, self.limit / 1e6))
+
+    def _reached(self, used, first):
+        message = 'memory limit of {0:.0f} MB reached: {1:.0f} MB'.format(
+            self.limit / 1e6, used / 1e6)
+        if callable(self.action):
+            self.action(used)
+        elif self.action == STOP:
+            raise MemoryLimitError(message)
+        elif first:
+            self._write('warning: ' + message)
+            if self.action == CHECKPOINT and \
+                    self.agent.checkpointer is not None:
+                self.agent.checkpointer.checkpoint()
+
+    def _write(self, message):
+        self.out.write(message + '\n')
+        self.out.flush()
+
+    def save(self, path):
+        """
+        Writes the records and the latest estimate as JSON.
+        """
+        result = dict((name, values.tolist())
+                      for name, values in self.history.iteritems())
+        if self.latest is not None:
+            result['latest'] = self.latest._asdict()
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
@@ -0,0 +1,181 @@
+import json
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+from mock import Mock, patch
+
+from agent import Agent, PerceivedState
+from environment import Action
+import memory
+from memory import MemoryLimitError, MemoryTracker
+
+
+def _table():
+    Q = {}
+    for i in range(3):
+        state = PerceivedState.from_values('o', [i])
+        Q[(state, Action(0, 0))] = 1.5
+        Q[(state, Action(1, 0))] = 2.5
+    return Q
+
+
+class EstimateTest(unittest.TestCase):
+    def test_counts(self):
+        estimate = memory.estimate(_table())
+
+        self.assertEqual(6, estimate.entries)
+        self.assertEqual(3, estimate.states)
+        self.assertGreater(estimate.bytes_per_entry, 0)
+        self.assertGreater(estimate.bytes_per_state, 0)
+        self.assertEqual(int(6 * estimate.bytes_per_entry +
+                             3 * estimate.bytes_per_state),
+                         estimate.table_bytes)
+
+    def test_states_from_a_sample(self):
+        Q = {}
+        for i in range(100):
+            state = PerceivedState.from_values('i', [i])
+            for column in range(4):
+                Q[(state, Action(column, 1))] = 0
+
+        self.assertEqual(100, memory.estimate(Q, sample=10).states)
+        self.assertEqual(4, memory.state_entries(Q, state))
+
+    def test_empty_table(self):
+        self.assertEqual((0, 0, 0, 0, 0), memory.estimate({}))
+
+    def test_small_ints_are_not_counted(self):
+        small = PerceivedState.from_values('o', [(1, 2)])
+        large = PerceivedState.from_values('o', [(1000, 2000)])
+
+        self.assertGreater(memory.state_bytes(large),
+                           memory.state_bytes(small))
+
+
+class MemoryTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.out = StringIO.StringIO()
+        self.agent = Agent()
+        self.agent.Q = _table()
+        self.agent.checkpointer = Mock()
+
+    def _tracker(self, used, **kwargs):
+        patcher = patch('memory.process_bytes', return_value=used)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return MemoryTracker(self.agent, out=self.out, **kwargs)
+
+    def test_records_growth(self):
+        tracker = self._tracker(1000)
+        self.agent.episodes_played = 4
+
+        tracker.record()
+        self.agent.Q[(PerceivedState.from_values('o', [9]),
+                      Action(0, 0))] = 0
+        self.agent.episodes_played = 9
+        tracker.record()
+
+        self.assertIs(tracker, self.agent.memory)
+        self.assertEqual([4, 9], tracker.history['episode'].tolist())
+        self.assertEqual([6, 7], tracker.history['entries'].tolist())
+        self.assertEqual([3, 4], tracker.history['states'].tolist())
+        self.assertEqual([1000, 1000],
+                         tracker.history['process_bytes'].tolist())
+
+    def test_estimate_reuses_the_record(self):
+        tracker = self._tracker(1000)
+
+        first = tracker.estimate(60)
+        tracker.estimate(60)
+        tracker.estimate(0)
+
+        self.assertEqual(tracker.latest, first)
+        self.assertEqual(2, len(tracker.history['episode']))
+
+    def test_records_every_interval(self):
+        tracker = self._tracker(1000, interval=60)
+
+        tracker.after_episode()
+        tracker.after_episode()
+
+        self.assertEqual(1, len(tracker.history['episode']))
+
+    def test_warns_once_near_the_limit(self):
+        tracker = self._tracker(950e6, limit=1000e6)
+
+        tracker.record()
+        tracker.record()
+
+        self.assertEqual('warning: 950 MB of 1000 MB used\n',
+                         self.out.getvalue())
+
+    def test_checkpoint_at_the_limit(self):
+        tracker = self._tracker(1200e6, limit=1000e6,
+                                action=memory.CHECKPOINT)
+
+        tracker.record()
+        tracker.record()
+
+        self.agent.checkpointer.checkpoint.assert_called_once_with()
+        self.assertIn('memory limit of 1000 MB reached: 1200 MB',
+                      self.out.getvalue())
+
+    def test_stop_at_the_limit(self):
+        tracker = self._tracker(1200e6, limit=1000e6, action=memory.STOP)
+
+        self.assertRaises(MemoryLimitError, tracker.record)
+        tracker.record(check=False)
+
+    def test_stop_ends_the_run(self):
+        self.agent = Agent()
+        self._tracker(1200e6, limit=1000e6, action=memory.STOP)
+
+        self.assertRaises(MemoryLimitError, self.agent.run, 5)
+        self.assertEqual(1, self.agent.episodes_played)
+
+    def test_function_as_action(self):
+        action = Mock()
+        tracker = self._tracker(1200e6, limit=1000e6, action=action)
+
+        tracker.record()
+
+        action.assert_called_once_with(1200e6)
+
+    def test_table_size_without_process_memory(self):
+        action = Mock()
+        tracker = self._tracker(None, limit=1, action=action)
+
+        tracker.record()
+
+        action.assert_called_once_with(tracker.latest.table_bytes)
+
+    def test_unknown_action(self):
+        self.assertRaises(ValueError, MemoryTracker, self.agent,
+                          action='panic')
+
+    def test_save(self):
+        tracker = self._tracker(1000)
+        tracker.record()
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'memory.json')
+            tracker.save(path)
+            with open(path) as f:
+                saved = json.load(f)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual([6], saved['entries'])
+        self.assertEqual(3, saved['latest']['states'])
+
+
+class ProcessBytesTest(unittest.TestCase):
+    def test_positive(self):
+        self.assertGreater(memory.process_bytes(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,277 @@
+"""
+Operational metrics of a training run.
+
+A MetricsRegistry holds named counters and gauges. TrainingMetrics fills one
+from the counters of an agent: episodes and pieces per second, size of the
+Q-table, hit rate of the Q lookups and the time since the last checkpoint.
+The registry can be rendered in the text format of Prometheus and exported
+to a file (MetricsFileWriter) or over HTTP (MetricsServer), so long runs on
+machines without a display can be watched:
+
+    python runner.py --episodes 1000000 --metrics-port 9108
+    curl localhost:9108/metrics
+"""
+import os
+import threading
+import time
+
+import memory
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+PREFIX = 'tetris_'
+UPDATE_INTERVAL = 1.0  # seconds
+TABLE_STATS_INTERVAL = 30.0  # seconds
+DEFAULT_EXPORT_INTERVAL = 10.0  # seconds
+DEFAULT_HOST = '127.0.0.1'
+
+
+class Metric(object):
+    def __init__(self, name, kind, help_text):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.value = 0
+
+
+class MetricsRegistry(object):
+    """
+    Writers set values, readers get consistent copies of all of them.
+    """
+
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self._metrics = []
+        self._by_name = {}
+
+    def counter(self, name, help_text):
+        return self._metric(name, COUNTER, help_text)
+
+    def gauge(self, name, help_text):
+        return self._metric(name, GAUGE, help_text)
+
+    def _metric(self, name, kind, help_text):
+        with self.lock:
+            if name not in self._by_name:
+                metric = Metric(name, kind, help_text)
+                self._metrics.append(metric)
+                self._by_name[name] = metric
+            return self._by_name[name]
+
+    def set(self, values):
+        """
+        :param values: dictionary from metric name to value
+        """
+        with self.lock:
+            for name, value in values.iteritems():
+                self._by_name[name].value = value
+
+    def snapshot(self):
+        """
+        :return: dictionary from metric name to value
+        """
+        with self.lock:
+            return dict((m.name, m.value) for m in self._metrics)
+
+    def render(self):
+        """
+        :return: the metrics in the text format of Prometheus
+        """
+        with self.lock:
+            metrics = [(m.name, m.kind, m.help, m.value)
+                       for m in self._metrics]
+        lines = []
+        for name, kind, help_text, value in metrics:
+            name = self.prefix + name
+            lines.append('# HELP {0} {1}'.format(name, help_text))
+            lines.append('# TYPE {0} {1}'.format(name, kind))
+            lines.append('{0} {1}'.format(name, _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+def _format_value(value):
+    if value is None or value != value:
+        return 'NaN'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class TrainingMetrics(object):
+    """
+    Sets itself as agent.metrics, Agent.run calls maybe_update after every
+    episode. Other threads may call update while holding a lock that keeps
+    the agent from changing Q.
+    """
+
+    def __init__(self, agent, registry=None):
+        self.agent = agent
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        r.counter('episodes_total', 'Episodes played.')
+        r.counter('pieces_total', 'Pieces placed.')
+        r.gauge('episodes_per_second', 'Episodes per second.')
+        r.gauge('pieces_per_second', 'Pieces per second.')
+        r.gauge('q_entries', 'Entries of the Q-table.')
+        r.gauge('q_states', 'Distinct states in the Q-table.')
+        r.gauge('q_bytes', 'Approximate memory of the Q-table in bytes.')
+        r.counter('q_lookups_total', 'Searches for the best action in Q.')
+        r.gauge('q_hit_ratio', 'Share of the searches that found a value.')
+        r.gauge('seconds_since_checkpoint', 'Seconds since the last '
+                                            'checkpoint, NaN without '
+                                            'checkpoints.')
+        self._last_update = None
+        self._last_table_stats = None
+        self._rate_sample = None  # (time, episodes, pieces)
+        self._rates = (0.0, 0.0)
+        self._table_stats = (0, 0)  # (states, bytes)
+        self._lock = threading.Lock()
+        agent.metrics = self
+
+    def maybe_update(self):
+        if self._last_update is None or \
+                time.time() - self._last_update >= UPDATE_INTERVAL:
+            self.update()
+
+    def update(self, table=False):
+        """
+        :param table: also estimate the states of the table if it was done
+                      less than TABLE_STATS_INTERVAL ago
+        """
+        with self._lock:
+            self._update(table)
+
+    def _update(self, table):
+        agent = self.agent
+        now = time.time()
+        self._last_update = now
+        episodes = agent.episodes_played
+        pieces = agent.pieces_placed
+
+        if self._rate_sample is None:
+            self._rate_sample = (now, episodes, pieces)
+        elif now - self._rate_sample[0] >= UPDATE_INTERVAL:
+            then, old_episodes, old_pieces = self._rate_sample
+            self._rates = ((episodes - old_episodes) / (now - then),
+                           (pieces - old_pieces) / (now - then))
+            self._rate_sample = (now, episodes, pieces)
+
+        if table or self._last_table_stats is None or \
+                now - self._last_table_stats >= TABLE_STATS_INTERVAL:
+            self._last_table_stats = now
+            estimate = self._estimate(UPDATE_INTERVAL if table
+                                      else TABLE_STATS_INTERVAL)
+            self._table_stats = (estimate.states, estimate.table_bytes)
+
+        since_checkpoint = float('nan')
+        if agent.checkpointer is not None:
+            since_checkpoint = now - agent.checkpointer.last_checkpoint
+
+        lookups = agent.q_lookups
+        self.registry.set({
+            'episodes_total': episodes,
+            'pieces_total': pieces,
+            'episodes_per_second': self._rates[0],
+            'pieces_per_second': self._rates[1],
+            'q_entries': len(agent.Q),
+            'q_states': self._table_stats[0],
+            'q_bytes': self._table_stats[1],
+            'q_lookups_total': lookups,
+            'q_hit_ratio': agent.q_hits / float(lookups) if lookups else 0.0,
+            'seconds_since_checkpoint': since_checkpoint,
+        })
+
+    def _estimate(self, max_age):
+        """
+        :param max_age: seconds an estimate of the MemoryTracker may be old
+        """
+        if self.agent.memory is not None:
+            # the tracker estimates the table anyway
+            return self.agent.memory.estimate(max_age)
+        return memory.estimate(self.agent.Q)
+
+
+class _Exporter(object):
+    def __init__(self, loop):
+        """
+        :param loop: function the thread runs until the exporter is stopped
+        """
+        self._loop = loop
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class MetricsFileWriter(_Exporter):
+    """
+    Rewrites a file with the metrics every interval seconds, e.g. for the
+    textfile collector of the Prometheus node exporter. The file is
+    replaced by renaming, readers never see a partial file.
+    """
+
+    def __init__(self, registry, path, interval=DEFAULT_EXPORT_INTERVAL):
+        super(MetricsFileWriter, self).__init__(self._write_every_interval)
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+
+    def write(self):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(self.registry.render())
+        os.rename(temporary, self.path)
+
+    def stop(self):
+        super(MetricsFileWriter, self).stop()
+        self.write()
+
+    def _write_every_interval(self):
+        while not self._stop.is_set():
+            self.write()
+            self._stop.wait(self.interval)
+
+
+class MetricsServer(_Exporter):
+    """
+    Serves the metrics at http://host:port/metrics.
+    """
+
+    def __init__(self, registry, port, host=DEFAULT_HOST):
+        super(MetricsServer, self).__init__(self._serve)
+        import BaseHTTPServer
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render()
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = BaseHTTPServer.HTTPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+
+    def stop(self):
+        self.server.shutdown()
+        super(MetricsServer, self).stop()
+        self.server.server_close()
+
+    def _serve(self):
+        self.server.serve_forever(poll_interval=0.5)
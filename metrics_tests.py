@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+import urllib2
+
+from agent import Agent
+import memory
+from memory import MemoryTracker
+from metrics import MetricsFileWriter, MetricsRegistry, MetricsServer, \
+    TrainingMetrics
+
+
+class MetricsRegistryTest(unittest.TestCase):
+    def test_render(self):
+        registry = MetricsRegistry()
+        registry.counter('pieces_total', 'Pieces placed.')
+        registry.gauge('rate', 'A rate.')
+        registry.set({'pieces_total': 3, 'rate': float('nan')})
+
+        self.assertEqual('# HELP tetris_pieces_total Pieces placed.\n'
+                         '# TYPE tetris_pieces_total counter\n'
+                         'tetris_pieces_total 3\n'
+                         '# HELP tetris_rate A rate.\n'
+                         '# TYPE tetris_rate gauge\n'
+                         'tetris_rate NaN\n', registry.render())
+
+    def test_metrics_are_registered_once(self):
+        registry = MetricsRegistry()
+
+        self.assertIs(registry.gauge('a', 'A.'), registry.gauge('a', 'A.'))
+        self.assertEqual({'a': 0}, registry.snapshot())
+
+
+class TrainingMetricsTest(unittest.TestCase):
+    def test_counters_of_the_agent(self):
+        agent = Agent()
+        agent.seed(0)
+        training = TrainingMetrics(agent)
+
+        agent.run(5)
+        training.update(table=True)
+
+        values = training.registry.snapshot()
+        self.assertEqual(5, values['episodes_total'])
+        self.assertEqual(agent.pieces_placed, values['pieces_total'])
+        self.assertGreater(values['pieces_total'], 0)
+        self.assertEqual(len(agent.Q), values['q_entries'])
+        self.assertEqual(memory.estimate(agent.Q).states, values['q_states'])
+        self.assertEqual(agent.q_lookups, values['q_lookups_total'])
+        self.assertTrue(0 <= values['q_hit_ratio'] <= 1)
+        self.assertNotEqual(values['seconds_since_checkpoint'],
+                            values['seconds_since_checkpoint'])
+
+    def test_estimate_of_the_memory_tracker(self):
+        agent = Agent()
+        agent.seed(0)
+        tracker = MemoryTracker(agent)
+        training = TrainingMetrics(agent)
+        agent.run(2)
+
+        training.update()
+
+        self.assertEqual(1, len(tracker.history['episode']))
+        self.assertEqual(tracker.latest.states,
+                         training.registry.snapshot()['q_states'])
+
+
+class ExporterTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.registry.counter('episodes_total', 'Episodes played.')
+        self.registry.set({'episodes_total': 7})
+
+    def test_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'metrics.prom')
+            writer = MetricsFileWriter(self.registry, path, 60).start()
+            self.registry.set({'episodes_total': 8})
+            writer.stop()
+
+            with open(path) as f:
+                self.assertIn('tetris_episodes_total 8\n', f.read())
+            self.assertEqual(['metrics.prom'], os.listdir(directory))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_http(self):
+        server = MetricsServer(self.registry, 0).start()
+        try:
+            url = 'http://127.0.0.1:{0}/metrics'.format(server.port)
+            self.assertIn('tetris_episodes_total 7\n',
+                          urllib2.urlopen(url).read())
+            self.assertRaises(urllib2.HTTPError, urllib2.urlopen,
+                              url + '/other')
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+"""
+Performance regression gate.
+
+Runs the benchmarks of benchmarks.py and compares them with a baseline
+recorded before on the same machine. A benchmark regresses if its median
+ops/s dropped by more than its tolerance and the drop is clearly larger than
+the noise of both measurements, estimated by the median absolute deviation
+(MAD) of their rounds. The gate exits with status 1 if any benchmark
+regressed.
+
+The baseline is a result file of benchmarks.py. It contains the workload
+(number of boards, seed, minimum time per round and agent configuration),
+check runs the benchmarks with exactly that workload and refuses options that
+differ from it. Tolerances can be added per benchmark name pattern:
+
+    "tolerances": {"agent.*": 0.05, "features.field_to_bitvector": 0.2}
+
+Usage:
+    python perf_gate.py record baseline.json --config config.json
+    python perf_gate.py check baseline.json
+    python perf_gate.py compare baseline.json benchmarks.json
+"""
+import argparse
+import fnmatch
+import json
+import sys
+
+import benchmarks
+from evaluation import percentile
+
+DEFAULT_TOLERANCE = 0.1  # relative drop of the median ops/s
+DEFAULT_NOISE_FACTOR = 3.0  # drops within this many MADs are noise
+DEFAULT_REPEAT = 7
+MAD_TO_STD = 1.4826  # MAD of normally distributed values to std
+
+REGRESSED = 'regressed'
+IMPROVED = 'improved'
+UNCHANGED = 'unchanged'
+MISSING = 'missing'
+NEW = 'new'
+WORKLOAD = ['boards', 'seed', 'min_time', 'config']
+WORKLOAD_DEFAULTS = {'boards': benchmarks.DEFAULT_BOARDS, 'seed': 0,
+                     'min_time': benchmarks.DEFAULT_MIN_TIME, 'config': {}}
+
+
+def median(values):
+    return percentile(sorted(values), 50)
+
+
+def mad(values):
+    """
+    :return: median absolute deviation from the median
+    """
+    center = median(values)
+    return median([abs(v - center) for v in values])
+
+
+def tolerance_for(name, tolerances, default=DEFAULT_TOLERANCE):
+    """
+    :param tolerances: dictionary from name patterns to tolerances, an exact
+                       name wins over the longest matching pattern
+    """
+    if name in tolerances:
+        return tolerances[name]
+    patterns = [p for p in tolerances if fnmatch.fnmatchcase(name, p)]
+    if not patterns:
+        return default
+    return tolerances[max(patterns, key=len)]
+
+
+def compare_benchmark(baseline_rounds, current_rounds, tolerance,
+                      noise_factor=DEFAULT_NOISE_FACTOR):
+    """
+    :param baseline_rounds: ops/s of the rounds of the baseline
+    :param current_rounds: ops/s of the rounds of the current run
+    :return: dictionary with the medians, MADs, relative change and status
+    """
+    baseline_median = median(baseline_rounds)
+    current_median = median(current_rounds)
+    noise = noise_factor * MAD_TO_STD * (mad(baseline_rounds) +
+                                         mad(current_rounds))
+    difference = current_median - baseline_median
+    change = difference / baseline_median if baseline_median else 0.0
+
+    status = UNCHANGED
+    if abs(difference) > noise:
+        if change < -tolerance:
+            status = REGRESSED
+        elif change > tolerance:
+            status = IMPROVED
+    return {
+        'baseline': baseline_median,
+        'baseline_mad': mad(baseline_rounds),
+        'current': current_median,
+        'current_mad': mad(current_rounds),
+        'change': change,
+        'tolerance': tolerance,
+        'status': status,
+    }
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE,
+            noise_factor=DEFAULT_NOISE_FACTOR):
+    """
+    :param baseline: result of benchmarks.run, may contain tolerances
+    :param current: result of benchmarks.run
+    :return: dictionary from benchmark name to the comparison
+    """
+    tolerances = baseline.get('tolerances', {})
+    old = baseline['benchmarks']
+    new = current['benchmarks']
+    report = {}
+    for name in sorted(set(old) | set(new)):
+        if name not in new:
+            report[name] = {'status': MISSING}
+        elif name not in old:
+            report[name] = {'status': NEW,
+                            'current': median(new[name]['rounds'])}
+        else:
+            report[name] = compare_benchmark(
+                old[name]['rounds'], new[name]['rounds'],
+                tolerance_for(name, tolerances, tolerance), noise_factor)
+    return report
+
+
+def regressions(report):
+    return sorted(name for name, result in report.iteritems()
+                  if result['status'] == REGRESSED)
+
+
+def print_report(report, out=sys.stdout):
+    out.write('{0:<55} {1:>12} {2:>12} {3:>8} {4:>6}  {5}\n'.format(
+        'benchmark', 'baseline', 'current', 'change', 'limit', 'status'))
+    for name in sorted(report):
+        result = report[name]
+        if result['status'] in (MISSING, NEW):
+            out.write('{0:<55} {1:>50}\n'.format(name, result['status']))
+            continue
+        marker = ' <<<' if result['status'] == REGRESSED else ''
+        out.write('{0:<55} {1:>12.0f} {2:>12.0f} {3:>+7.1f}% {4:>5.0f}%  '
+                  '{5}{6}\n'.format(name, result['baseline'],
+                                    result['current'], 100 * result['change'],
+                                    100 * result['tolerance'],
+                                    result['status'], marker))
+
+    failed = regressions(report)
+    if failed:
+        out.write('\n{0} benchmark(s) regressed: {1}\n'.format(
+            len(failed), ', '.join(failed)))
+    else:
+        out.write('\nno regressions\n')
+
+
+def workload(args, baseline=None):
+    """
+    :param args: parsed options, None for the ones not given
+    :param baseline: the workload is taken from the baseline if given
+    :return: dictionary with the values of WORKLOAD
+    :raise ValueError: if an option differs from the baseline
+    """
+    given = {'boards': args.boards, 'seed': args.seed,
+             'min_time': args.min_time,
+             'config': _load(args.config) if args.config else None}
+    if baseline is None:
+        return dict((name, WORKLOAD_DEFAULTS[name] if value is None
+                     else value) for name, value in given.iteritems())
+
+    result = dict((name, baseline.get(name, WORKLOAD_DEFAULTS[name]))
+                  for name in WORKLOAD)
+    for name in WORKLOAD:
+        if given[name] is not None and given[name] != result[name]:
+            raise ValueError('{0} {1!r} differs from the baseline: {2!r}'
+                             .format(name, given[name], result[name]))
+    return result
+
+
+def run_benchmarks(names, workload, args):
+    return benchmarks.run(names, workload['boards'], workload['seed'],
+                          workload['config'], repeat=args.repeat,
+                          warmup=args.warmup, min_time=workload['min_time'])
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save(result, path):
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares the benchmarks '
+                                                 'with a baseline.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    record_parser = subparsers.add_parser(
+        'record', help='run the benchmarks and store them as baseline, the '
+                       'tolerances of an existing baseline are kept')
+    record_parser.add_argument('baseline')
+    record_parser.add_argument('--filter', nargs='*', default=None)
+
+    check_parser = subparsers.add_parser(
+        'check', help='run the benchmarks of the baseline and compare')
+    check_parser.add_argument('baseline')
+
+    compare_parser = subparsers.add_parser(
+        'compare', help='compare a result of benchmarks.py with the baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+
+    for subparser in (record_parser, check_parser):
+        # the workload, check takes it from the baseline
+        subparser.add_argument('--boards', type=int, default=None)
+        subparser.add_argument('--seed', type=int, default=None)
+        subparser.add_argument('--min-time', type=float, default=None)
+        subparser.add_argument('--config', default=None,
+                               help='run configuration for the agent '
+                                    'benchmarks')
+        subparser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+        subparser.add_argument('--warmup', type=int,
+                               default=benchmarks.DEFAULT_WARMUP)
+    for subparser in (check_parser, compare_parser):
+        subparser.add_argument('--tolerance', type=float,
+                               default=DEFAULT_TOLERANCE,
+                               help='for benchmarks without own tolerance')
+        subparser.add_argument('--noise-factor', type=float,
+                               default=DEFAULT_NOISE_FACTOR)
+        subparser.add_argument('--json', default=None,
+                               help='file the comparison is written to')
+    check_parser.add_argument('--save', default=None,
+                              help='file the current results are written to')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        result = run_benchmarks(args.filter, workload(args), args)
+        try:
+            result['tolerances'] = _load(args.baseline).get('tolerances', {})
+        except IOError:
+            result['tolerances'] = {}
+        _save(result, args.baseline)
+        print 'recorded {0} benchmarks in {1}'.format(
+            len(result['benchmarks']), args.baseline)
+        return
+
+    baseline = _load(args.baseline)
+    if args.command == 'check':
+        try:
+            used = workload(args, baseline)
+        except ValueError as e:
+            parser.error(str(e))
+        current = run_benchmarks(sorted(baseline['benchmarks']), used, args)
+        # the names select by substring, drop the ones not in the baseline
+        current['benchmarks'] = dict(
+            (name, result) for name, result in
+            current['benchmarks'].iteritems() if name in baseline['benchmarks'])
+        if args.save:
+            _save(current, args.save)
+    else:
+        current = _load(args.current)
+
+    report = compare(baseline, current, args.tolerance, args.noise_factor)
+    print_report(report)
+    if args.json:
+        _save(report, args.json)
+    if regressions(report):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
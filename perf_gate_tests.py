@@ -0,0 +1,94 @@
+from argparse import Namespace
+from StringIO import StringIO
+import unittest
+
+import perf_gate
+
+
+def _result(**rounds):
+    return {'benchmarks': dict((name.replace('_', '.'), {'rounds': values})
+                               for name, values in rounds.iteritems())}
+
+
+class PerfGateTest(unittest.TestCase):
+    def test_median_and_mad(self):
+        self.assertEqual(3, perf_gate.median([5, 1, 3]))
+        self.assertEqual(1, perf_gate.mad([1, 2, 3, 4, 100]))
+
+    def test_tolerance_patterns(self):
+        tolerances = {'agent.*': 0.05, 'agent.step': 0.2, 'a*': 0.3}
+
+        self.assertEqual(0.2, perf_gate.tolerance_for('agent.step',
+                                                      tolerances))
+        self.assertEqual(0.05, perf_gate.tolerance_for('agent.episode',
+                                                       tolerances))
+        self.assertEqual(0.1, perf_gate.tolerance_for('field.place',
+                                                      tolerances, 0.1))
+
+    def test_regression_beyond_tolerance_and_noise(self):
+        result = perf_gate.compare_benchmark([100, 101, 99, 100],
+                                             [80, 81, 79, 80], 0.1)
+
+        self.assertEqual(perf_gate.REGRESSED, result['status'])
+        self.assertAlmostEqual(-0.2, result['change'])
+
+    def test_drop_within_tolerance(self):
+        result = perf_gate.compare_benchmark([100, 100, 100],
+                                             [95, 95, 95], 0.1)
+
+        self.assertEqual(perf_gate.UNCHANGED, result['status'])
+
+    def test_drop_within_noise(self):
+        result = perf_gate.compare_benchmark([100, 140, 60, 100, 120],
+                                             [80, 120, 40, 80, 100], 0.1)
+
+        self.assertEqual(perf_gate.UNCHANGED, result['status'])
+
+    def test_improvement(self):
+        result = perf_gate.compare_benchmark([100, 100], [150, 150], 0.1)
+
+        self.assertEqual(perf_gate.IMPROVED, result['status'])
+
+    def test_compare_uses_baseline_tolerances(self):
+        baseline = _result(agent_step=[100, 100, 100],
+                           field_place=[100, 100, 100],
+                           old=[1, 1, 1])
+        baseline['tolerances'] = {'field.*': 0.5}
+        current = _result(agent_step=[70, 70, 70],
+                          field_place=[70, 70, 70],
+                          new=[1, 1, 1])
+
+        report = perf_gate.compare(baseline, current)
+
+        self.assertEqual(['agent.step'], perf_gate.regressions(report))
+        self.assertEqual(perf_gate.MISSING, report['old']['status'])
+        self.assertEqual(perf_gate.NEW, report['new']['status'])
+        out = StringIO()
+        perf_gate.print_report(report, out)
+        self.assertIn('1 benchmark(s) regressed: agent.step', out.getvalue())
+
+    def _args(self, **given):
+        values = dict(boards=None, seed=None, min_time=None, config=None)
+        values.update(given)
+        return Namespace(**values)
+
+    def test_workload_of_the_baseline(self):
+        baseline = {'boards': 10, 'seed': 3, 'min_time': 0.5,
+                    'config': {'epsilon': 0.1}}
+
+        self.assertEqual(baseline, perf_gate.workload(self._args(), baseline))
+        self.assertEqual(baseline, perf_gate.workload(self._args(seed=3),
+                                                      baseline))
+        self.assertRaises(ValueError, perf_gate.workload,
+                          self._args(boards=20), baseline)
+
+    def test_workload_of_the_options(self):
+        workload = perf_gate.workload(self._args(seed=4))
+
+        self.assertEqual(4, workload['seed'])
+        self.assertEqual(perf_gate.WORKLOAD_DEFAULTS['boards'],
+                         workload['boards'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+"""
+Compiled greedy policy for playing with a trained agent.
+
+The Q-table is reduced to the best action of every state and written to a
+read-only policy file:
+
+    header   magic, version, number of states, length of the metadata
+    metadata JSON (features used for the states), padded to 8 bytes
+    keys     int64[n], sorted PerceivedState.key() values
+    values   float64[n], Q-value of the best action
+    actions  uint8[n], Action.to_id() of the best action
+
+The arrays are memory mapped on loading, so the file is not read into memory.
+Choosing an action is one binary search over the keys. Ties between actions
+are resolved to the lowest action id.
+
+Usage: python policy.py compile q-table.bin policy.bin --config run.json
+       python policy.py play policy.bin --games 100
+"""
+import argparse
+import json
+import random
+import struct
+import time
+
+import numpy
+
+from agent import PerceivedState
+from environment import Action, Environment, SHAPES_BY_NAME
+import features
+import runner
+import util
+
+POLICY_FILENAME = 'policy.bin'
+MAGIC = 'TPOL'
+VERSION = 1
+HEADER = struct.Struct('<4sIQI')
+MAX_PIECES = 10000
+
+
+def compile_policy(Q):
+    """
+    :return: tuple of numpy arrays (keys, values, actions) sorted by key
+    """
+    best = {}
+    for (state, action), value in Q.iteritems():
+        key = state.key()
+        action_id = action.to_id()
+        current = best.get(key)
+        if current is None or value > current[1] or (
+                value == current[1] and action_id < current[0]):
+            best[key] = (action_id, value)
+
+    keys = numpy.array(sorted(best), dtype=numpy.int64)
+    values = numpy.array([best[k][1] for k in keys], dtype=numpy.float64)
+    actions = numpy.array([best[k][0] for k in keys], dtype=numpy.uint8)
+    return keys, values, actions
+
+
+def save_policy(path, keys, values, actions, feature_names):
+    metadata = json.dumps({'features': feature_names})
+    metadata += ' ' * (-(HEADER.size + len(metadata)) % 8)
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(keys), len(metadata)))
+        f.write(metadata)
+        keys.astype('<i8').tofile(f)
+        values.astype('<f8').tofile(f)
+        actions.astype('u1').tofile(f)
+
+
+class PolicyTable(object):
+    """
+    Memory mapped policy file.
+    """
+
+    def __init__(self, path=POLICY_FILENAME):
+        with open(path, 'rb') as f:
+            magic, version, count, metadata_length = HEADER.unpack(
+                f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('{0} is no policy file of version {1}'.format(
+                    path, VERSION))
+            metadata = json.loads(f.read(metadata_length))
+
+        self.feature_names = metadata['features']
+        self.features = [getattr(features, name)
+                         for name in self.feature_names]
+
+        offset = HEADER.size + metadata_length
+        self.keys = self._map(path, '<i8', offset, count)
+        offset += 8 * count
+        self.values = self._map(path, '<f8', offset, count)
+        offset += 8 * count
+        self.actions = self._map(path, 'u1', offset, count)
+
+    @staticmethod
+    def _map(path, dtype, offset, count):
+        if count == 0:
+            return numpy.zeros(0, dtype=dtype)
+        return numpy.memmap(path, dtype=dtype, mode='r', offset=offset,
+                            shape=(count,))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, key):
+        """
+        :return: tuple (action id, value) or None for unknown states
+        """
+        i = int(numpy.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key:
+            return int(self.actions[i]), float(self.values[i])
+        return None
+
+
+class PolicyPlayer(object):
+    """
+    Plays with a compiled policy. In states that are not in the policy a
+    random action is taken.
+    """
+
+    def __init__(self, table, environment=None, shapes=None):
+        """
+        :param shapes: names of the shapes that are played, all by default
+        """
+        self.table = table
+        self.environment = environment or Environment()
+        if shapes is not None:
+            self.environment.possible_shapes = [SHAPES_BY_NAME[name]
+                                                for name in shapes]
+        self.random = random.Random()
+        self.unknown_states = 0
+
+    def seed(self, seed):
+        self.random.seed(seed)
+        self.environment.random.seed(seed + 1)
+        self.environment.initialize()
+
+    def choose_action(self):
+        state = PerceivedState(self.environment, *self.table.features)
+        entry = self.table.lookup(state.key())
+        if entry is not None:
+            return Action.from_id(entry[0])
+
+        self.unknown_states += 1
+        return self.random.choice(self.environment.possible_actions())
+
+    def play_game(self, seed, max_pieces=MAX_PIECES):
+        """
+        :return: tuple (placed blocks, deleted lines)
+        """
+        self.seed(seed)
+        pieces = 0
+        while not self.environment.is_game_over() and pieces < max_pieces:
+            self.environment.execute_action(self.choose_action())
+            pieces += 1
+        return pieces, self.environment.field.lines_deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compiles a Q-table into a '
+                                                 'greedy policy and plays it.')
+    commands = parser.add_subparsers(dest='command')
+
+    compile_parser = commands.add_parser('compile')
+    compile_parser.add_argument('q_table')
+    compile_parser.add_argument('policy', nargs='?', default=POLICY_FILENAME)
+    # the features of the states are not stored in the Q-table
+    compile_parser.add_argument('--config', required=True,
+                                help='run configuration used for training')
+
+    play_parser = commands.add_parser('play')
+    play_parser.add_argument('policy', nargs='?', default=POLICY_FILENAME)
+    play_parser.add_argument('--games', type=int, default=100)
+    play_parser.add_argument('--seed', type=int, default=0)
+    play_parser.add_argument('--config', default=None,
+                             help='run configuration for the shapes')
+    args = parser.parse_args()
+
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+
+    if args.command == 'compile':
+        if 'features' not in config:
+            parser.error('{0} has no features, the states of the policy '
+                         'would not match the Q-table'.format(args.config))
+        agent = runner.RecordingAgent()
+        runner.configure_agent(agent, config)
+        keys, values, actions = compile_policy(util.load_q_table(args.q_table))
+        save_policy(args.policy, keys, values, actions,
+                    [f.__name__ for f in agent.features])
+        print '{0} states written to {1}'.format(len(keys), args.policy)
+    else:
+        player = PolicyPlayer(PolicyTable(args.policy),
+                              shapes=config.get('shapes'))
+
+        start = time.time()
+        results = [player.play_game(args.seed + i) for i in range(args.games)]
+        seconds = time.time() - start
+        pieces = sum(p for p, _ in results)
+        print '{0} games, {1:.1f} blocks on average, {2:.0f} blocks/s, ' \
+              '{3} unknown states'.format(
+                  args.games, pieces / float(args.games), pieces / seconds,
+                  player.unknown_states)
+
+
+if __name__ == '__main__':
+    main()
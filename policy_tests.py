@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from agent import PerceivedState
+from environment import Environment, Action, OShape, IShape
+import features
+import policy
+from policy import PolicyTable, PolicyPlayer
+
+
+class PolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'policy.bin')
+        self.env = Environment()
+        self.features = [features.column_height_differences]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def state(self, shape):
+        self.env.current_shape = shape
+        return PerceivedState(self.env, *self.features)
+
+    def save(self, Q):
+        keys, values, actions = policy.compile_policy(Q)
+        policy.save_policy(self.path, keys, values, actions,
+                           [f.__name__ for f in self.features])
+        return PolicyTable(self.path)
+
+    def test_best_action_of_state_is_compiled(self):
+        o_state = self.state(OShape())
+        i_state = self.state(IShape())
+        Q = {(o_state, Action(2, 0)): -5, (o_state, Action(4, 0)): 3,
+             (i_state, Action(1, 1)): 7}
+
+        table = self.save(Q)
+
+        self.assertEqual(2, len(table))
+        self.assertEqual((Action(4, 0).to_id(), 3.0),
+                         table.lookup(o_state.key()))
+        self.assertEqual((Action(1, 1).to_id(), 7.0),
+                         table.lookup(i_state.key()))
+        self.assertEqual(['column_height_differences'], table.feature_names)
+
+    def test_ties_choose_lowest_action_id(self):
+        state = self.state(OShape())
+        Q = {(state, Action(5, 0)): 1, (state, Action(3, 0)): 1}
+
+        self.assertEqual(Action(3, 0).to_id(),
+                         self.save(Q).lookup(state.key())[0])
+
+    def test_unknown_state_is_none(self):
+        table = self.save({(self.state(OShape()), Action(0, 0)): 1})
+
+        self.assertIsNone(table.lookup(self.state(IShape()).key()))
+
+    def test_empty_table(self):
+        self.assertIsNone(self.save({}).lookup(0))
+
+    def test_player_uses_policy(self):
+        state = self.state(OShape())
+        player = PolicyPlayer(self.save({(state, Action(6, 0)): 1}), self.env)
+
+        self.assertEqual(Action(6, 0), player.choose_action())
+        self.assertEqual(0, player.unknown_states)
+
+    def test_player_with_shapes(self):
+        player = PolicyPlayer(self.save({}), shapes='o')
+        player.seed(0)
+
+        for _ in range(5):
+            self.assertEqual(OShape(), player.environment.current_shape)
+            player.environment.execute_action(player.choose_action())
+
+
+class ActionIdTest(unittest.TestCase):
+    def test_round_trip(self):
+        for action in [Action(0, 0), Action(9, 0), Action(3, 2), Action(0, 3)]:
+            self.assertEqual(action, Action.from_id(action.to_id()))
+
+
+if __name__ == '__main__':
+    unittest.main()
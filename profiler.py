@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""
+Sampling profiler for long training runs.
+
+Unlike cProfile, which slows down every function call, the profiler looks at
+the stack of the agent thread every few milliseconds from a thread of its
+own. The samples are written as collapsed stacks, one line per distinct
+stack with the frames from the outermost to the innermost, separated by ';',
+followed by the number of samples:
+
+    runner:main;agent:run;agent:_episode;agent:_step;environment:place 42
+
+This is the input format of flame graph tools, e.g. flamegraph.pl or
+speedscope. The summary attributes every sample to the innermost function of
+one of the modules in MODULES.
+
+Usage: python profiler.py summary profile.folded
+"""
+import argparse
+from collections import Counter
+import os
+import sys
+import threading
+import time
+
+DEFAULT_INTERVAL = 0.005  # seconds between two samples
+DEFAULT_SECONDS = 30
+MODULES = ['environment', 'features', 'reward_features', 'agent']
+OTHER = 'other'
+
+
+class SamplingProfiler(object):
+    def __init__(self, thread_id=None, interval=DEFAULT_INTERVAL):
+        """
+        :param thread_id: ident of the thread to sample, the calling thread
+                          if None
+        """
+        if thread_id is None:
+            thread_id = threading.current_thread().ident
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._running = False
+        self._thread = None
+        self._window = None  # (path, done) of run_for
+        self._timer = None
+        self._finish_lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._sample)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_for(self, seconds, path, done=None):
+        """
+        Samples for the given seconds and writes the collapsed stacks to
+        path, without blocking the caller. finish() ends it earlier.
+
+        :param done: called with path when the file was written
+        """
+        self._window = (path, done)
+        self.start()
+        self._timer = threading.Timer(seconds, self.finish)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def finish(self):
+        """
+        Ends the window of run_for and writes the file, only the first call
+        has an effect.
+        """
+        with self._finish_lock:
+            if self._window is None:
+                return
+            path, done = self._window
+            self._window = None
+        self._timer.cancel()
+        self.stop()
+        self.write(path)
+        if done is not None:
+            done(path)
+
+    def _sample(self):
+        frames = sys._current_frames
+        while self._running:
+            frame = frames().get(self.thread_id)
+            if frame is None:
+                break  # the thread has ended
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples[';'.join(stack)] += 1
+            del frame
+            time.sleep(self.interval)
+        self._running = False
+
+    def write(self, path):
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as f:
+            for stack, count in sorted(self.samples.iteritems()):
+                f.write('{0} {1}\n'.format(stack, count))
+        os.rename(temporary, path)
+
+
+def frame_name(frame):
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return '{0}:{1}'.format(module, code.co_name)
+
+
+def read(path):
+    """
+    :return: Counter from collapsed stack to number of samples
+    """
+    samples = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            samples[stack] += int(count)
+    return samples
+
+
+def summary(samples, modules=MODULES):
+    """
+    Attributes every sample to the innermost frame of one of the modules.
+
+    :return: list of (module, share of the samples) sorted by share, the
+             samples without a frame of the modules are counted as OTHER
+    """
+    total = sum(samples.itervalues())
+    counts = Counter()
+    for stack, count in samples.iteritems():
+        owner = OTHER
+        for name in reversed(stack.split(';')):
+            module = name.split(':', 1)[0]
+            if module in modules:
+                owner = module
+                break
+        counts[owner] += count
+    return [(module, count / float(total))
+            for module, count in counts.most_common()] if total else []
+
+
+def top_functions(samples, limit=10):
+    """
+    :return: list of (innermost function, share of the samples)
+    """
+    total = sum(samples.itervalues())
+    counts = Counter()
+    for stack, count in samples.iteritems():
+        counts[stack.rsplit(';', 1)[-1]] += count
+    return [(name, count / float(total))
+            for name, count in counts.most_common(limit)] if total else []
+
+
+def print_summary(samples, out=sys.stdout):
+    out.write('{0} samples\n'.format(sum(samples.itervalues())))
+    for module, share in summary(samples):
+        out.write('{0:>6.1f}%  {1}\n'.format(100 * share, module))
+    out.write('\n')
+    for name, share in top_functions(samples):
+        out.write('{0:>6.1f}%  {1}\n'.format(100 * share, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarizes a profile of '
+                                                 'collapsed stacks.')
+    subparsers = parser.add_subparsers(dest='command')
+    summary_parser = subparsers.add_parser(
+        'summary', help='share of the samples per module and function')
+    summary_parser.add_argument('profile')
+    args = parser.parse_args()
+
+    if args.command == 'summary':
+        print_summary(read(args.profile))
+
+
+if __name__ == '__main__':
+    main()
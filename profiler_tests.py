@@ -0,0 +1,74 @@
+from collections import Counter
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import profiler
+from profiler import SamplingProfiler
+
+
+def busy(event):
+    while not event.is_set():
+        sum(range(100))
+
+
+class SamplingProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'profile.folded')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_samples_other_thread(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=busy, args=(stop,))
+        thread.start()
+        done = []
+        try:
+            sampler = SamplingProfiler(thread.ident, interval=0.001)
+            sampler.run_for(0.1, self.path, done.append)
+            deadline = time.time() + 5
+            while not done and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            stop.set()
+            thread.join()
+
+        self.assertEqual([self.path], done)
+        samples = profiler.read(self.path)
+        self.assertGreater(sum(samples.values()), 0)
+        for stack in samples:
+            self.assertIn('profiler_tests:busy', stack)
+
+    def test_finish_early(self):
+        sampler = SamplingProfiler(interval=0.001)
+        sampler.run_for(60, self.path)
+        time.sleep(0.02)
+
+        sampler.finish()
+        sampler.finish()
+
+        self.assertFalse(sampler.running)
+        self.assertGreater(sum(profiler.read(self.path).values()), 0)
+
+    def test_summary(self):
+        samples = Counter({
+            'runner:main;agent:_step;environment:place': 2,
+            'runner:main;agent:_step;features:max_height;copy:deepcopy': 1,
+            'runner:main': 1,
+        })
+
+        self.assertEqual([('environment', 0.5), ('features', 0.25),
+                          ('other', 0.25)],
+                         sorted(profiler.summary(samples),
+                                key=lambda (m, s): (-s, m)))
+        self.assertEqual(('environment:place', 0.5),
+                         profiler.top_functions(samples)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Downsamples the placed blocks per episode for the learning curve.
+
+The plot only shows a few thousand points, however long the agent has been
+running. EpisodePyramid keeps the minimum, maximum and sum of the episodes
+in buckets of FACTOR, FACTOR ** 2, ... episodes and updates them as new
+episodes arrive, so a downsampled curve is available without going through
+the whole history.
+"""
+from array import array
+
+import numpy
+
+FACTOR = 4
+# about the width of the plot in pixels, more buckets would not be visible
+MAX_BUCKETS = 500
+AGGREGATES = {'minimum': numpy.min, 'maximum': numpy.max,
+              'total': numpy.sum}
+
+
+class PyramidLevel(object):
+    """
+    Buckets of the same size. The last bucket may be incomplete.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.minimum = array('I')
+        self.maximum = array('I')
+        self.total = array('d')
+
+    def __len__(self):
+        return len(self.minimum)
+
+    def extend(self, values, count):
+        """
+        :param values: numpy array with the new episodes
+        :param count: number of episodes before the new ones
+        """
+        filled = count % self.size
+        if filled:
+            head = values[:self.size - filled]
+            values = values[len(head):]
+            self.minimum[-1] = min(self.minimum[-1], int(head.min()))
+            self.maximum[-1] = max(self.maximum[-1], int(head.max()))
+            self.total[-1] += float(head.sum())
+        for name in AGGREGATES:
+            _reduce_to(getattr(self, name), values, self.size, name)
+
+    def add_parent(self):
+        """
+        :return: level with FACTOR of these buckets per bucket
+        """
+        parent = PyramidLevel(self.size * FACTOR)
+        for name in AGGREGATES:
+            children = getattr(self, name)
+            _reduce_to(getattr(parent, name),
+                       numpy.frombuffer(children, dtype=_dtype(children)),
+                       FACTOR, name)
+        return parent
+
+
+def _dtype(values):
+    return numpy.uint32 if values.typecode == 'I' else numpy.float64
+
+
+def _reduce_to(target, values, size, name):
+    """
+    Appends the aggregate of every size values to target, the last group
+    may be incomplete.
+    """
+    if not len(values):
+        return
+    reduce = AGGREGATES[name]
+    complete = len(values) // size * size
+    parts = []
+    if complete:
+        parts.append(reduce(values[:complete].reshape(-1, size), axis=1))
+    if complete < len(values):
+        parts.append([reduce(values[complete:])])
+    result = numpy.concatenate(parts).astype(_dtype(target))
+    target.fromstring(result.tobytes())
+
+
+class EpisodePyramid(object):
+    """
+    Multi-resolution summary of the placed blocks per episode. Adding
+    episodes costs O(levels) per episode, getting a curve costs
+    O(MAX_BUCKETS) independent of the number of episodes.
+    """
+
+    def __init__(self, max_buckets=MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self.count = 0
+        self.levels = [PyramidLevel(FACTOR)]
+
+    def __len__(self):
+        return self.count
+
+    def extend(self, values):
+        """
+        :param values: placed blocks of the new episodes
+        """
+        if not len(values):
+            return
+        values = numpy.asarray(values, dtype=numpy.uint32)
+        for level in self.levels:
+            level.extend(values, self.count)
+        self.count += len(values)
+        while len(self.levels[-1]) > self.max_buckets:
+            self.levels.append(self.levels[-1].add_parent())
+
+    def level_for(self, buckets):
+        """
+        :return: the finest level with at most the given number of buckets
+        """
+        for level in self.levels:
+            if len(level) <= buckets:
+                return level
+        return self.levels[-1]
+
+    def curve(self, raw=None):
+        """
+        Shape preserving downsampling: the minimum and the maximum of every
+        bucket, so single long episodes stay visible.
+
+        :param raw: all episodes, returned unchanged if there are no more
+                    than 2 * max_buckets of them
+        :return: x and y of the envelope, x and y of the bucket means
+        """
+        if raw is not None and self.count <= 2 * self.max_buckets:
+            x = numpy.arange(self.count)
+            y = numpy.asarray(raw[:self.count], dtype=numpy.uint32)
+            return x, y, x, y
+        if not self.count:
+            empty = numpy.empty(0)
+            return empty, empty, empty, empty
+        level = self.level_for(self.max_buckets)
+        size = level.size
+        buckets = len(level)
+        starts = numpy.arange(buckets) * size
+        x = numpy.empty(2 * buckets)
+        x[0::2] = starts
+        x[1::2] = starts + size / 2.0
+        y = numpy.empty(2 * buckets)
+        y[0::2] = numpy.frombuffer(level.minimum, dtype=numpy.uint32)
+        y[1::2] = numpy.frombuffer(level.maximum, dtype=numpy.uint32)
+        # the last bucket may be incomplete
+        sizes = numpy.full(buckets, size, dtype=numpy.float64)
+        sizes[-1] = self.count - starts[-1]
+        means = numpy.frombuffer(level.total, dtype=numpy.float64) / sizes
+        return x, y, starts + sizes / 2.0, means
@@ -0,0 +1,78 @@
+from array import array
+import random
+import unittest
+
+from pyramid import EpisodePyramid, FACTOR
+
+
+class EpisodePyramidTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(3)
+        self.values = [random.randint(0, 500) for _ in range(1234)]
+
+    def _assert_level(self, pyramid, level):
+        size = level.size
+        for i in range(len(level)):
+            bucket = self.values[i * size:(i + 1) * size]
+            self.assertEqual(min(bucket), level.minimum[i])
+            self.assertEqual(max(bucket), level.maximum[i])
+            self.assertEqual(sum(bucket), level.total[i])
+
+    def test_incremental_updates_match_buckets(self):
+        pyramid = EpisodePyramid(max_buckets=10)
+        position = 0
+        for chunk in [1, 2, 3, 50, 1, 700, 477]:
+            pyramid.extend(array('I', self.values[position:position + chunk]))
+            position += chunk
+
+        self.assertEqual(len(self.values), len(pyramid))
+        self.assertLessEqual(len(pyramid.levels[-1]), 10)
+        for level in pyramid.levels:
+            self._assert_level(pyramid, level)
+
+    def test_levels_grow_by_factor(self):
+        pyramid = EpisodePyramid(max_buckets=10)
+        pyramid.extend(self.values)
+
+        sizes = [level.size for level in pyramid.levels]
+        self.assertEqual([FACTOR ** (i + 1) for i in range(len(sizes))],
+                         sizes)
+
+    def test_curve_keeps_extremes(self):
+        self.values[777] = 10000
+        pyramid = EpisodePyramid(max_buckets=10)
+        pyramid.extend(self.values)
+
+        x, y, mean_x, means = pyramid.curve(self.values)
+
+        self.assertLessEqual(len(y), 20)
+        self.assertEqual(10000, y.max())
+        self.assertEqual(min(self.values), y.min())
+        self.assertAlmostEqual(sum(self.values),
+                               sum(means * _bucket_sizes(pyramid, mean_x)))
+
+    def test_short_history_is_not_downsampled(self):
+        pyramid = EpisodePyramid(max_buckets=1000)
+        pyramid.extend(self.values)
+
+        x, y, _, _ = pyramid.curve(self.values)
+
+        self.assertEqual(range(len(self.values)), list(x))
+        self.assertEqual(self.values, list(y))
+
+    def test_empty(self):
+        x, y, mean_x, means = EpisodePyramid().curve()
+
+        self.assertEqual(0, len(x))
+        self.assertEqual(0, len(means))
+
+
+def _bucket_sizes(pyramid, mean_x):
+    level = pyramid.level_for(pyramid.max_buckets)
+    sizes = [level.size] * len(mean_x)
+    sizes[-1] = len(pyramid) - (len(mean_x) - 1) * level.size
+    return sizes
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+"""
+Compressed snapshots of Q-tables.
+
+The rows of a Q-table (see qtable.py) are split into chunks of consecutive
+state keys that are compressed independently:
+
+    header   magic, version, codec, level, number of states, number of
+             Q-values, action slots per state, number of chunks, length of
+             the metadata, offset of the chunk index
+    metadata JSON
+    chunks   compressed: keys int64[n], values float64[n, ACTION_SLOTS] with
+             the bytes of the floats shuffled (all first bytes, all second
+             bytes, ...), offsets uint32[n + 1] into the state data, state
+             data
+    index    per chunk: first key, last key, states, offset, length
+
+The shuffle puts the similar exponent bytes and the NaN of missing entries
+next to each other, which the codecs compress much better. With the index a
+single state is found by decompressing one chunk, and the chunks of a whole
+table can be decompressed in parallel.
+
+Usage: python qsnapshot.py compress q-table.bin q-table.tqz --codec bz2
+       python qsnapshot.py extract q-table.tqz q-table.bin --processes 4
+       python qsnapshot.py archive q-table.bin snapshots --keep 30
+       python qsnapshot.py history snapshots
+"""
+import argparse
+import bisect
+import bz2
+import json
+import multiprocessing
+import os
+import signal
+import struct
+import time
+import zlib
+
+import numpy
+
+from environment import ACTION_SLOTS
+import qtable
+from qtable import LazyQTable, MappedQTable
+
+MAGIC = 'TQZC'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIQQIIIQ')
+INDEX_ENTRY = struct.Struct('<qqIQQ')
+
+CODECS = {
+    'zlib': (0, zlib.compress, zlib.decompress),
+    'bz2': (1, bz2.compress, bz2.decompress),
+}
+CODEC_NAMES = dict((codec[0], name) for name, codec in CODECS.iteritems())
+DEFAULT_CODEC = 'zlib'
+DEFAULT_LEVEL = 6
+CHUNK_STATES = 4096
+
+SNAPSHOT_EXTENSION = '.tqz'
+POOL_TIMEOUT = 60 * 60 * 24 * 365
+
+
+def is_snapshot_file(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def save(Q, path, codec=DEFAULT_CODEC, level=DEFAULT_LEVEL, metadata=None,
+         chunk_states=CHUNK_STATES):
+    """
+    Writes a compressed snapshot to a temporary file that is renamed to path
+    when complete.
+
+    :param codec: name of a codec in CODECS
+    :param level: compression level from 1 (fast) to 9 (small)
+    """
+    if codec not in CODECS:
+        raise ValueError('unknown codec {0}'.format(codec))
+    if not 1 <= level <= 9:
+        raise ValueError('compression level must be between 1 and 9')
+    codec_id, compress, _ = CODECS[codec]
+    keys, values, data = qtable.table_arrays(Q)
+    entries = int(numpy.count_nonzero(values == values))
+    metadata = json.dumps(metadata or {})
+
+    temporary = path + '.tmp'
+    index = []
+    with open(temporary, 'wb') as f:
+        f.write('\0' * HEADER.size)
+        f.write(metadata)
+        for start in xrange(0, len(keys), chunk_states):
+            stop = min(start + chunk_states, len(keys))
+            payload = compress(_pack_chunk(keys[start:stop],
+                                           values[start:stop],
+                                           data[start:stop]), level)
+            index.append((int(keys[start]), int(keys[stop - 1]),
+                          stop - start, f.tell(), len(payload)))
+            f.write(payload)
+
+        index_offset = f.tell()
+        for entry in index:
+            f.write(INDEX_ENTRY.pack(*entry))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, codec_id, level, len(keys),
+                            entries, ACTION_SLOTS, len(index), len(metadata),
+                            index_offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(temporary, path)
+
+
+def _pack_chunk(keys, values, data):
+    offsets = numpy.zeros(len(keys) + 1, dtype='<u4')
+    offsets[1:] = numpy.cumsum([len(d) for d in data])
+    shuffled = numpy.ascontiguousarray(values, dtype='<f8').view(
+        numpy.uint8).reshape(-1, 8).T
+    return ''.join([keys.astype('<i8').tostring(), shuffled.tostring(),
+                    offsets.tostring()] + list(data))
+
+
+def _unpack_chunk(payload, states):
+    position = 8 * states
+    keys = numpy.frombuffer(payload, dtype='<i8', count=states)
+    shuffled = numpy.frombuffer(payload, dtype=numpy.uint8,
+                                count=8 * states * ACTION_SLOTS,
+                                offset=position)
+    values = shuffled.reshape(8, -1).T.copy().view('<f8').reshape(
+        states, ACTION_SLOTS)
+    position += 8 * states * ACTION_SLOTS
+    offsets = numpy.frombuffer(payload, dtype='<u4', count=states + 1,
+                               offset=position)
+    position += 4 * (states + 1)
+    data = payload[position:position + int(offsets[-1])]
+    return keys, values, offsets, data
+
+
+def _read_chunk((path, codec_id, offset, length, states)):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        payload = f.read(length)
+    return _unpack_chunk(CODECS[CODEC_NAMES[codec_id]][2](payload),
+                         states)
+
+
+def _init_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class CompressedQTable(object):
+    """
+    Reads the index of a snapshot; chunks are only decompressed when needed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, self.codec_id, self.level, self.state_count, \
+                self.entry_count, slots, chunk_count, metadata_length, \
+                index_offset = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('{0} is no snapshot of version {1}'.format(
+                    path, VERSION))
+            if slots != ACTION_SLOTS:
+                raise ValueError('{0} was written for {1} actions per '
+                                 'state'.format(path, slots))
+            self.metadata = json.loads(f.read(metadata_length))
+            f.seek(index_offset)
+            self.index = [INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+                          for _ in xrange(chunk_count)]
+        self.codec = CODEC_NAMES[self.codec_id]
+        self._first_keys = [entry[0] for entry in self.index]
+        self._chunk = None
+        self._chunk_table = None
+
+    def chunk_of(self, state):
+        """
+        :return: index of the chunk that would contain the state or -1
+        """
+        key = state.key()
+        chunk = bisect.bisect_right(self._first_keys, key) - 1
+        if chunk < 0 or key > self.index[chunk][1]:
+            return -1
+        return chunk
+
+    def get(self, key):
+        """
+        :param key: tuple (state, action) as used in Agent.Q
+        :return: the Q-value or None, only the chunk of the state is
+                 decompressed
+        """
+        chunk = self.chunk_of(key[0])
+        if chunk < 0:
+            return None
+        if chunk != self._chunk:
+            self._chunk_table = self.read([chunk])
+            self._chunk = chunk
+        return self._chunk_table.get(key)
+
+    def read(self, chunks=None, processes=1):
+        """
+        Decompresses the given chunks (all by default).
+
+        :param processes: number of processes decompressing in parallel
+        :return: MappedQTable kept in memory
+        """
+        if chunks is None:
+            chunks = range(len(self.index))
+        tasks = [(self.path, self.codec_id, self.index[c][3],
+                  self.index[c][4], self.index[c][2]) for c in chunks]
+
+        if processes > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(processes, _init_worker)
+            try:
+                parts = pool.map_async(_read_chunk, tasks).get(POOL_TIMEOUT)
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            parts = map(_read_chunk, tasks)
+        return _concatenate(parts, self.metadata)
+
+
+def _concatenate(parts, metadata):
+    if not parts:
+        return MappedQTable.from_arrays(
+            numpy.zeros(0, dtype='<i8'),
+            numpy.zeros((0, ACTION_SLOTS), dtype='<f8'),
+            numpy.zeros(1, dtype='<u8'), numpy.zeros(0, dtype=numpy.uint8),
+            metadata)
+
+    offsets = [numpy.zeros(1, dtype='<u8')]
+    base = 0
+    for _, _, chunk_offsets, data in parts:
+        offsets.append(chunk_offsets[1:].astype('<u8') + base)
+        base += len(data)
+    return MappedQTable.from_arrays(
+        numpy.concatenate([part[0] for part in parts]),
+        numpy.concatenate([part[1] for part in parts]),
+        numpy.concatenate(offsets),
+        numpy.frombuffer(''.join(part[3] for part in parts),
+                         dtype=numpy.uint8),
+        metadata)
+
+
+def load(path, processes=1):
+    """
+    Decompresses a snapshot into a LazyQTable that can be used as Agent.Q.
+    """
+    return LazyQTable(CompressedQTable(path).read(processes=processes))
+
+
+class SnapshotHistory(object):
+    """
+    Directory of compressed snapshots named by the time they were taken.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def add(self, Q, codec=DEFAULT_CODEC, level=DEFAULT_LEVEL,
+            metadata=None):
+        """
+        :return: path of the new snapshot
+        """
+        name = time.strftime('q-%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory, name + SNAPSHOT_EXTENSION)
+        number = 1
+        while os.path.exists(path):
+            number += 1
+            path = os.path.join(self.directory, '{0}-{1}{2}'.format(
+                name, number, SNAPSHOT_EXTENSION))
+        save(Q, path, codec, level, metadata)
+        return path
+
+    def paths(self):
+        """
+        :return: paths of all snapshots, oldest first
+        """
+        names = [name for name in os.listdir(self.directory)
+                 if name.endswith(SNAPSHOT_EXTENSION)]
+        return [os.path.join(self.directory, name)
+                for name in sorted(names, key=_snapshot_order)]
+
+    def load(self, index=-1, processes=1):
+        """
+        :param index: position in paths(), by default the latest snapshot
+        """
+        return load(self.paths()[index], processes)
+
+    def prune(self, keep):
+        """
+        Deletes all but the latest keep snapshots.
+        """
+        paths = self.paths()
+        for path in paths[:max(0, len(paths) - keep)]:
+            os.remove(path)
+
+
+def _snapshot_order(name):
+    # q-20160101-120000.tqz before q-20160101-120000-2.tqz
+    parts = name[:-len(SNAPSHOT_EXTENSION)].split('-')
+    return parts[:3], int(parts[3]) if len(parts) > 3 else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compressed snapshots of '
+                                                 'Q-tables.')
+    commands = parser.add_subparsers(dest='command')
+    compress_parser = commands.add_parser('compress')
+    compress_parser.add_argument('table')
+    compress_parser.add_argument('output')
+    archive_parser = commands.add_parser(
+        'archive', help='add a snapshot to a history directory')
+    archive_parser.add_argument('table')
+    archive_parser.add_argument('directory')
+    archive_parser.add_argument('--keep', type=int, default=None,
+                                help='number of snapshots to keep')
+    for command_parser in (compress_parser, archive_parser):
+        command_parser.add_argument('--codec', choices=sorted(CODECS),
+                                    default=DEFAULT_CODEC)
+        command_parser.add_argument('--level', type=int,
+                                    default=DEFAULT_LEVEL)
+    extract_parser = commands.add_parser(
+        'extract', help='write a snapshot in the format of qtable.py')
+    extract_parser.add_argument('snapshot')
+    extract_parser.add_argument('output')
+    extract_parser.add_argument('--processes', type=int, default=1)
+    history_parser = commands.add_parser('history')
+    history_parser.add_argument('directory')
+    args = parser.parse_args()
+
+    if args.command == 'compress':
+        save(qtable.load(args.table), args.output, args.codec, args.level)
+        print '{0} bytes written to {1}'.format(
+            os.path.getsize(args.output), args.output)
+    elif args.command == 'archive':
+        history = SnapshotHistory(args.directory)
+        path = history.add(qtable.load(args.table), args.codec, args.level)
+        if args.keep is not None:
+            history.prune(args.keep)
+        print 'snapshot written to {0}'.format(path)
+    elif args.command == 'extract':
+        start = time.time()
+        Q = load(args.snapshot, args.processes)
+        qtable.save(Q, args.output)
+        print '{0} entries extracted in {1:.2f}s'.format(
+            len(Q), time.time() - start)
+    else:
+        for path in SnapshotHistory(args.directory).paths():
+            snapshot = CompressedQTable(path)
+            print '{0}  {1} states  {2} entries  {3} bytes  {4}'.format(
+                os.path.basename(path), snapshot.state_count,
+                snapshot.entry_count, os.path.getsize(path), snapshot.codec)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+from collections import defaultdict
+import os
+import shutil
+import tempfile
+import unittest
+
+from agent import PerceivedState
+from environment import Action
+import qsnapshot
+from qsnapshot import CompressedQTable, SnapshotHistory
+import qtable
+import util
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'q.tqz')
+        self.Q = defaultdict(int)
+        for i in range(10):
+            state = PerceivedState.from_values('o', [i, -i, 0])
+            self.Q[(state, Action(i % 8, 0))] = i * 0.5
+            self.Q[(state, Action(0, 1))] = -i
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        for codec in sorted(qsnapshot.CODECS):
+            qsnapshot.save(self.Q, self.path, codec, 1, chunk_states=3)
+
+            table = qsnapshot.load(self.path)
+
+            self.assertEqual(len(self.Q), len(table))
+            self.assertEqual(dict(self.Q), dict(table.iteritems()))
+
+    def test_parallel_decompression(self):
+        qsnapshot.save(self.Q, self.path, chunk_states=3)
+
+        table = qsnapshot.load(self.path, processes=2)
+
+        self.assertEqual(dict(self.Q), dict(table.iteritems()))
+
+    def test_single_value_reads_one_chunk(self):
+        qsnapshot.save(self.Q, self.path, chunk_states=3)
+        snapshot = CompressedQTable(self.path)
+        state = PerceivedState.from_values('o', [4, -4, 0])
+
+        self.assertEqual(4, len(snapshot.index))
+        self.assertEqual(2.0, snapshot.get((state, Action(4, 0))))
+        self.assertIsNone(snapshot.get((state, Action(5, 0))))
+        self.assertIsNone(snapshot.get(
+            (PerceivedState.from_values('i', [1]), Action(0, 0))))
+
+    def test_partial_load(self):
+        qsnapshot.save(self.Q, self.path, chunk_states=3)
+        snapshot = CompressedQTable(self.path)
+
+        part = snapshot.read([1, 3])
+
+        self.assertEqual(4, part.state_count)
+        self.assertEqual(8, part.entry_count)
+        for (state, action), value in part.iteritems():
+            self.assertEqual(self.Q[(state, action)], value)
+
+    def test_loaded_table_can_be_saved_uncompressed(self):
+        qsnapshot.save(self.Q, self.path)
+        table = util.load_q_table(self.path)
+        table[(PerceivedState.from_values('i', [1]), Action(0, 0))] = 3
+        path = os.path.join(self.directory, 'q.bin')
+
+        qtable.save(table, path)
+
+        self.assertEqual(dict(table.iteritems()),
+                         dict(qtable.load(path).iteritems()))
+
+    def test_empty_table(self):
+        qsnapshot.save({}, self.path)
+
+        self.assertEqual(0, len(qsnapshot.load(self.path)))
+
+    def test_invalid_level(self):
+        self.assertRaises(ValueError, qsnapshot.save, self.Q, self.path,
+                          'zlib', 0)
+
+
+class SnapshotHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.history = SnapshotHistory(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_latest_snapshot_is_loaded(self):
+        state = PerceivedState.from_values('o', [1])
+        for value in range(3):
+            self.history.add({(state, Action(0, 0)): value})
+
+        self.assertEqual(3, len(self.history.paths()))
+        self.assertEqual(2, self.history.load()[(state, Action(0, 0))])
+        self.assertEqual(0, self.history.load(0)[(state, Action(0, 0))])
+
+    def test_prune_keeps_latest(self):
+        paths = [self.history.add({}) for _ in range(4)]
+
+        self.history.prune(2)
+
+        self.assertEqual(paths[2:], self.history.paths())
+
+
+if __name__ == '__main__':
+    unittest.main()
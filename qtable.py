@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+"""
+Binary file format for Q-tables.
+
+    header   magic, version, number of states, number of Q-values,
+             action slots per state, length of the metadata
+    metadata JSON, padded to 8 bytes
+    keys     int64[states], sorted PerceivedState.key() values
+    values   float64[states, ACTION_SLOTS], row of Q-values per state indexed
+             by Action.to_id(), NaN where the table has no entry
+    offsets  uint64[states + 1], offsets into the state data
+    states   repr((shape, features)) of every state, to rebuild the
+             PerceivedState objects
+
+The arrays are written in bulk and memory mapped when loading, so opening a
+table takes the same short time for every size. LazyQTable makes a mapped
+file usable as Agent.Q: entries are read from the file on first access and
+changes are kept in memory until the table is saved again.
+
+Usage: python qtable.py convert q-table.pickle q-table.bin
+       python qtable.py info q-table.bin
+"""
+import argparse
+import ast
+import json
+import os
+import pickle
+import struct
+
+import numpy
+
+from agent import PerceivedState
+from environment import Action, ACTION_SLOTS
+
+MAGIC = 'TQTB'
+VERSION = 1
+HEADER = struct.Struct('<4sIQQII')
+
+
+def is_qtable_file(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def save(Q, path, metadata=None):
+    """
+    Writes the Q-table to a temporary file that is renamed to path when
+    complete, so path always contains a complete table.
+
+    :param metadata: dictionary stored as JSON in the file
+    """
+    keys, values, data = table_arrays(Q)
+    offsets = numpy.zeros(len(keys) + 1, dtype='<u8')
+    offsets[1:] = numpy.cumsum([len(d) for d in data])
+    entries = int(numpy.count_nonzero(values == values))
+
+    metadata = json.dumps(metadata or {})
+    metadata += ' ' * (-(HEADER.size + len(metadata)) % 8)
+
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(keys), entries, ACTION_SLOTS,
+                            len(metadata)))
+        f.write(metadata)
+        keys.astype('<i8').tofile(f)
+        values.astype('<f8').tofile(f)
+        offsets.tofile(f)
+        f.write(''.join(data))
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(temporary, path)
+
+
+def table_arrays(Q):
+    """
+    :return: tuple (sorted keys, values matrix, list of state data) with one
+             row per state
+    """
+    mapped = getattr(Q, 'mapped', None)
+    if mapped is None:
+        return _rows(Q.iteritems())
+    # only the changes of a LazyQTable have to be converted
+    return _merge(mapped, *_rows(dict.iteritems(Q)))
+
+
+def _rows(items):
+    """
+    Groups Q-table entries by state.
+
+    :return: tuple (sorted keys, values matrix, list of state data)
+    """
+    rows = {}
+    states = {}
+    for (state, action), value in items:
+        key = state.key()
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = [float('nan')] * ACTION_SLOTS
+            states[key] = state
+        else:
+            other = states[key]
+            if other.shape != state.shape or other.features != state.features:
+                raise ValueError('states {0} and {1} have the same key'.format(
+                    state_data(other), state_data(state)))
+        row[action.to_id()] = value
+
+    keys = sorted(rows)
+    values = numpy.array([rows[key] for key in keys],
+                         dtype=numpy.float64).reshape(len(keys), ACTION_SLOTS)
+    return (numpy.array(keys, dtype=numpy.int64), values,
+            [state_data(states[key]) for key in keys])
+
+
+def _merge(mapped, keys, values, data):
+    """
+    Applies rows to the rows of a mapped file.
+    """
+    merged_values = numpy.array(mapped.values, dtype=numpy.float64)
+    positions = numpy.searchsorted(mapped.keys, keys)
+    found = positions < mapped.state_count
+    found[found] = mapped.keys[positions[found]] == keys[found]
+
+    changed = merged_values[positions[found]]
+    update = values[found]
+    has_value = update == update
+    changed[has_value] = update[has_value]
+    merged_values[positions[found]] = changed
+
+    new = ~found
+    all_keys = numpy.concatenate([numpy.array(mapped.keys), keys[new]])
+    all_values = numpy.concatenate([merged_values, values[new]])
+    offsets = numpy.array(mapped.offsets).tolist()
+    mapped_data = mapped.data.tostring()
+    all_data = [mapped_data[offsets[i]:offsets[i + 1]]
+                for i in xrange(mapped.state_count)]
+    all_data.extend(d for d, is_new in zip(data, new) if is_new)
+
+    order = numpy.argsort(all_keys, kind='mergesort')
+    return (all_keys[order], all_values[order],
+            [all_data[i] for i in order])
+
+
+def state_data(state):
+    return repr((state.shape, tuple(state.features)))
+
+
+def load(path):
+    return LazyQTable(MappedQTable(path))
+
+
+def convert(pickle_path, path):
+    """
+    Converts a pickled Q-table of earlier versions into the binary format.
+    """
+    with open(pickle_path, 'rb') as f:
+        Q = pickle.load(f)
+    save(Q, path)
+    return len(Q)
+
+
+class MappedQTable(object):
+    """
+    Read-only access to a Q-table file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, self.state_count, self.entry_count, slots, \
+                metadata_length = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('{0} is no Q-table of version {1}'.format(
+                    path, VERSION))
+            if slots != ACTION_SLOTS:
+                raise ValueError('{0} was written for {1} actions per '
+                                 'state'.format(path, slots))
+            self.metadata = json.loads(f.read(metadata_length))
+
+        n = self.state_count
+        offset = HEADER.size + metadata_length
+        self.keys = self._map('<i8', offset, (n,))
+        offset += 8 * n
+        self.values = self._map('<f8', offset, (n, ACTION_SLOTS))
+        offset += 8 * n * ACTION_SLOTS
+        self.offsets = self._map('<u8', offset, (n + 1,))
+        offset += 8 * (n + 1)
+        self.data = self._map('u1', offset, (int(self.offsets[-1]),))
+
+        # the agent asks for all actions of a state in a row
+        self._last_key = None
+        self._last_row = -1
+
+    @classmethod
+    def from_arrays(cls, keys, values, offsets, data, metadata=None):
+        """
+        Table with the same interface, but kept in memory instead of mapped
+        from a file.
+        """
+        table = cls.__new__(cls)
+        table.path = None
+        table.metadata = metadata or {}
+        table.keys = keys
+        table.values = values
+        table.offsets = offsets
+        table.data = data
+        table.state_count = len(keys)
+        table.entry_count = int(numpy.count_nonzero(values == values))
+        table._last_key = None
+        table._last_row = -1
+        return table
+
+    def _map(self, dtype, offset, shape):
+        if 0 in shape:
+            return numpy.zeros(shape, dtype=dtype)
+        return numpy.memmap(self.path, dtype=dtype, mode='r', offset=offset,
+                            shape=shape)
+
+    def row(self, state):
+        """
+        :return: index of the state in the file or -1
+        """
+        key = state.key()
+        if key == self._last_key:
+            return self._last_row
+
+        row = int(numpy.searchsorted(self.keys, key))
+        if row >= self.state_count or self.keys[row] != key:
+            row = -1
+        self._last_key = key
+        self._last_row = row
+        return row
+
+    def get(self, key):
+        """
+        :param key: tuple (state, action) as used in Agent.Q
+        :return: the Q-value or None
+        """
+        row = self.row(key[0])
+        if row < 0:
+            return None
+        value = self.values[row, key[1].to_id()]
+        if value != value:  # NaN
+            return None
+        return float(value)
+
+    def state(self, row):
+        data = self.data[int(self.offsets[row]):int(self.offsets[row + 1])]
+        shape, features = ast.literal_eval(data.tostring())
+        return PerceivedState.from_values(shape, features)
+
+    def iteritems(self):
+        for row in xrange(self.state_count):
+            state = None
+            values = self.values[row]
+            for action_id in numpy.flatnonzero(values == values):
+                if state is None:
+                    state = self.state(row)
+                yield (state, Action.from_id(int(action_id))), \
+                    float(values[action_id])
+
+
+class LazyQTable(dict):
+    """
+    Q-table backed by a MappedQTable. Like defaultdict(int), reading a
+    missing entry inserts 0.
+    """
+
+    def __init__(self, mapped):
+        dict.__init__(self)
+        self.mapped = mapped
+        self._added = 0  # entries in memory that are not in the file
+
+    def __missing__(self, key):
+        value = self.mapped.get(key)
+        if value is None:
+            value = 0
+            self._added += 1
+        dict.__setitem__(self, key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        if not dict.__contains__(self, key) and self.mapped.get(key) is None:
+            self._added += 1
+        dict.__setitem__(self, key, value)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or \
+            self.mapped.get(key) is not None
+
+    def __len__(self):
+        return self.mapped.entry_count + self._added
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def __reduce__(self):
+        # pickled as plain dictionary, the mapped file is not pickled
+        return dict, (list(self.iteritems()),)
+
+    def iteritems(self):
+        for item in dict.iteritems(self):
+            yield item
+        for key, value in self.mapped.iteritems():
+            if not dict.__contains__(self, key):
+                yield key, value
+
+    def iterkeys(self):
+        for key, _ in self.iteritems():
+            yield key
+
+    def itervalues(self):
+        for _, value in self.iteritems():
+            yield value
+
+    def items(self):
+        return list(self.iteritems())
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def copy(self):
+        """
+        Copy that shares the (read-only) file but not the changes.
+        """
+        table = LazyQTable(self.mapped)
+        dict.update(table, self)
+        table._added = self._added
+        return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Converts and inspects '
+                                                 'Q-table files.')
+    commands = parser.add_subparsers(dest='command')
+    convert_parser = commands.add_parser('convert',
+                                         help='pickle to binary format')
+    convert_parser.add_argument('pickle')
+    convert_parser.add_argument('output')
+    info_parser = commands.add_parser('info')
+    info_parser.add_argument('table')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        print '{0} entries written to {1}'.format(
+            convert(args.pickle, args.output), args.output)
+    else:
+        mapped = MappedQTable(args.table)
+        print '{0} states, {1} entries, {2} bytes'.format(
+            mapped.state_count, mapped.entry_count,
+            os.path.getsize(args.table))
+
+
+if __name__ == '__main__':
+    main()
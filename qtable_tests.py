@@ -0,0 +1,149 @@
+from collections import defaultdict
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from agent import Agent, PerceivedState
+from environment import Environment, Action, OShape, IShape
+import features
+import qsnapshot
+import qtable
+from qtable import LazyQTable, MappedQTable
+import util
+
+
+class QTableFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'q.bin')
+        env = Environment()
+        env.current_shape = OShape()
+        self.o_state = PerceivedState(env, features.column_height_differences,
+                                      features.max_height)
+        env.current_shape = IShape()
+        env.field.blocks[3][11] = 'i'
+        self.i_state = PerceivedState(env, features.column_height_differences,
+                                      features.max_height)
+        self.Q = defaultdict(int)
+        self.Q[(self.o_state, Action(0, 0))] = -1.5
+        self.Q[(self.o_state, Action(8, 0))] = 2
+        self.Q[(self.i_state, Action(3, 1))] = 0.25
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def load(self):
+        qtable.save(self.Q, self.path)
+        return qtable.load(self.path)
+
+    def test_round_trip(self):
+        table = self.load()
+
+        self.assertEqual(3, len(table))
+        self.assertEqual(dict(self.Q), dict(table.iteritems()))
+        self.assertEqual(2, table[(self.o_state, Action(8, 0))])
+
+    def test_rebuilt_states_are_equal(self):
+        qtable.save(self.Q, self.path)
+        mapped = MappedQTable(self.path)
+
+        states = set(key[0] for key, _ in mapped.iteritems())
+
+        self.assertEqual(2, mapped.state_count)
+        self.assertEqual(set([self.o_state, self.i_state]), states)
+        for state in states:
+            self.assertIn(state.key(),
+                          [self.o_state.key(), self.i_state.key()])
+
+    def test_missing_entry_is_inserted_with_zero(self):
+        table = self.load()
+        key = (self.o_state, Action(4, 0))
+
+        self.assertNotIn(key, table)
+        self.assertEqual(0, table[key])
+        self.assertIn(key, table)
+        self.assertEqual(4, len(table))
+
+    def test_changes_are_kept_in_memory(self):
+        table = self.load()
+        table[(self.o_state, Action(0, 0))] = 7
+        table[(self.i_state, Action(0, 0))] = 1
+
+        self.assertEqual(4, len(table))
+        self.assertEqual(7, dict(table.iteritems())[(self.o_state,
+                                                     Action(0, 0))])
+        self.assertEqual(-1.5, MappedQTable(self.path).get(
+            (self.o_state, Action(0, 0))))
+
+    def test_saving_a_loaded_table(self):
+        table = self.load()
+        table[(self.i_state, Action(0, 0))] = 1
+        other = os.path.join(self.directory, 'other.bin')
+
+        qtable.save(table, other)
+
+        self.assertEqual(dict(table.iteritems()),
+                         dict(qtable.load(other).iteritems()))
+
+    def test_agent_learns_with_loaded_table(self):
+        agent = Agent()
+        agent.seed(0)
+        agent.Q = self.load()
+
+        agent.run(3)
+
+        self.assertTrue(len(agent.Q) > 3)
+
+    def test_empty_table(self):
+        self.Q = {}
+
+        self.assertEqual(0, len(self.load()))
+
+
+class UtilTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        env = Environment()
+        self.Q = {(PerceivedState(env, features.max_height),
+                   Action(1, 0)): 3.0}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_pickled_tables_are_still_loaded(self):
+        path = os.path.join(self.directory, 'old.bin')
+        with open(path, 'wb') as f:
+            pickle.dump(self.Q, f)
+
+        self.assertEqual(self.Q, util.load_q_table(path))
+
+    def test_converted_table_is_loaded_lazily(self):
+        old = os.path.join(self.directory, 'old.bin')
+        new = os.path.join(self.directory, 'new.bin')
+        with open(old, 'wb') as f:
+            pickle.dump(self.Q, f)
+
+        qtable.convert(old, new)
+        table = util.load_q_table(new)
+
+        self.assertIsInstance(table, LazyQTable)
+        self.assertEqual(self.Q, dict(table.iteritems()))
+
+    def test_compressed_round_trip(self):
+        path = os.path.join(self.directory, 'q.tqz')
+
+        util.save_q_table(self.Q, path, codec='bz2', level=1)
+        table = util.load_q_table(path)
+
+        self.assertTrue(qsnapshot.is_snapshot_file(path))
+        self.assertEqual(self.Q, dict(table.iteritems()))
+
+    def test_unknown_codec(self):
+        self.assertRaises(ValueError, util.save_q_table, self.Q,
+                          os.path.join(self.directory, 'q.tqz'), 'lzma')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+"""
+Cross-entropy optimizer for the reward weights of the Environment.
+
+Every generation draws weight vectors from a normal distribution, lets a
+greedy player use each vector as evaluation function for a number of games
+and refits mean and deviation to the best vectors (the elite). The games are
+spread over a process pool. Every finished generation is appended to a log
+file (one JSON document per line), from which an interrupted run is resumed.
+
+Usage: python reward_optimizer.py --generations 20 --log cem-log.jsonl
+"""
+import argparse
+import copy
+import json
+import math
+import multiprocessing
+import os
+import random
+import signal
+import time
+
+from environment import Environment
+import reward_features
+
+LOG_FILENAME = 'cem-log.jsonl'
+MAX_PIECES = 1000
+DEFAULT_STD = 10.0
+
+# large timeout for AsyncResult.get(), otherwise KeyboardInterrupt is not
+# delivered to the main process while waiting for the pool (python 2)
+POOL_TIMEOUT = 60 * 60 * 24 * 365
+
+
+def default_weights():
+    """
+    The reward weights an Environment starts with, keyed by function name.
+    """
+    return dict((f.__name__, w) for f, w in Environment().rewards.iteritems())
+
+
+def rewards_from_weights(weights):
+    """
+    Converts {name: weight} into the {function: weight} dictionary used in
+    Environment.rewards. Rewards that are not in weights keep their default
+    weight, so a subset of the rewards can be optimized.
+    """
+    merged = default_weights()
+    merged.update(weights)
+    return dict((getattr(reward_features, name), weight)
+                for name, weight in merged.iteritems())
+
+
+def play_greedy_game(weights, seed, max_pieces=MAX_PIECES):
+    """
+    Plays one game in which every shape is placed with the action that has
+    the highest immediate reward under the given weights.
+
+    :param weights: dictionary reward function name -> weight
+    :param seed: seed for the shape sequence
+    :return: tuple (placed blocks, deleted lines)
+    """
+    environment = Environment()
+    environment.rewards = rewards_from_weights(weights)
+    environment.random.seed(seed)
+    environment.initialize()
+
+    pieces = 0
+    while not environment.is_game_over() and pieces < max_pieces:
+        environment.execute_action(best_greedy_action(environment))
+        pieces += 1
+
+    return pieces, environment.field.lines_deleted
+
+
+def best_greedy_action(environment):
+    best_action = None
+    best_reward = None
+    for action in environment.possible_actions():
+        reward = _lookahead_reward(environment, action)
+        if best_reward is None or reward > best_reward:
+            best_reward = reward
+            best_action = action
+    return best_action
+
+
+def _lookahead_reward(environment, action):
+    """
+    Reward of the action on a copy of the environment. The copy keeps the
+    shape that was placed as current shape, so the next shape of the real
+    sequence is neither drawn nor revealed.
+    """
+    trial = copy.copy(environment)
+    trial.field = copy.copy(environment.field)
+    trial.field.blocks = [list(col) for col in environment.field.blocks]
+
+    # shapes are mutated while dropping, so always use fresh instances
+    shape_class = type(environment.current_shape)
+    trial.field.place(shape_class(), action)
+    trial.current_shape = shape_class()
+    return trial._calculate_reward()
+
+
+def _play_task(task):
+    weights, seed, max_pieces = task
+    return play_greedy_game(weights, seed, max_pieces)
+
+
+def _ignore_sigint():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class CrossEntropyOptimizer(object):
+    def __init__(self, log_path=LOG_FILENAME, reward_names=None, seed=0,
+                 population=50, elite_fraction=0.2, games=10,
+                 max_pieces=MAX_PIECES, noise=4.0, noise_decay=0.1,
+                 processes=None):
+        """
+        :param log_path: file the generations are appended to
+        :param reward_names: reward functions to optimize, defaults to the
+                             rewards an Environment starts with
+        :param noise: extra variance added when refitting, prevents the
+                      distribution from collapsing too early
+        :param noise_decay: amount the extra variance shrinks per generation
+        :param processes: size of the process pool, defaults to all cores
+        """
+        initial = default_weights()
+        if reward_names is None:
+            reward_names = sorted(initial)
+        self.reward_names = list(reward_names)
+        self.log_path = log_path
+        self.seed = seed
+        self.population = population
+        self.elite_size = max(1, int(round(population * elite_fraction)))
+        self.games = games
+        self.max_pieces = max_pieces
+        self.noise = noise
+        self.noise_decay = noise_decay
+        self.processes = processes or multiprocessing.cpu_count()
+
+        self.generation = 0
+        self.mean = [float(initial.get(name, 0)) for name in self.reward_names]
+        self.std = [DEFAULT_STD for _ in self.reward_names]
+        self.best_score = None
+        self.best_weights = None
+
+    def resume(self):
+        """
+        Restores the state after the last generation found in the log file.
+
+        :return: number of generations already completed
+        """
+        if not os.path.exists(self.log_path):
+            return 0
+
+        last = None
+        valid_bytes = 0
+        with open(self.log_path, 'r+') as f:
+            for line in iter(f.readline, ''):
+                try:
+                    if not line.endswith('\n'):
+                        raise ValueError('incomplete line')
+                    last = json.loads(line)
+                except ValueError:
+                    # generation that was cut off while writing
+                    f.truncate(valid_bytes)
+                    break
+                valid_bytes += len(line)
+
+        if last is None:
+            return 0
+        if last['rewards'] != self.reward_names or last['seed'] != self.seed:
+            raise ValueError(
+                "{0} was written with other rewards or another seed".format(
+                    self.log_path))
+
+        self.generation = last['generation'] + 1
+        self.mean = last['next_mean']
+        self.std = last['next_std']
+        self.best_score = last['best_score']
+        self.best_weights = last['best_weights']
+        return self.generation
+
+    def run(self, generations):
+        """
+        Runs generations until the given total number of generations is
+        reached, continuing from the log file if it exists.
+        """
+        self.resume()
+        pool = multiprocessing.Pool(self.processes, _ignore_sigint)
+        try:
+            while self.generation < generations:
+                self._log(self.run_generation(pool))
+        finally:
+            pool.terminate()
+            pool.join()
+
+        return self.best_weights
+
+    def run_generation(self, pool):
+        start = time.time()
+        rand = random.Random(self.seed * 100003 + self.generation)
+
+        candidates = [self._sample(rand) for _ in range(self.population)]
+        # every candidate plays the same shape sequences
+        seeds = [rand.randint(0, 2 ** 31) for _ in range(self.games)]
+
+        tasks = [(self._as_weights(candidate), seed, self.max_pieces)
+                 for candidate in candidates for seed in seeds]
+        chunksize = max(1, len(tasks) // (self.processes * 4))
+        results = pool.map_async(_play_task, tasks, chunksize).get(
+            POOL_TIMEOUT)
+
+        scores = []
+        for i in range(self.population):
+            games = results[i * self.games:(i + 1) * self.games]
+            scores.append(sum(pieces for pieces, _ in games) /
+                          float(self.games))
+
+        ranking = sorted(range(self.population), key=lambda i: -scores[i])
+        elite = [candidates[i] for i in ranking[:self.elite_size]]
+
+        if self.best_score is None or scores[ranking[0]] > self.best_score:
+            self.best_score = scores[ranking[0]]
+            self.best_weights = self._as_weights(candidates[ranking[0]])
+
+        record = {
+            'generation': self.generation,
+            'seed': self.seed,
+            'rewards': self.reward_names,
+            'mean': self.mean,
+            'std': self.std,
+            'scores': scores,
+            'elite_score': sum(scores[i] for i in ranking[:self.elite_size]) /
+                           float(self.elite_size),
+            'best_score': self.best_score,
+            'best_weights': self.best_weights,
+        }
+
+        self.mean, self.std = self._refit(elite)
+        self.generation += 1
+
+        record['next_mean'] = self.mean
+        record['next_std'] = self.std
+        record['seconds'] = time.time() - start
+        return record
+
+    def _sample(self, rand):
+        return [rand.gauss(m, s) for m, s in zip(self.mean, self.std)]
+
+    def _refit(self, elite):
+        extra_variance = max(self.noise - self.generation * self.noise_decay,
+                             0)
+        mean = []
+        std = []
+        for i in range(len(self.reward_names)):
+            values = [candidate[i] for candidate in elite]
+            m = sum(values) / len(values)
+            variance = sum((v - m) ** 2 for v in values) / len(values)
+            mean.append(m)
+            std.append(math.sqrt(variance + extra_variance))
+        return mean, std
+
+    def _as_weights(self, vector):
+        return dict(zip(self.reward_names, vector))
+
+    def _log(self, record):
+        with open(self.log_path, 'a') as f:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        print 'generation {0}: elite {1:.1f}, best {2:.1f} ({3:.1f}s)'.format(
+            record['generation'], record['elite_score'], record['best_score'],
+            record['seconds'])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Optimizes the reward weights with the cross-entropy '
+                    'method.')
+    parser.add_argument('--generations', type=int, default=20)
+    parser.add_argument('--population', type=int, default=50)
+    parser.add_argument('--elite-fraction', type=float, default=0.2)
+    parser.add_argument('--games', type=int, default=10,
+                        help='games per weight vector')
+    parser.add_argument('--max-pieces', type=int, default=MAX_PIECES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--rewards', default=None,
+                        help='comma separated reward functions to optimize, '
+                             'the others keep their default weight')
+    parser.add_argument('--log', default=LOG_FILENAME)
+    args = parser.parse_args()
+
+    reward_names = args.rewards.split(',') if args.rewards else None
+    optimizer = CrossEntropyOptimizer(args.log, reward_names, args.seed,
+                                      args.population, args.elite_fraction,
+                                      args.games, args.max_pieces,
+                                      processes=args.processes)
+    try:
+        best = optimizer.run(args.generations)
+    except KeyboardInterrupt:
+        print 'interrupted, run again with the same log to resume'
+        return
+
+    print 'best weights (avg {0:.1f} blocks):'.format(optimizer.best_score)
+    for name in optimizer.reward_names:
+        print '  {0}: {1:.3f}'.format(name, best[name])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from environment import Environment, Action, OShape
+import reward_features
+import reward_optimizer
+from reward_optimizer import CrossEntropyOptimizer
+
+
+class GreedyGameTest(unittest.TestCase):
+    def setUp(self):
+        self.weights = reward_optimizer.default_weights()
+
+    def test_same_seed_plays_same_game(self):
+        first = reward_optimizer.play_greedy_game(self.weights, 42)
+        second = reward_optimizer.play_greedy_game(self.weights, 42)
+
+        self.assertEqual(first, second)
+
+    def test_game_with_a_subset_of_the_rewards(self):
+        subset = {'removed_line_reward': self.weights['removed_line_reward']}
+
+        self.assertEqual(reward_optimizer.play_greedy_game(self.weights, 5),
+                         reward_optimizer.play_greedy_game(subset, 5))
+
+    def test_game_is_capped(self):
+        pieces, _ = reward_optimizer.play_greedy_game(self.weights, 1, 3)
+
+        self.assertEqual(3, pieces)
+
+    def test_lookahead_does_not_change_environment(self):
+        env = Environment()
+        env.current_shape = OShape()
+        blocks = [list(col) for col in env.field.blocks]
+        state = env.random.getstate()
+
+        reward_optimizer.best_greedy_action(env)
+
+        self.assertEqual(blocks, env.field.blocks)
+        self.assertEqual(state, env.random.getstate())
+        self.assertEqual(OShape(), env.current_shape)
+        self.assertEqual(9, len(env.possible_actions()))
+
+    def test_other_rewards_keep_their_default(self):
+        rewards = reward_optimizer.rewards_from_weights(
+            {'removed_line_reward': 3})
+
+        expected = dict(Environment().rewards)
+        expected[reward_features.removed_line_reward] = 3
+        self.assertEqual(expected, rewards)
+
+    def test_greedy_action_prefers_removed_line(self):
+        env = Environment()
+        env.rewards = {reward_features.removed_line_reward: 1}
+        for col in env.field.blocks[2:]:
+            col[-1] = 'l'
+            col[-2] = 'l'
+        env.current_shape = OShape()
+
+        self.assertEqual(Action(0, 0),
+                         reward_optimizer.best_greedy_action(env))
+
+
+class CrossEntropyOptimizerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log = os.path.join(self.directory, 'log.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_refit_uses_elite_mean(self):
+        optimizer = CrossEntropyOptimizer(self.log, ['game_over_reward'],
+                                          noise=0)
+        mean, std = optimizer._refit([[1.0], [3.0]])
+
+        self.assertEqual([2.0], mean)
+        self.assertEqual([1.0], std)
+
+    def test_resume_restores_last_generation(self):
+        optimizer = CrossEntropyOptimizer(self.log, ['game_over_reward'])
+        optimizer._log({'generation': 0, 'seed': 0,
+                        'rewards': ['game_over_reward'],
+                        'next_mean': [5.0], 'next_std': [2.0],
+                        'best_score': 10.0, 'elite_score': 9.0,
+                        'best_weights': {'game_over_reward': 4.0},
+                        'seconds': 1.0})
+        with open(self.log, 'a') as f:
+            f.write('{"generation": 1, "se')
+
+        resumed = CrossEntropyOptimizer(self.log, ['game_over_reward'])
+
+        self.assertEqual(1, resumed.resume())
+        self.assertEqual([5.0], resumed.mean)
+        self.assertEqual([2.0], resumed.std)
+        with open(self.log) as f:
+            self.assertEqual(1, len(f.readlines()))
+
+    def test_resume_rejects_other_configuration(self):
+        CrossEntropyOptimizer(self.log, ['game_over_reward'])._log(
+            {'generation': 0, 'seed': 0, 'rewards': ['game_over_reward'],
+             'next_mean': [5.0], 'next_std': [2.0], 'best_score': 10.0,
+             'elite_score': 9.0, 'best_weights': {}, 'seconds': 1.0})
+
+        with self.assertRaises(ValueError):
+            CrossEntropyOptimizer(self.log, ['game_over_reward'],
+                                  seed=1).resume()
+
+
+if __name__ == '__main__':
+    unittest.main()
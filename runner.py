@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+"""
+Headless training without the GUI.
+
+A run is described by a configuration dictionary with the same settings that
+can be made in the GUI. Functions and shapes are referenced by name, so
+configurations can be stored as JSON:
+
+    {"alpha": 0.9, "gamma": 0.8, "epsilon": 0.3,
+     "features": ["column_height_differences"],
+     "rewards": {"game_over_reward": 25, "removed_line_reward": 10},
+     "shapes": "oijlzts", "max_pieces": 5000, "episode_seconds": 10}
+
+max_pieces and episode_seconds limit the length of a single episode.
+
+Usage: python runner.py --config run.json --episodes 1000 --seed 0
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from agent import Agent
+from environment import SHAPES_BY_NAME
+import features
+import reward_features
+from checkpoint import Checkpointer
+from episode_log import EpisodeLogWriter, RecentEpisodes, \
+    EPISODE_LOG_FILENAME, RECENT_EPISODES
+import game_trace
+from instrumentation import Instrumentation
+from metrics import MetricsFileWriter, MetricsServer, TrainingMetrics
+import metrics
+import memory
+from memory import MemoryLimitError, MemoryTracker
+import profiler
+from profiler import SamplingProfiler
+import util
+
+DEFAULT_EPISODES = 1000
+
+
+class RecordingAgent(Agent):
+    """
+    Agent that records the number of placed blocks of the latest episodes
+    and, if episode_log is set, writes them to an episode log.
+    """
+
+    def __init__(self, history=RECENT_EPISODES):
+        """
+        :param history: number of latest episodes kept in memory
+        """
+        super(RecordingAgent, self).__init__()
+        self.step_count = 0
+        self.steps_per_episode = RecentEpisodes(history)
+        self.episode_log = None
+
+    def _episode(self):
+        self.step_count = 0
+        super(RecordingAgent, self)._episode()
+        self.steps_per_episode.append(self.step_count)
+        if self.episode_log is not None:
+            self.episode_log.append(self.step_count,
+                                    self.environment.field.lines_deleted)
+
+    def _step(self):
+        super(RecordingAgent, self)._step()
+        self.step_count += 1
+
+
+def configure_agent(agent, config):
+    """
+    Applies the settings of a run configuration to the agent. Settings
+    missing in the configuration keep their defaults, so do rewards missing
+    in the rewards; a weight of 0 switches a reward off.
+    """
+    for name in ('alpha', 'gamma', 'epsilon'):
+        if name in config:
+            setattr(agent, name, float(config[name]))
+
+    if 'features' in config:
+        agent.features = [getattr(features, name)
+                          for name in config['features']]
+
+    if 'rewards' in config:
+        rewards = dict(agent.environment.rewards)
+        rewards.update((getattr(reward_features, name), float(weight))
+                       for name, weight in config['rewards'].iteritems())
+        # rewards without weight are not calculated at all
+        agent.environment.rewards = dict(
+            (reward, weight) for reward, weight in rewards.iteritems()
+            if weight)
+
+    if 'shapes' in config:
+        agent.environment.possible_shapes = [SHAPES_BY_NAME[name]
+                                             for name in config['shapes']]
+        agent.environment.choose_next_shape()
+
+    if 'max_pieces' in config:
+        agent.max_pieces_per_episode = config['max_pieces']
+
+    if 'episode_seconds' in config:
+        agent.episode_time_budget = config['episode_seconds']
+
+
+def agent_config(agent):
+    """
+    The settings of the agent as run configuration, inverse of
+    configure_agent.
+    """
+    environment = agent.environment
+    config = {
+        'alpha': agent.alpha,
+        'gamma': agent.gamma,
+        'epsilon': agent.epsilon,
+        'features': [f.__name__ for f in agent.features],
+        'rewards': dict((f.__name__, w)
+                        for f, w in environment.rewards.iteritems()),
+        'shapes': ''.join(sorted(shape().name
+                                 for shape in environment.possible_shapes)),
+    }
+    if agent.max_pieces_per_episode is not None:
+        config['max_pieces'] = agent.max_pieces_per_episode
+    if agent.episode_time_budget is not None:
+        config['episode_seconds'] = agent.episode_time_budget
+    return config
+
+
+def train(config, episodes=DEFAULT_EPISODES, seed=None, agent=None,
+          time_budget=None):
+    """
+    Trains a (new) agent with the given configuration.
+
+    :param time_budget: seconds after which no further episode is started
+
+    :return: the trained RecordingAgent
+    """
+    if agent is None:
+        agent = RecordingAgent()
+    configure_agent(agent, config)
+    if seed is not None:
+        agent.seed(seed)
+    agent.run(episodes, time_budget)
+    return agent
+
+
+def _print_profile(path):
+    print 'profile written to {0}'.format(path)
+    profiler.print_summary(profiler.read(path))
+
+
+def _print_memory(estimate):
+    print ('{0} entries, {1} states, {2:.0f} bytes per entry, {3:.0f} bytes '
+           'per state, {4:.1f} MB').format(
+        estimate.entries, estimate.states, estimate.bytes_per_entry,
+        estimate.bytes_per_state, estimate.table_bytes / 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Trains an agent without '
+                                                 'the GUI.')
+    parser.add_argument('--config', default=None,
+                        help='JSON file with the run configuration')
+    parser.add_argument('--episodes', type=int, default=DEFAULT_EPISODES)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='seconds after which no episode is started')
+    parser.add_argument('--load', default=None,
+                        help='Q-table to continue training with')
+    parser.add_argument('--save', default=None,
+                        help='file the Q-table is saved to')
+    parser.add_argument('--save-codec', default=None,
+                        help='save a compressed snapshot with this codec '
+                             '(zlib or bz2, see qsnapshot.py)')
+    parser.add_argument('--save-level', type=int, default=None,
+                        help='compression level from 1 to 9')
+    parser.add_argument('--checkpoints', default=None,
+                        help='directory for automatic checkpoints, training '
+                             'continues from a checkpoint found there')
+    parser.add_argument('--checkpoint-interval', type=float, default=5,
+                        help='seconds between two checkpoints')
+    parser.add_argument('--timings', type=float, default=None,
+                        metavar='SECONDS',
+                        help='measure the time per phase of a step and print '
+                             'it every SECONDS and at the end, 0 only prints '
+                             'it at the end')
+    parser.add_argument('--metrics-file', default=None,
+                        help='file the metrics are written to regularly in '
+                             'the text format of Prometheus')
+    parser.add_argument('--metrics-interval', type=float,
+                        default=metrics.DEFAULT_EXPORT_INTERVAL,
+                        help='seconds between two writes of --metrics-file')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='serve the metrics at '
+                             'http://127.0.0.1:PORT/metrics')
+    parser.add_argument('--profile', type=float, default=None,
+                        metavar='SECONDS',
+                        help='sample the stack of the training for SECONDS '
+                             'and write it to --profile-output')
+    parser.add_argument('--profile-delay', type=float, default=0,
+                        help='seconds after the start of the training '
+                             'before sampling starts')
+    parser.add_argument('--profile-output', default='profile.folded',
+                        help='file for the collapsed stacks')
+    parser.add_argument('--memory-limit', type=float, default=None,
+                        metavar='MB',
+                        help='memory of the process at which --memory-action '
+                             'is taken, a warning is printed at 90%%')
+    parser.add_argument('--memory-action', choices=memory.ACTIONS,
+                        default=memory.WARN,
+                        help='warn, write a checkpoint or stop the training '
+                             'when the limit is reached')
+    parser.add_argument('--memory-interval', type=float,
+                        default=memory.DEFAULT_INTERVAL,
+                        help='seconds between two records of the size of '
+                             'the Q-table')
+    parser.add_argument('--memory-log', default=None,
+                        help='JSON file the size of the Q-table over the '
+                             'episodes is written to')
+    parser.add_argument('--trace', default=None,
+                        help='file the shapes, actions and rewards of every '
+                             'episode are recorded in, see game_trace.py')
+    args = parser.parse_args()
+
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+
+    agent = RecordingAgent()
+    if args.load:
+        agent.Q = util.load_q_table(args.load)
+    if args.checkpoints:
+        checkpointer = Checkpointer(agent, args.checkpoints,
+                                    args.checkpoint_interval)
+        restored = not args.load and checkpointer.restore()
+        if restored:
+            print 'continuing from checkpoint in {0}'.format(args.checkpoints)
+        agent.episode_log = EpisodeLogWriter(
+            os.path.join(args.checkpoints, EPISODE_LOG_FILENAME),
+            append=restored)
+    if args.timings is not None:
+        Instrumentation(agent, args.timings or None).enable()
+    exporters = []
+    if args.metrics_file or args.metrics_port is not None:
+        registry = TrainingMetrics(agent).registry
+        if args.metrics_file:
+            exporters.append(MetricsFileWriter(registry, args.metrics_file,
+                                               args.metrics_interval))
+        if args.metrics_port is not None:
+            exporters.append(MetricsServer(registry, args.metrics_port))
+        for exporter in exporters:
+            exporter.start()
+    sampler = None
+    if args.profile:
+        sampler = SamplingProfiler()
+        delay = threading.Timer(args.profile_delay, sampler.run_for,
+                                (args.profile, args.profile_output,
+                                 _print_profile))
+        delay.daemon = True
+        delay.start()
+    if args.memory_limit is not None or args.memory_log:
+        limit = None
+        if args.memory_limit is not None:
+            limit = args.memory_limit * 1e6
+        MemoryTracker(agent, limit, args.memory_action,
+                      interval=args.memory_interval)
+    if args.trace:
+        game_trace.TraceRecorder(agent, args.trace, args.seed)
+
+    start = time.time()
+    try:
+        train(config, args.episodes, args.seed, agent, args.time_budget)
+    except MemoryLimitError as e:
+        print 'training stopped: {0}'.format(e)
+    seconds = time.time() - start
+    if agent.trace_recorder is not None:
+        agent.trace_recorder.close()
+    if args.checkpoints:
+        agent.checkpointer.checkpoint()
+        agent.episode_log.close()
+    if agent.memory is not None:
+        agent.memory.record(check=False)
+    if agent.metrics is not None:
+        agent.metrics.update(table=True)
+    for exporter in exporters:
+        exporter.stop()
+    if sampler is not None:
+        delay.cancel()
+        delay.join()
+        sampler.finish()
+
+    steps = agent.steps_per_episode
+    print '{0} episodes, {1} blocks in {2:.1f}s'.format(
+        len(steps), steps.total, seconds)
+    if len(steps):
+        recent = steps.recent(50)
+        print 'max {0}, mean of last 50: {1:.1f}'.format(
+            steps.maximum, sum(recent) / float(len(recent)))
+
+    if agent.instrumentation is not None:
+        agent.instrumentation.dump()
+
+    if agent.memory is not None:
+        _print_memory(agent.memory.latest)
+        if args.memory_log:
+            agent.memory.save(args.memory_log)
+
+    if args.save:
+        util.save_q_table(agent.Q, args.save, args.save_codec,
+                          args.save_level)
+
+
+if __name__ == '__main__':
+    main()
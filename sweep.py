@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+"""
+Hyperparameter sweeps over the run configurations of runner.py.
+
+A sweep is described by a JSON file. The runs are either the cartesian
+product of the values in "grid" or "samples" random draws from "random",
+where a parameter is a list of choices or a {"min": .., "max": ..} range:
+
+    {"episodes": 2000, "seeds": [0, 1, 2],
+     "base": {"rewards": {"game_over_reward": 25, "removed_line_reward": 10}},
+     "grid": {"alpha": [0.5, 0.9], "gamma": [0.8],
+              "features": [["column_height_differences"], ["max_height"]],
+              "shapes": ["oijlzts", "oi"]}}
+
+    {"episodes": 2000, "seeds": [0],
+     "random": {"samples": 30, "seed": 0, "alpha": {"min": 0.1, "max": 1.0},
+                "epsilon": [0.1, 0.3, 0.5]}}
+
+"time_budget" limits the seconds of every run (no episode is started
+afterwards), "max_pieces" and "episode_seconds" in a configuration limit the
+length of single episodes.
+
+The runs are spread over a process pool, the learning curve of every run is
+stored in a SQLite database. Runs already in the database are skipped, so an
+interrupted sweep continues where it stopped.
+
+Usage: python sweep.py sweep.json --db sweep.sqlite
+       python sweep.py --report --db sweep.sqlite
+"""
+from array import array
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import random
+import signal
+import sqlite3
+import time
+
+import runner
+
+DB_FILENAME = 'sweep.sqlite'
+FINAL_EPISODES = 50
+POOL_TIMEOUT = 60 * 60 * 24 * 365
+
+
+def expand(spec):
+    """
+    Expands a sweep specification into the list of runs.
+
+    :return: list of (config, seed) tuples
+    """
+    base = spec.get('base', {})
+    if 'grid' in spec:
+        configs = _grid(base, spec['grid'])
+    elif 'random' in spec:
+        configs = _random(base, spec['random'])
+    else:
+        configs = [dict(base)]
+
+    seeds = spec.get('seeds', [0])
+    return [(config, seed) for config in configs for seed in seeds]
+
+
+def _grid(base, grid):
+    names = sorted(grid)
+    configs = []
+    for values in itertools.product(*[grid[name] for name in names]):
+        config = dict(base)
+        config.update(zip(names, values))
+        configs.append(config)
+    return configs
+
+
+def _random(base, search):
+    rand = random.Random(search.get('seed', 0))
+    names = sorted(name for name in search if name not in ('samples', 'seed'))
+    configs = []
+    for _ in range(search['samples']):
+        config = dict(base)
+        for name in names:
+            choices = search[name]
+            if isinstance(choices, dict):
+                config[name] = rand.uniform(choices['min'], choices['max'])
+            else:
+                config[name] = rand.choice(choices)
+        configs.append(config)
+    return configs
+
+
+def run_id(config, seed, episodes, time_budget=None):
+    key = {'config': config, 'seed': seed, 'episodes': episodes}
+    # runs without a budget keep the ids of the stores made before
+    if time_budget is not None:
+        key['time_budget'] = time_budget
+    return hashlib.sha1(json.dumps(key, sort_keys=True)).hexdigest()[:16]
+
+
+class ResultStore(object):
+    """
+    SQLite database with one row per finished run. The learning curve is
+    stored as packed array of unsigned ints.
+    """
+
+    def __init__(self, path=DB_FILENAME):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS runs ('
+            ' id TEXT PRIMARY KEY,'
+            ' config TEXT NOT NULL,'
+            ' seed INTEGER NOT NULL,'
+            ' episodes INTEGER NOT NULL,'
+            ' seconds REAL,'
+            ' finished REAL,'
+            ' max_steps INTEGER,'
+            ' mean_steps REAL,'
+            ' final_mean_steps REAL,'
+            ' curve BLOB)')
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def completed_ids(self):
+        return set(row[0] for row in
+                   self.connection.execute('SELECT id FROM runs'))
+
+    def add(self, run_id, config, seed, episodes, curve, seconds):
+        final = curve[-FINAL_EPISODES:]
+        self.connection.execute(
+            'INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (run_id, json.dumps(config, sort_keys=True), seed, episodes,
+             seconds, time.time(), max(curve) if curve else 0,
+             _mean(curve), _mean(final),
+             sqlite3.Binary(array('I', curve).tostring())))
+        self.connection.commit()
+
+    def curve(self, run_id):
+        row = self.connection.execute('SELECT curve FROM runs WHERE id = ?',
+                                      (run_id,)).fetchone()
+        if row is None:
+            raise KeyError(run_id)
+        curve = array('I')
+        curve.fromstring(str(row[0]))
+        return curve
+
+    def summary(self):
+        """
+        Results grouped by configuration over all seeds, best first.
+
+        :return: list of dictionaries with config, runs, mean and std of the
+                 final mean steps and the best maximum
+        """
+        groups = {}
+        for config, final_mean, max_steps in self.connection.execute(
+                'SELECT config, final_mean_steps, max_steps FROM runs'):
+            groups.setdefault(config, []).append((final_mean, max_steps))
+
+        summary = []
+        for config, results in groups.iteritems():
+            finals = [final for final, _ in results]
+            mean = _mean(finals)
+            std = math.sqrt(_mean([(f - mean) ** 2 for f in finals]))
+            summary.append({'config': json.loads(config),
+                            'runs': len(results),
+                            'final_mean': mean,
+                            'final_std': std,
+                            'max_steps': max(m for _, m in results)})
+
+        summary.sort(key=lambda entry: -entry['final_mean'])
+        return summary
+
+
+def _mean(values):
+    if len(values) == 0:
+        return 0.0
+    return sum(values) / float(len(values))
+
+
+def _run_task(task):
+    rid, config, seed, episodes, time_budget = task
+    start = time.time()
+    # the whole learning curve is stored
+    agent = runner.RecordingAgent(history=max(1, episodes))
+    runner.configure_agent(agent, config)
+    agent.seed(seed)
+    # fewer than requested if the time budget ran out
+    played = agent.run(episodes, time_budget)
+    return rid, played, agent.steps_per_episode.read(), time.time() - start
+
+
+def _ignore_sigint():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def run_sweep(spec, store, processes=None):
+    """
+    Runs all runs of the specification that are not yet in the store.
+
+    :return: number of runs executed
+    """
+    episodes = spec.get('episodes', runner.DEFAULT_EPISODES)
+    time_budget = spec.get('time_budget')
+    completed = store.completed_ids()
+    tasks = []
+    for config, seed in expand(spec):
+        rid = run_id(config, seed, episodes, time_budget)
+        if rid not in completed:
+            completed.add(rid)
+            tasks.append((rid, config, seed, episodes, time_budget))
+
+    if not tasks:
+        return 0
+
+    by_id = dict((task[0], task) for task in tasks)
+    pool = multiprocessing.Pool(processes or multiprocessing.cpu_count(),
+                                _ignore_sigint)
+    try:
+        results = pool.imap_unordered(_run_task, tasks)
+        for i in range(len(tasks)):
+            rid, played, curve, seconds = results.next(POOL_TIMEOUT)
+            _, config, seed, _, _ = by_id[rid]
+            store.add(rid, config, seed, played, curve, seconds)
+            print '[{0}/{1}] {2} seed {3}: {4:.1f} blocks ({5:.1f}s)'.format(
+                i + 1, len(tasks), json.dumps(config, sort_keys=True), seed,
+                _mean(curve[-FINAL_EPISODES:]), seconds)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return len(tasks)
+
+
+def print_report(store, limit=20):
+    print '{0:>10} {1:>8} {2:>6} {3:>5}  config'.format(
+        'final', 'std', 'max', 'runs')
+    for entry in store.summary()[:limit]:
+        print '{0:>10.1f} {1:>8.1f} {2:>6} {3:>5}  {4}'.format(
+            entry['final_mean'], entry['final_std'], entry['max_steps'],
+            entry['runs'], json.dumps(entry['config'], sort_keys=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs hyperparameter sweeps.')
+    parser.add_argument('spec', nargs='?', help='JSON sweep specification')
+    parser.add_argument('--db', default=DB_FILENAME)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--report', action='store_true',
+                        help='print the best configurations')
+    args = parser.parse_args()
+
+    store = ResultStore(args.db)
+    try:
+        if args.spec:
+            with open(args.spec) as f:
+                spec = json.load(f)
+            try:
+                run_sweep(spec, store, args.processes)
+            except KeyboardInterrupt:
+                print 'interrupted, run again to continue the sweep'
+                return
+        if args.report or not args.spec:
+            print_report(store)
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import runner
+import sweep
+from sweep import ResultStore
+
+
+class ExpandTest(unittest.TestCase):
+    def test_grid_is_cartesian_product_times_seeds(self):
+        spec = {'seeds': [0, 1],
+                'base': {'gamma': 0.8},
+                'grid': {'alpha': [0.5, 0.9], 'shapes': ['oi', 'o']}}
+
+        runs = sweep.expand(spec)
+
+        self.assertEqual(8, len(runs))
+        self.assertIn(({'gamma': 0.8, 'alpha': 0.5, 'shapes': 'o'}, 1), runs)
+
+    def test_random_search_is_reproducible(self):
+        spec = {'random': {'samples': 5, 'seed': 3,
+                           'alpha': {'min': 0.1, 'max': 1.0},
+                           'epsilon': [0.1, 0.3]}}
+
+        runs = sweep.expand(spec)
+
+        self.assertEqual(runs, sweep.expand(spec))
+        self.assertEqual(5, len(runs))
+        for config, _ in runs:
+            self.assertTrue(0.1 <= config['alpha'] <= 1.0)
+            self.assertIn(config['epsilon'], [0.1, 0.3])
+
+    def test_run_id_depends_on_seed(self):
+        config = {'alpha': 0.5}
+
+        self.assertEqual(sweep.run_id(config, 0, 10),
+                         sweep.run_id(dict(config), 0, 10))
+        self.assertNotEqual(sweep.run_id(config, 0, 10),
+                            sweep.run_id(config, 1, 10))
+
+    def test_run_id_depends_on_time_budget(self):
+        config = {'alpha': 0.5}
+
+        self.assertEqual(sweep.run_id(config, 0, 10),
+                         sweep.run_id(config, 0, 10, None))
+        self.assertNotEqual(sweep.run_id(config, 0, 10, 60),
+                            sweep.run_id(config, 0, 10, 120))
+
+
+class ResultStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = ResultStore(os.path.join(self.directory, 'runs.sqlite'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_curve_round_trip(self):
+        self.store.add('a', {'alpha': 0.5}, 0, 3, [1, 5, 2], 0.1)
+
+        self.assertEqual([1, 5, 2], list(self.store.curve('a')))
+        self.assertEqual(set(['a']), self.store.completed_ids())
+
+    def test_summary_groups_seeds(self):
+        self.store.add('a', {'alpha': 0.5}, 0, 2, [2, 4], 0.1)
+        self.store.add('b', {'alpha': 0.5}, 1, 2, [6, 8], 0.1)
+        self.store.add('c', {'alpha': 0.9}, 0, 2, [1, 1], 0.1)
+
+        summary = self.store.summary()
+
+        self.assertEqual({'alpha': 0.5}, summary[0]['config'])
+        self.assertEqual(2, summary[0]['runs'])
+        self.assertEqual(5.0, summary[0]['final_mean'])
+        self.assertEqual(8, summary[0]['max_steps'])
+
+
+class RunnerConfigTest(unittest.TestCase):
+    def test_config_round_trip(self):
+        agent = runner.RecordingAgent()
+        rewards = runner.agent_config(agent)['rewards']
+        rewards['game_over_reward'] = 40.0
+        config = {'alpha': 0.5, 'gamma': 0.7, 'epsilon': 0.2,
+                  'features': ['max_height', 'number_of_holes'],
+                  'rewards': rewards, 'shapes': 'io'}
+
+        runner.configure_agent(agent, config)
+
+        self.assertEqual(config, runner.agent_config(agent))
+
+    def test_rewards_missing_in_the_config_keep_their_weight(self):
+        agent = runner.RecordingAgent()
+        expected = dict((f.__name__, w)
+                        for f, w in agent.environment.rewards.iteritems())
+        expected['game_over_reward'] = 30.0
+        del expected['max_height_reward']
+
+        runner.configure_agent(agent, {'rewards': {
+            'game_over_reward': 30, 'max_height_reward': 0}})
+
+        self.assertEqual(expected, runner.agent_config(agent)['rewards'])
+
+    def test_seeded_training_is_reproducible(self):
+        config = {'shapes': 'oi'}
+
+        first = runner.train(config, 5, seed=7)
+        second = runner.train(config, 5, seed=7)
+
+        self.assertEqual(first.steps_per_episode.read(),
+                         second.steps_per_episode.read())
+
+    def test_run_records_the_played_episodes(self):
+        _, played, curve, _ = sweep._run_task(('a', {'shapes': 'o'}, 0, 5, 0))
+
+        self.assertEqual(0, played)
+        self.assertEqual(0, len(curve))
+
+
+if __name__ == '__main__':
+    unittest.main()
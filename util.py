@@ -1,9 +1,13 @@
+from array import array
 import pickle
 import json
 import os
 
+from episode_log import EpisodeLogReader
+
 CONFIG_FILENAME = 'config.json'
-STATISTICS_FILENAME = 'q-statistics.json'
+STATISTICS_FILENAME = 'q-statistics.bin'
+LEGACY_STATISTICS_FILENAME = 'q-statistics.json'
 Q_FILENAME = 'q-table.bin'
 
 
@@ -12,25 +16,59 @@ def save_gui_config(controller):
     gamma = float(controller.panel.gammaInput.get())
     epsilon = float(controller.panel.epsilonInput.get())
     fastforward_count = int(controller.panel.fastForwardInput.get())
+    steps_per_second = float(controller.panel.speedInput.get())
     config = {'alpha': alpha, 'gamma': gamma, 'epsilon': epsilon,
-              'fastforward_count': fastforward_count}
-    path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
-                        CONFIG_FILENAME)
+              'fastforward_count': fastforward_count,
+              'steps_per_second': steps_per_second}
+    # only set in the file, kept for the next start
+    for name, value in controller.save_options.iteritems():
+        if value is not None:
+            config['save_' + name] = value
+    path = app_path(CONFIG_FILENAME)
     with open(path, 'w') as f:
         json.dump(config, f)
 
 
-def save_statistics(array):
-    path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
-                        STATISTICS_FILENAME)
-    config = {'steps_per_episode': array}
-    with open(path, 'w') as f:
-        json.dump(config, f)
+def save_statistics(episode_log, path=None):
+    """
+    Copies the episode log of the running training, which already contains
+    all finished episodes.
+    """
+    episode_log.copy_to(path or app_path(STATISTICS_FILENAME))
+
+
+def load_statistics(episode_log=None, path=None):
+    """
+    Loads the placed blocks per episode from an episode log or, from earlier
+    versions, from a JSON file.
+
+    :param episode_log: EpisodeLogWriter that continues with the loaded
+                        episodes
+    :return: array('I') with the placed blocks of every episode
+    """
+    path = path or app_path(STATISTICS_FILENAME)
+    if os.path.exists(path):
+        steps = EpisodeLogReader(path).read('steps')
+        if episode_log is not None:
+            episode_log.replace_with(path)
+        return steps
+
+    # the JSON file of earlier versions lies next to the requested path
+    legacy = os.path.join(os.path.dirname(path), LEGACY_STATISTICS_FILENAME)
+    stats = None
+    if os.path.exists(legacy):
+        with open(legacy, 'r') as f:
+            stats = json.load(f)
+    steps = array('I', stats['steps_per_episode'] if stats else [])
+    if episode_log is not None:
+        episode_log.reset()
+        for step_count in steps:
+            episode_log.append(step_count, 0)  # lines were not recorded
+    return steps
 
 
 def load_json(filename):
-    path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
-                        filename)
+    path = app_path(filename)
     try:
         with open(path, 'r') as f:
             return json.load(f)
@@ -38,16 +76,47 @@ def load_json(filename):
         print 'Error reading config file'
 
 
-def save_q_table(dictionary):
-    path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
-                        Q_FILENAME)
-    with open(path, 'wb') as f:
-        pickle.dump(dictionary, f)
+def save_q_table(dictionary, path=None, codec=None, level=None):
+    """
+    Saves the Q-table in binary format or, with a codec, as compressed
+    snapshot (see qsnapshot.py).
+
+    :param codec: name of a codec in qsnapshot.CODECS, None for no
+                  compression
+    :param level: compression level from 1 to 9, None for the default
+    """
+    path = path or app_path(Q_FILENAME)
+    if codec is None:
+        import qtable
+        qtable.save(dictionary, path)
+        return
+    import qsnapshot
+    if level is None:
+        level = qsnapshot.DEFAULT_LEVEL
+    qsnapshot.save(dictionary, path, codec, level)
 
 
-def load_q_table():
-    path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
-                        Q_FILENAME)
-    with open(path) as f:
+def load_q_table(path=None):
+    """
+    Loads a Q-table in binary format (memory mapped), a compressed snapshot
+    or, from earlier versions, a pickle.
+    """
+    # the table formats need numpy, imported on first use
+    import qsnapshot
+    import qtable
+    path = path or app_path(Q_FILENAME)
+    if qtable.is_qtable_file(path):
+        return qtable.load(path)
+    if qsnapshot.is_snapshot_file(path):
+        return qsnapshot.load(path)
+    with open(path, 'rb') as f:
         dictionary = pickle.load(f)
     return dictionary
+
+
+def app_path(filename):
+    """
+    Path of a file in the directory of the application.
+    """
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                        filename)